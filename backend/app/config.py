@@ -20,9 +20,20 @@ class Settings(BaseSettings):
     clerk_secret_key: str = ""
     clerk_publishable_key: str = ""
     clerk_jwks_url: str = ""
+    # Clerk user ids allowed to read worker-wide metrics (/api/usage/*),
+    # JSON list, e.g. ["user_2abc"]
+    admin_clerk_ids: list[str] = []
 
     supabase_url: str = ""
     supabase_service_role_key: str = ""
+    # Pooled keep-alive HTTP connections of the async Supabase client
+    supabase_max_connections: int = 20
+    supabase_keepalive_seconds: float = 30
+    supabase_timeout_seconds: float = 30
+    # Per-worker cache of users rows (see user_cache); 0 disables
+    user_cache_ttl_seconds: float = 60
+    user_cache_negative_ttl_seconds: float = 10  # clerk_ids without a row
+    user_cache_max_entries: int = 10000
 
     google_oauth_client_id: str = ""
     google_oauth_client_secret: str = ""
@@ -30,8 +41,42 @@ class Settings(BaseSettings):
 
     openai_api_key: str = ""
     chat_model: str = "gpt-5.2"
+    # Model routing (see model_router): simple lookups use the light model
+    model_routing_enabled: bool = True
+    chat_model_light: str = "gpt-5-mini"
     reasoning_translate_model: str = "gpt-5-nano"
+    # Reasoning summary translation (see reasoning_translator)
+    reasoning_translate_concurrency: int = 4
+    reasoning_translate_batch_window_ms: int = 50
+    reasoning_translate_batch_max_chars: int = 400  # Longer summaries go alone
+    reasoning_translate_cache_size: int = 2048
+    # Also memoize in the reasoning_translations table (shared across workers)
+    reasoning_translate_cache_persist: bool = False
     max_tool_output_chars: int = 16000
+    # Rolling compaction of replayed context_items (see context_compactor)
+    context_token_budget: int = 60000
+    context_keep_recent_turns: int = 3
+    # Once over the budget, compact down to this share of it
+    context_compaction_target_ratio: float = 0.75
+    compact_dense_encoding: bool = False
+    # Per-tool output char budgets (JSON), keyed "tool" or "server_kind:tool",
+    # e.g. {"meta_ads:get_insights": 12000, "get_search_analytics": 8000}
+    tool_output_char_budgets: dict[str, int] = {}
+    # Max concurrent tool calls per MCP server (parallel tool calls), with
+    # per-kind overrides (JSON), e.g. {"ga4": 4, "wordpress": 2}
+    mcp_default_concurrency: int = 4
+    mcp_max_concurrency: dict[str, int] = {}
+    # Per-run budgets (see run_budget); 0 disables a limit
+    run_max_turns: int = 50
+    run_max_seconds: float = 300  # Excludes time waiting on ask_user
+    # Output + new input tokens over all model calls (context re-sent by
+    # each call is counted once)
+    run_max_tokens: int = 500000
+    run_max_tool_calls_per_server: int = 25
+    run_budget_wrap_up_ratio: float = 0.8
+    run_budget_grace_seconds: float = 30
+    # Expose only the MCP toolsets relevant to each turn (see tool_router)
+    dynamic_tool_selection: bool = True
 
     # Meta Ads MCP
     meta_ads_enabled: bool = False
@@ -40,6 +85,24 @@ class Settings(BaseSettings):
     # WordPress MCP
     wordpress_enabled: bool = False
 
+    # SSE text_delta coalescing: flush merged text every N ms or M bytes
+    # (0 ms sends every delta as its own frame)
+    sse_text_flush_ms: int = 50
+    sse_text_flush_bytes: int = 1024
+    # Resumable streams: events kept per run for Last-Event-ID replay
+    sse_replay_max_events: int = 5000
+    # Detached agent runs executing at once per worker (more wait queued; 0 = no limit)
+    max_concurrent_runs: int = 8
+    # Cancel runs left without an SSE subscriber this long (resume window)
+    run_orphan_grace_seconds: float = 30
+    # Cancelled runs taking longer than this to unwind are logged / counted
+    run_cancel_timeout_seconds: float = 10
+
+    # Background persistence writer (see persistence_writer)
+    persistence_batch_size: int = 50
+    persistence_max_attempts: int = 4
+    persistence_shutdown_flush_seconds: float = 30
+
     frontend_url: str = "http://localhost:3000"
     backend_url: str = "http://localhost:8000"
 
@@ -2,7 +2,7 @@ from functools import lru_cache
 from app.services.credentials_manager import CredentialsManager
 from app.services.mcp_manager import MCPSessionManager
 from app.services.agent_service import AgentService
-from app.services.supabase_service import get_supabase_client
+from app.services.database import Database, database
 
 
 @lru_cache(maxsize=1)
@@ -20,5 +20,5 @@ def get_agent_service() -> AgentService:
     return AgentService(get_mcp_manager())
 
 
-def get_supabase():
-    return get_supabase_client()
+def get_supabase() -> Database:
+    return database
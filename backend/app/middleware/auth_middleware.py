@@ -1,7 +1,7 @@
 import base64
 import jwt
 from jwt import PyJWKClient
-from fastapi import HTTPException, Security
+from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from functools import lru_cache
 
@@ -76,3 +76,10 @@ async def get_current_user(
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Authentication failed: {e}")
+
+
+async def get_admin_user(user: dict = Depends(get_current_user)) -> dict:
+    """Current user, if listed in ``admin_clerk_ids`` (worker-wide metrics)."""
+    if user["clerk_id"] not in get_settings().admin_clerk_ids:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
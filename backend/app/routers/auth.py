@@ -32,8 +32,8 @@ GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
 async def google_status(
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"], user.get("email"))
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"], user.get("email"))
     return GoogleAuthStatus(
         connected=db_user.get("google_connected", False),
     )
@@ -43,8 +43,8 @@ async def google_status(
 async def google_disconnect(
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    await disconnect_user_google(supabase, user["clerk_id"])
+    db = get_supabase()
+    await disconnect_user_google(db, user["clerk_id"])
     return {"status": "disconnected"}
 
 
@@ -111,8 +111,8 @@ async def google_callback(
             detail="Failed to obtain refresh token. Please try again.",
         )
 
-    supabase = get_supabase()
-    await update_user_google_token(supabase, clerk_id, refresh_token)
+    db = get_supabase()
+    await update_user_google_token(db, clerk_id, refresh_token)
 
     return RedirectResponse(
         url=f"{settings.frontend_url}/dashboard?google_connected=true"
@@ -1,16 +1,37 @@
-import json
 import logging
+from datetime import datetime, timezone
+from functools import partial
+
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.middleware.auth_middleware import get_current_user
 from app.deps import get_supabase, get_agent_service
-from app.services.supabase_service import get_or_create_user, get_user_google_token
+from app.services.supabase_service import (
+    get_or_create_user,
+    get_user_google_token,
+    load_context_items,
+    save_context_items,
+)
+from app.services.activity_items import ActivityBuilder
 from app.services.ask_user_store import ask_user_store
+from app.services.persistence_writer import WriteOp, persistence_writer
+from app.services.event_stream import coalesce_text_deltas
+from app.services.run_executor import AgentRun, run_executor
+from app.services.serialization import sse_frame
+from app.services.stream_replay import ReplayGap, ReplayLog
+from app.config import get_settings
 from app.models.schemas import ChatRequest
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/chat", tags=["chat"])
+settings = get_settings()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
 
 
 class RespondRequest(BaseModel):
@@ -32,22 +53,21 @@ async def respond_to_question(
 
 @router.post("/stream")
 async def stream_chat(
-    request: Request,
     body: ChatRequest,
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"])
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"])
 
-    refresh_token = await get_user_google_token(supabase, user["clerk_id"])
+    refresh_token = await get_user_google_token(db, user["clerk_id"], db_user)
     if not refresh_token:
         raise HTTPException(status_code=400, detail="Google account not connected")
 
     # Get or create conversation
     conversation_id = body.conversation_id
     if not conversation_id:
-        conv_result = (
-            supabase.table("conversations")
+        conv_result = await db.execute(
+            db.table("conversations")
             .insert(
                 {
                     "user_id": db_user["id"],
@@ -55,206 +75,181 @@ async def stream_chat(
                     "title": body.message[:50],
                 }
             )
-            .execute()
         )
         conversation_id = conv_result.data[0]["id"]
 
-    # Save user message
-    supabase.table("messages").insert(
-        {
-            "conversation_id": conversation_id,
-            "role": "user",
-            "content": body.message,
-        }
-    ).execute()
+    # Earlier turns' writes must land before this turn's context is read
+    await persistence_writer.drain(conversation_id)
 
-    # Load conversation context: prefer context_items (full Responses API format)
+    # Load conversation context: prefer context items (full Responses API format)
     # over plain role+content history
-    conv_data = (
-        supabase.table("conversations")
-        .select("context_items")
-        .eq("id", conversation_id)
-        .single()
-        .execute()
-    )
-    saved_context_items = conv_data.data.get("context_items") if conv_data.data else None
+    saved_context = await load_context_items(db, conversation_id)
+    saved_context_items = saved_context.items
 
     # Fallback: plain history if no context_items saved yet
     history = None
     if not saved_context_items:
-        msg_result = (
-            supabase.table("messages")
+        msg_result = await db.execute(
+            db.table("messages")
             .select("role, content")
             .eq("conversation_id", conversation_id)
             .order("created_at")
-            .execute()
         )
         history = [
             {"role": m["role"], "content": m["content"]}
             for m in msg_result.data
             if m["role"] in ("user", "assistant")
         ]
-        # Remove the last user message since agent_service adds it
-        if history and history[-1]["role"] == "user":
-            history = history[:-1]
+
+    # Save user message only after the history read above, which must not
+    # include it (agent_service adds it). Written in the background; the
+    # explicit created_at keeps message order even when rows are batched
+    persistence_writer.insert(
+        "messages",
+        {
+            "conversation_id": conversation_id,
+            "role": "user",
+            "content": body.message,
+            "created_at": _now(),
+        },
+        key=conversation_id,
+    )
 
     agent_service = get_agent_service()
 
-    async def event_generator():
-        full_response = ""
-        tool_calls_data = []
-        # Collect activity items for persistence (mirrors frontend logic)
-        activity_items: list[dict] = []
-        current_text = ""
-        seq = 0
-
-        def _flush_text():
-            """Flush accumulated text into a TextActivityItem."""
-            nonlocal current_text, seq
-            if current_text:
-                seq += 1
-                activity_items.append({
-                    "kind": "text",
-                    "sequence": seq,
-                    "content": current_text,
-                })
-                current_text = ""
+    async def run_chat(log: ReplayLog):
+        """Run body: run the agent, persist the results and append client
+        events to the run's replay log. Executed by ``run_executor``,
+        independently of this response."""
+        # Activity items for persistence (same reduction as the frontend)
+        activity = ActivityBuilder()
 
-        try:
-            async for event in agent_service.stream_chat(
+        # Merge token-sized text deltas into fewer SSE frames
+        async for event in coalesce_text_deltas(
+            agent_service.stream_chat(
                 user_id=user["clerk_id"],
                 refresh_token=refresh_token,
                 message=body.message,
                 property_id=body.property_id,
                 conversation_history=history,
                 context_items=saved_context_items,
-            ):
-                if await request.is_disconnected():
-                    break
-
-                # Handle reasoning translation inline
-                if event.get("_needs_translation") and event.get("content"):
-                    translated = await agent_service._translate_to_japanese(
-                        event["content"]
-                    )
-                    event["content"] = translated
-                # Remove internal flag before sending
-                event.pop("_needs_translation", None)
-
-                # Intercept internal _context_items — save to DB, don't send to client
-                if event["type"] == "_context_items":
-                    try:
-                        supabase.table("conversations").update(
-                            {"context_items": event["items"]}
-                        ).eq("id", conversation_id).execute()
-                    except Exception as e:
-                        logging.getLogger(__name__).warning(
-                            f"Failed to save context_items: {e}"
+                conversation_id=conversation_id,
+            ),
+            interval_ms=settings.sse_text_flush_ms,
+            max_bytes=settings.sse_text_flush_bytes,
+        ):
+            # Intercept internal _context_items — save to DB, don't send to client
+            if event["type"] == "_context_items":
+                persistence_writer.call(
+                    partial(
+                        save_context_items,
+                        db,
+                        conversation_id,
+                        saved_context,
+                        event["items"],
+                        event.get("append_from"),
+                    ),
+                    key=conversation_id,
+                )
+                continue
+
+            activity.apply(event)
+            if event["type"] == "_ask_user_responses":
+                continue  # Internal event: don't send to client
+            if event["type"] == "done":
+                full_response = activity.full_response
+                activity_items = activity.to_list()
+
+                # Save assistant response with activity items
+                if full_response or activity_items:
+                    msg_data = {
+                        "conversation_id": conversation_id,
+                        "role": "assistant",
+                        "content": full_response or "",
+                        "created_at": _now(),
+                    }
+                    if activity.tool_calls:
+                        # Plain JSON dicts already: no deep copy needed
+                        msg_data["tool_calls"] = activity.tool_calls
+                    fallback = None
+                    if activity_items:
+                        # Fallback: activity_items column may not exist yet
+                        fallback = WriteOp(
+                            table="messages", payload=dict(msg_data)
                         )
-                    continue
-
-                # --- Collect activity items (mirrors frontend useChat logic) ---
-                if event["type"] == "text_delta":
-                    full_response += event.get("content", "")
-                    current_text += event.get("content", "")
-                elif event["type"] == "response_created":
-                    _flush_text()
-                elif event["type"] == "tool_call":
-                    _flush_text()
-                    tool_calls_data.append(event)
-                    seq += 1
-                    activity_items.append({
-                        "kind": "tool",
-                        "sequence": seq,
-                        "name": event.get("name", "unknown"),
-                        "call_id": event.get("call_id"),
-                        "arguments": event.get("arguments"),
-                    })
-                elif event["type"] == "tool_result":
-                    # Update matching tool activity item
-                    call_id = event.get("call_id")
-                    for item in reversed(activity_items):
-                        if (
-                            item["kind"] == "tool"
-                            and item.get("call_id") == call_id
-                            and "output" not in item
-                        ):
-                            item["output"] = event.get("output", "(completed)")
-                            break
-                elif event["type"] == "reasoning":
-                    _flush_text()
-                    seq += 1
-                    activity_items.append({
-                        "kind": "reasoning",
-                        "sequence": seq,
-                        "content": event.get("content", ""),
-                    })
-                elif event["type"] == "chart":
-                    _flush_text()
-                    seq += 1
-                    activity_items.append({
-                        "kind": "chart",
-                        "sequence": seq,
-                        "spec": event.get("spec"),
-                    })
-                elif event["type"] == "ask_user":
-                    _flush_text()
-                    seq += 1
-                    activity_items.append({
-                        "kind": "ask_user",
-                        "sequence": seq,
-                        "groupId": event.get("group_id"),
-                        "questions": event.get("questions"),
-                    })
-                elif event["type"] == "_ask_user_responses":
-                    # Internal event: persist user responses into activity_items
-                    gid = event.get("group_id")
-                    responses = event.get("responses")
-                    if gid and responses:
-                        for item in activity_items:
-                            if item.get("kind") == "ask_user" and item.get("groupId") == gid:
-                                item["responses"] = responses
-                                break
-                    continue  # Don't send to client
-                elif event["type"] == "done":
-                    _flush_text()
-
-                    # Mark any unfinished tools as completed
-                    for item in activity_items:
-                        if item["kind"] == "tool" and "output" not in item:
-                            item["output"] = "(completed)"
-
-                    # Save assistant response with activity items
-                    if full_response or activity_items:
-                        msg_data = {
-                            "conversation_id": conversation_id,
-                            "role": "assistant",
-                            "content": full_response or "",
-                        }
-                        if tool_calls_data:
-                            msg_data["tool_calls"] = json.loads(
-                                json.dumps(tool_calls_data)
-                            )
-                        if activity_items:
-                            msg_data["activity_items"] = activity_items
-                        try:
-                            supabase.table("messages").insert(msg_data).execute()
-                        except Exception:
-                            # Fallback: activity_items column may not exist yet
-                            msg_data.pop("activity_items", None)
-                            supabase.table("messages").insert(msg_data).execute()
-
-                    # Update conversation timestamp
-                    supabase.table("conversations").update(
-                        {"updated_at": "now()"}
-                    ).eq("id", conversation_id).execute()
-
-                    event["conversation_id"] = conversation_id
-
-                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
-
-        except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+                        msg_data["activity_items"] = activity_items
+                    persistence_writer.insert(
+                        "messages", msg_data, key=conversation_id, fallback=fallback
+                    )
+
+                # Update conversation timestamp
+                persistence_writer.update(
+                    "conversations",
+                    {"updated_at": "now()"},
+                    {"id": conversation_id},
+                    key=conversation_id,
+                )
+
+                event["conversation_id"] = conversation_id
+
+            log.append(event)
+
+    run = run_executor.submit(
+        user["clerk_id"], conversation_id, run_chat, settings.sse_replay_max_events
+    )
+    return _sse_response(run)
+
+
+@router.get("/stream/{run_id}")
+async def resume_stream(
+    run_id: str,
+    request: Request,
+    last_event_id: int | None = None,
+    user: dict = Depends(get_current_user),
+):
+    """Resume a run's event stream after the ``Last-Event-ID`` header
+    (or ``last_event_id`` query parameter)."""
+    run = _get_run(run_id, user)
+    header = request.headers.get("last-event-id")
+    after = int(header) if header and header.isdigit() else (last_event_id or 0)
+    return _sse_response(run, after)
+
+
+@router.get("/runs/{run_id}")
+async def get_run_status(run_id: str, user: dict = Depends(get_current_user)):
+    return _get_run(run_id, user).to_dict()
+
+
+@router.post("/runs/{run_id}/cancel")
+async def cancel_run(run_id: str, user: dict = Depends(get_current_user)):
+    run = _get_run(run_id, user)
+    if not run_executor.cancel(run):
+        raise HTTPException(status_code=409, detail=f"Run already {run.status}")
+    return {"status": "cancelling"}
+
+
+def _get_run(run_id: str, user: dict) -> AgentRun:
+    run = run_executor.get(run_id, user["clerk_id"])
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found or expired")
+    return run
+
+
+def _sse_response(run: AgentRun, after: int = 0) -> StreamingResponse:
+    log = run.log
+
+    async def event_generator():
+        # The run is cancelled when its last subscriber stays away too long
+        run_executor.subscribe(run)
+        try:
+            async for event_id, event in log.events(after):
+                yield sse_frame(event, event_id)
+        except ReplayGap as e:
+            logger.warning(f"[Chat] Resume of run {log.run_id} failed: {e}")
+            gap = {"type": "error", "message": "再接続できませんでした。ページを再読み込みしてください。"}
+            yield sse_frame(gap)
+        finally:
+            run_executor.unsubscribe(run)
 
     return StreamingResponse(
         event_generator(),
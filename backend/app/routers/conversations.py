@@ -12,14 +12,13 @@ router = APIRouter(prefix="/api/conversations", tags=["conversations"])
 async def list_conversations(
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"])
-    result = (
-        supabase.table("conversations")
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"])
+    result = await db.execute(
+        db.table("conversations")
         .select("*")
         .eq("user_id", db_user["id"])
         .order("updated_at", desc=True)
-        .execute()
     )
     return result.data
 
@@ -29,10 +28,10 @@ async def create_conversation(
     body: ConversationCreate,
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"])
-    result = (
-        supabase.table("conversations")
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"])
+    result = await db.execute(
+        db.table("conversations")
         .insert(
             {
                 "user_id": db_user["id"],
@@ -40,7 +39,6 @@ async def create_conversation(
                 "title": body.title or "新しい会話",
             }
         )
-        .execute()
     )
     return result.data[0]
 
@@ -50,25 +48,23 @@ async def get_conversation(
     conversation_id: str,
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"])
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"])
 
-    conv_result = (
-        supabase.table("conversations")
+    conv_result = await db.execute(
+        db.table("conversations")
         .select("*")
         .eq("id", conversation_id)
         .eq("user_id", db_user["id"])
-        .execute()
     )
     if not conv_result.data:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    msg_result = (
-        supabase.table("messages")
+    msg_result = await db.execute(
+        db.table("messages")
         .select("*")
         .eq("conversation_id", conversation_id)
         .order("created_at")
-        .execute()
     )
 
     conversation = conv_result.data[0]
@@ -81,14 +77,13 @@ async def delete_conversation(
     conversation_id: str,
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"])
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"])
 
-    result = (
-        supabase.table("conversations")
+    result = await db.execute(
+        db.table("conversations")
         .delete()
         .eq("id", conversation_id)
         .eq("user_id", db_user["id"])
-        .execute()
     )
     return {"status": "ok"}
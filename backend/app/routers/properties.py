@@ -12,8 +12,8 @@ router = APIRouter(prefix="/api/properties", tags=["properties"])
 async def list_properties(
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    refresh_token = await get_user_google_token(supabase, user["clerk_id"])
+    db = get_supabase()
+    refresh_token = await get_user_google_token(db, user["clerk_id"])
     if not refresh_token:
         raise HTTPException(status_code=400, detail="Google account not connected")
 
@@ -30,8 +30,8 @@ async def list_properties(
 async def list_gsc_properties(
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    refresh_token = await get_user_google_token(supabase, user["clerk_id"])
+    db = get_supabase()
+    refresh_token = await get_user_google_token(db, user["clerk_id"])
     if not refresh_token:
         raise HTTPException(status_code=400, detail="Google account not connected")
 
@@ -49,25 +49,29 @@ async def select_property(
     body: PropertySelectRequest,
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"])
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"])
 
     # Reset all defaults
-    supabase.table("user_properties").update({"is_default": False}).eq(
-        "user_id", db_user["id"]
-    ).execute()
+    await db.execute(
+        db.table("user_properties").update({"is_default": False}).eq(
+            "user_id", db_user["id"]
+        )
+    )
 
     # Upsert the selected property
-    supabase.table("user_properties").upsert(
-        {
-            "user_id": db_user["id"],
-            "property_id": body.property_id,
-            "property_name": body.property_name,
-            "account_name": body.account_name,
-            "is_default": True,
-        },
-        on_conflict="user_id,property_id",
-    ).execute()
+    await db.execute(
+        db.table("user_properties").upsert(
+            {
+                "user_id": db_user["id"],
+                "property_id": body.property_id,
+                "property_name": body.property_name,
+                "account_name": body.account_name,
+                "is_default": True,
+            },
+            on_conflict="user_id,property_id",
+        )
+    )
 
     return {"status": "ok"}
 
@@ -76,15 +80,14 @@ async def select_property(
 async def get_selected_property(
     user: dict = Depends(get_current_user),
 ):
-    supabase = get_supabase()
-    db_user = await get_or_create_user(supabase, user["clerk_id"])
+    db = get_supabase()
+    db_user = await get_or_create_user(db, user["clerk_id"])
 
-    result = (
-        supabase.table("user_properties")
+    result = await db.execute(
+        db.table("user_properties")
         .select("*")
         .eq("user_id", db_user["id"])
         .eq("is_default", True)
-        .execute()
     )
     if result.data:
         return result.data[0]
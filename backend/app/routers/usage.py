@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.middleware.auth_middleware import get_admin_user, get_current_user
+from app.services.token_accounting import token_accountant
+from app.services.reasoning_translator import reasoning_translator
+from app.services.model_router import model_router
+from app.services.run_budget import budget_metrics
+from app.services.run_executor import run_executor
+from app.services.database import database
+from app.services.user_cache import user_cache
+
+router = APIRouter(prefix="/api/usage", tags=["usage"])
+
+# Worker-wide endpoints (all users' traffic) are admin-only: see
+# admin_clerk_ids in config
+
+
+@router.get("")
+async def get_usage(
+    user: dict = Depends(get_current_user),
+):
+    """Token usage of the current user: totals, per conversation, per tool."""
+    return token_accountant.user_usage(user["clerk_id"])
+
+
+@router.get("/tools")
+async def get_tool_usage(
+    user: dict = Depends(get_admin_user),
+):
+    """Worker-wide per-tool token aggregates (all users)."""
+    return token_accountant.tool_usage()
+
+
+@router.get("/model")
+async def get_model_usage(
+    user: dict = Depends(get_admin_user),
+):
+    """Worker-wide model token aggregates and prompt cache hit rate."""
+    return token_accountant.model_usage()
+
+
+@router.get("/translations")
+async def get_translation_cache_stats(
+    user: dict = Depends(get_admin_user),
+):
+    """Worker-wide reasoning translation cache hit rate."""
+    return reasoning_translator.stats.to_dict()
+
+
+@router.get("/routes")
+async def get_route_metrics(
+    user: dict = Depends(get_admin_user),
+):
+    """Worker-wide model routing metrics: requests, failures, latency per route."""
+    return model_router.metrics()
+
+
+@router.get("/budgets")
+async def get_budget_metrics(
+    user: dict = Depends(get_admin_user),
+):
+    """Worker-wide run budget warnings / exhaustions per budget kind."""
+    return budget_metrics.to_dict()
+
+
+@router.get("/runs")
+async def get_run_metrics(
+    user: dict = Depends(get_admin_user),
+):
+    """Worker-wide agent run metrics: orphaned runs, cancellations, teardown time."""
+    return run_executor.metrics.to_dict()
+
+
+@router.get("/db")
+async def get_db_metrics(
+    user: dict = Depends(get_admin_user),
+):
+    """Worker-wide Supabase query counts, errors and latency per query, and
+    user cache hit rate."""
+    return {"queries": database.metrics(), "user_cache": user_cache.stats()}
+
+
+@router.get("/{conversation_id}")
+async def get_conversation_usage(
+    conversation_id: str,
+    user: dict = Depends(get_current_user),
+):
+    if token_accountant.conversation_owner(conversation_id) != user["clerk_id"]:
+        raise HTTPException(status_code=404, detail="No usage recorded for this conversation")
+    return token_accountant.conversation_usage(conversation_id)
@@ -0,0 +1,148 @@
+"""Activity items of an assistant message, built from chat stream events.
+
+``ActivityBuilder`` is the backend reducer behind ``messages.activity_items``
+and must stay in step with the frontend reducer in ``useChat.ts`` (which
+builds the same items live): the saved items are what the frontend shows
+when the conversation is reloaded.
+
+Reduction rules (both sides):
+- text_delta appends to the current text item; response_created, tool_call,
+  reasoning, chart and ask_user end it.
+- tool_result sets the output of the first tool item with the same call_id
+  (any tool item if the result has no call_id) that has no output yet;
+  done marks remaining tools "(completed)".
+- reasoning_translated replaces the content of the reasoning item with the
+  same reasoning_id; _ask_user_responses attaches responses to the ask_user
+  item with the same group id.
+- route_escalated drops everything the abandoned run produced.
+
+Lookups go through dict indexes (call_id, reasoning_id, group id), so a
+long tool-heavy run is linear in its events. Records are slotted and cache
+their serialized dict until they change.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass(slots=True)
+class ActivityRecord:
+    kind: str
+    sequence: int
+    fields: dict[str, Any]
+    _dict: dict | None = field(default=None, repr=False)
+
+    def set(self, key: str, value: Any) -> None:
+        self.fields[key] = value
+        self._dict = None
+
+    def to_dict(self) -> dict:
+        if self._dict is None:
+            self._dict = {"kind": self.kind, "sequence": self.sequence, **self.fields}
+        return self._dict
+
+
+class ActivityBuilder:
+    __slots__ = (
+        "items", "tool_calls", "_response_parts", "_text_parts",
+        "_pending_tools", "_reasoning", "_ask_user",
+    )
+
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        self.items: list[ActivityRecord] = []
+        self.tool_calls: list[dict] = []  # Raw tool_call events (messages.tool_calls)
+        self._response_parts: list[str] = []
+        self._text_parts: list[str] = []
+        # call_id -> tool records without output, oldest first
+        self._pending_tools: dict[str | None, list[ActivityRecord]] = {}
+        self._reasoning: dict[str, ActivityRecord] = {}
+        self._ask_user: dict[str, ActivityRecord] = {}
+
+    @property
+    def full_response(self) -> str:
+        return "".join(self._response_parts)
+
+    def _add(self, kind: str, **fields: Any) -> ActivityRecord:
+        record = ActivityRecord(kind, len(self.items) + 1, fields)
+        self.items.append(record)
+        return record
+
+    def _flush_text(self) -> None:
+        if self._text_parts:
+            self._add("text", content="".join(self._text_parts))
+            self._text_parts = []
+
+    def apply(self, event: dict) -> None:
+        event_type = event["type"]
+        if event_type == "text_delta":
+            content = event.get("content", "")
+            self._response_parts.append(content)
+            self._text_parts.append(content)
+        elif event_type == "response_created":
+            self._flush_text()
+        elif event_type == "tool_call":
+            self._flush_text()
+            self.tool_calls.append(event)
+            call_id = event.get("call_id")
+            record = self._add(
+                "tool",
+                name=event.get("name", "unknown"),
+                call_id=call_id,
+                arguments=event.get("arguments"),
+            )
+            self._pending_tools.setdefault(call_id, []).append(record)
+        elif event_type == "tool_result":
+            record = self._pop_pending_tool(event.get("call_id"))
+            if record is not None:
+                record.set("output", event.get("output", "(completed)"))
+        elif event_type == "reasoning":
+            self._flush_text()
+            record = self._add("reasoning", content=event.get("content", ""))
+            if event.get("reasoning_id"):
+                self._reasoning[event["reasoning_id"]] = record
+        elif event_type == "reasoning_translated":
+            record = self._reasoning.get(event.get("reasoning_id"))
+            if record is not None:
+                record.set("content", event.get("content", ""))
+        elif event_type == "chart":
+            self._flush_text()
+            self._add("chart", spec=event.get("spec"))
+        elif event_type == "ask_user":
+            self._flush_text()
+            record = self._add(
+                "ask_user",
+                groupId=event.get("group_id"),
+                questions=event.get("questions"),
+            )
+            if event.get("group_id"):
+                self._ask_user.setdefault(event["group_id"], record)
+        elif event_type == "_ask_user_responses":
+            record = self._ask_user.get(event.get("group_id"))
+            if record is not None and event.get("responses"):
+                record.set("responses", event["responses"])
+        elif event_type == "route_escalated":
+            self._reset()
+        elif event_type == "done":
+            self.finish()
+
+    def _pop_pending_tool(self, call_id: str | None) -> ActivityRecord | None:
+        if call_id:
+            pending = self._pending_tools.get(call_id)
+        else:
+            heads = [p for p in self._pending_tools.values() if p]
+            pending = min(heads, key=lambda p: p[0].sequence) if heads else None
+        return pending.pop(0) if pending else None
+
+    def finish(self) -> None:
+        """End of the run: flush text and mark unfinished tools completed."""
+        self._flush_text()
+        for pending in self._pending_tools.values():
+            for record in pending:
+                record.set("output", "(completed)")
+        self._pending_tools.clear()
+
+    def to_list(self) -> list[dict]:
+        return [record.to_dict() for record in self.items]
@@ -1,25 +1,42 @@
 import asyncio
 import json
 import logging
-from contextlib import AsyncExitStack
+import time
+import uuid
+from contextlib import AsyncExitStack, nullcontext
 from dataclasses import dataclass
 from typing import AsyncGenerator, Callable, Awaitable
 
-from agents import Agent, Runner, ModelSettings, function_tool
+from agents import Agent, Runner, ModelSettings, RunConfig, function_tool
 from agents.tool_context import ToolContext
 from agents.items import ReasoningItem
-from openai import AsyncOpenAI
 from openai.types.shared import Reasoning
 
 from app.config import get_settings
-from app.services.mcp_manager import MCPSessionManager
+from app.services.mcp_manager import MCPSessionManager, wordpress_tool_prefix
 from app.services.ask_user_store import AskUserStore, ask_user_store
+from app.services.result_store import ResultStore, render_page, result_store
+from app.services.analytics_store import AnalyticsStore, analytics_store
+from app.services.token_accounting import token_accountant, usage_from_response
+from app.services.context_compactor import compact_context
+from app.services.system_prompt import build_system_prompt
+from app.services.reasoning_translator import reasoning_translator
+from app.services.tool_router import CORE_TOOLSETS, ActiveToolsets, tool_router
+from app.services.model_router import model_router
+from app.services.run_budget import RunBudget, RunLimits
+from app.services.serialization import to_jsonable
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 # Sentinel to signal end-of-stream from the SDK background task
 _SENTINEL = object()
+# Max wait for pending reasoning translations once the run has finished
+_TRANSLATION_DRAIN_SECONDS = 10.0
+# Events that mean the user got an answer (no escalation re-run after these)
+_ANSWER_EVENT_TYPES = frozenset({"text_delta", "chart", "ask_user"})
+# Tool activity: a run that emitted these is not re-run on another route
+_TOOL_EVENT_TYPES = frozenset({"tool_call", "tool_result"})
 
 
 def _serialize_input_list(items: list) -> list[dict]:
@@ -33,8 +50,8 @@ def _serialize_input_list(items: list) -> list[dict]:
         elif hasattr(item, "__dict__"):
             result.append({k: v for k, v in item.__dict__.items() if v is not None})
         else:
-            # Fallback — try json round-trip
-            result.append(json.loads(json.dumps(item, default=str)))
+            # Fallback: coerce unknown objects (only for non-plain items)
+            result.append(to_jsonable(item))
     return result
 
 
@@ -44,7 +61,11 @@ class ChatContext:
 
     emit_event: Callable[[dict], Awaitable[None]]
     ask_user_store: AskUserStore
+    result_store: ResultStore
+    analytics_store: AnalyticsStore
     conversation_id: str
+    toolsets: ActiveToolsets | None = None
+    budget: RunBudget | None = None
 
 
 @function_tool
@@ -91,8 +112,11 @@ async def ask_user(
         }
     )
 
+    # Waiting on the user does not count against the run's time budget
+    budget = ctx.context.budget
     try:
-        await asyncio.wait_for(group.event.wait(), timeout=300)
+        with budget.paused() if budget else nullcontext():
+            await asyncio.wait_for(group.event.wait(), timeout=300)
     except asyncio.TimeoutError:
         store.cleanup(group.group_id)
         return "（ユーザーからの応答がタイムアウトしました）"
@@ -165,206 +189,103 @@ async def render_chart(
     return f"チャート「{spec.get('title', '')}」を描画しました。"
 
 
+@function_tool
+async def read_result(
+    ctx: ToolContext[ChatContext],
+    handle: str,
+    offset: int = 0,
+    limit: int = 50,
+    filter_column: str = "",
+    filter_value: str = "",
+    sort_by: str = "",
+    descending: bool = True,
+    columns: str = "",
+) -> str:
+    """大きすぎて省略されたツール結果（handle付きで保存）をページング・絞り込み・並べ替えして読む。
+
+    Args:
+        handle: ツール出力末尾の "[full result stored: handle=...]" に表示された handle（例: "r_1a2b3c4d"）
+        offset: スキップする行数（次ページは前回出力の next: offset を使う）
+        limit: 返す最大行数（最大200）
+        filter_column: 絞り込む列名（任意）
+        filter_value: filter_column の値に含まれる文字列（部分一致・大文字小文字を区別しない）
+        sort_by: 並べ替える列名（任意。数値列は数値として比較）
+        descending: True なら降順、False なら昇順
+        columns: 返す列名のカンマ区切り（任意。空なら全列）
+    """
+    stored = ctx.context.result_store.get(ctx.context.conversation_id, handle)
+    if stored is None:
+        return f"（handle {handle} の結果が見つかりません。期限切れの場合は元のツールを再実行してください）"
+
+    return render_page(
+        stored,
+        offset=offset,
+        limit=limit,
+        filter_column=filter_column,
+        filter_value=filter_value,
+        sort_by=sort_by,
+        descending=descending,
+        columns=[c.strip() for c in columns.split(",") if c.strip()] or None,
+    )
+
+
+@function_tool
+async def query_results(
+    ctx: ToolContext[ChatContext],
+    sql: str,
+) -> str:
+    """この会話で取得済みのレポートデータ（GA4/GSCの表）に SQL (SQLite) を実行する。
+
+    Args:
+        sql: SELECT 文。テーブル名はツール出力末尾の "[sql table: ...]" に表示された名前（例: run_report_1）。
+            例: SELECT deviceCategory, SUM(sessions) AS sessions FROM run_report_1 GROUP BY 1 ORDER BY 2 DESC LIMIT 10
+            空文字を渡すとテーブルと列の一覧を返す。
+    """
+    store = ctx.context.analytics_store
+    if not sql.strip():
+        return store.describe(ctx.context.conversation_id)
+    return store.query(ctx.context.conversation_id, sql)
+
+
+@function_tool
+async def load_toolsets(
+    ctx: ToolContext[ChatContext],
+    names: str,
+) -> str:
+    """未ロードのツールセットを読み込み、次のステップから使えるようにする。
+
+    Args:
+        names: カンマ区切りのツールセット名（例: "meta_ads", "wordpress:wordpress_achieve"）。
+            "all" で全ツールセットを読み込む。
+    """
+    toolsets = ctx.context.toolsets
+    if toolsets is None:
+        return "（全ツールセットが読み込み済みです）"
+    loaded, unknown = toolsets.load(
+        [n.strip() for n in names.split(",") if n.strip()]
+    )
+    if loaded:
+        tool_router.remember(ctx.context.conversation_id, toolsets.active)
+    lines = []
+    if loaded:
+        lines.append(f"読み込み完了: {', '.join(loaded)}（次のステップからツールを使用可能）")
+    if unknown:
+        lines.append(f"不明なツールセット: {', '.join(unknown)}")
+    lines.append(f"読み込み済み: {', '.join(toolsets.active)}")
+    if toolsets.inactive:
+        lines.append(f"未ロード: {', '.join(toolsets.inactive)}")
+    return "\n".join(lines)
+
+
+_FUNCTION_TOOLS = [ask_user, render_chart, read_result, query_results, load_toolsets]
+# Function tools (MCP tools are accounted in CompactMCPServer)
+_FUNCTION_TOOL_NAMES = frozenset(t.name for t in _FUNCTION_TOOLS)
+
+
 class AgentService:
     def __init__(self, mcp_manager: MCPSessionManager):
         self.mcp_manager = mcp_manager
 
-    @staticmethod
-    def _build_system_prompt(
-        property_id: str,
-        meta_ads_enabled: bool = False,
-        wordpress_labels: list[str] | None = None,
-    ) -> str:
-        meta_ads_section = ""
-        if meta_ads_enabled:
-            meta_ads_section = """
-
-## Meta広告（Meta Ads）ツール使用ルール
-- Meta広告（Facebook/Instagram広告）のデータ取得・管理が可能。
-- 主要ツール:
-  - `get_ad_accounts`: 広告アカウント一覧
-  - `get_campaigns`: キャンペーン一覧
-  - `get_adsets`: 広告セット一覧
-  - `get_ads`: 広告一覧
-  - `get_insights`: パフォーマンスデータ（インプレッション、クリック、コスト、CVなど）
-  - `get_campaign_details` / `get_adset_details` / `get_ad_details`: 各レベルの詳細
-  - `search_interests` / `search_behaviors` / `search_geo_locations`: ターゲティング検索
-- GA4/GSCと組み合わせて、広告→サイト流入→CV の全体ファネルを分析せよ。
-- Meta広告の質問にはまず `get_ad_accounts` でアカウントを特定してから詳細データを取得せよ。
-
-## 使い分けガイド（Meta広告追加）
-| 質問のタイプ | 使うツール |
-|---|---|
-| Meta広告のパフォーマンス | Meta Ads: get_insights |
-| Meta広告のキャンペーン管理 | Meta Ads: get_campaigns, get_adsets, get_ads |
-| 広告→サイト→CVの全体分析 | Meta Ads + GA4 + GSC |
-| ターゲティング調査 | Meta Ads: search_interests, search_behaviors |
-"""
-
-        wordpress_section = ""
-        if wordpress_labels:
-            sites_list = ", ".join(wordpress_labels)
-            prefix_note = ""
-            if len(wordpress_labels) > 1:
-                prefix_note = """
-- **複数サイト接続時のツール名規則**: ツール名に `{prefix}__` プレフィックスが付く。
-  - 例: `wp__wp-mcp-get-posts-by-category` (1つ目のサイト), `achieve__wp-mcp-get-posts-by-category` (achieveサイト)
-  - 操作対象サイトに対応するプレフィックス付きツールを使え。"""
-            wordpress_section = f"""
-
-## WordPress MCP ツール使用ルール
-- 接続中のWordPressサイト: {sites_list}
-- WordPressの投稿・固定ページの取得、作成、更新、削除が可能。{prefix_note}
-- 主なツール（WordPress MCP Adapter が提供するツール名はサーバーによって異なる場合がある。`list_tools` の結果に従え）:
-  - 投稿一覧取得 / 投稿作成 / 投稿更新 / 投稿削除
-  - 固定ページ一覧取得 / 固定ページ作成・更新
-  - カテゴリ・タグ管理
-  - メディア管理
-- SEO記事作成のワークフロー: GSCで検索クエリ分析 → キーワード選定 → WordPress投稿作成。
-"""
-
-        tools_desc = "GA4とGoogle Search Console（GSC）"
-        if meta_ads_enabled:
-            tools_desc += "とMeta広告"
-        if wordpress_labels:
-            tools_desc += "とWordPress"
-
-        return f"""あなたは{tools_desc}を使いこなすウェブ分析のプロフェッショナルです。
-ユーザーの質問に対して、まず行動（ツール実行）してからデータに基づいて回答します。
-
-## 対象プロパティ
-GA4 property_id: {property_id}
-
-## 行動原則（最重要）
-1. **質問する前にツールを使え**: ユーザーに「どの観点ですか？」「どの粒度ですか？」と聞き返すな。プロとして最適な分析を自分で判断し、即座にツールを実行せよ。
-2. **まずデータを取れ**: 「GA4ではこれができます／できません」のような説明は不要。ツールを呼んで実データを取得し、結果を見せろ。
-3. **失敗したらリトライせよ**: ツール呼び出しがエラーになったら、パラメータを修正して再実行せよ。ユーザーにエラーを見せるな。
-4. **簡潔に答えよ**: 冗長な前置き・注釈・免責は不要。データとインサイトだけを伝えろ。
-5. **GA4とGSCを組み合わせろ**: SEOの質問にはGSCで検索クエリ・順位・CTRを取得し、GA4でサイト内行動・CVを取得して、両面から分析せよ。
-
-## 中間報告ルール（重要）
-- ツール実行の前後に、**今何をしているか・次に何をするかを短いテキストで報告**せよ。テキストとツール呼び出しを同じレスポンスで返してよい。
-- ユーザーはリアルタイムであなたの行動を見ている。無言でツールを連続実行するのではなく、進捗を伝えながら進めろ。
-- 例:
-  - 「まず過去28日間のセッションデータを取得します。」→ run_report 呼び出し
-  - 「セッションデータが取れました。次にチャネル別の内訳を確認します。」→ run_report 呼び出し
-  - 「両方のデータが揃いました。結果をまとめます。」→ テキストで最終分析
-- ただし中間報告は1〜2文の短文にせよ。冗長な説明は不要。
-
-## ユーザーへの質問・確認（ask_user ツール）
-- 分析に必要な情報が本当に不足していて、推測では進められない場合のみ `ask_user` ツールを使ってユーザーに確認せよ。
-- **ただし、安易にユーザーに質問するな**。プロとして自分で判断できることは質問せずに実行せよ。
-- ユーザーが「質問して」「確認して」と明示的に依頼した場合は、積極的に構造化質問を活用せよ。
-- **構造化質問形式**: `questions` パラメータにJSON配列を渡す。各質問は独立した短文で、回答しやすい形式にすること。
-- 質問のルール:
-  - 1つの質問は**わかりやすい短文**にせよ。専門用語は避け、誰でも理解できる表現を使え。
-  - 選択肢で回答できるものは必ず `type: "choice"` + `options` を使え（ユーザーの負担が最も少ない）
-  - 自由入力が必要な場合のみ `type: "text"` を使え
-  - はい/いいえで回答できる場合は `type: "confirm"` を使え
-  - 1回のask_userで**2〜5個**の質問を送れ。多すぎず少なすぎず。
-  - 選択肢に「その他」を含めると、ユーザーが想定外の回答もしやすい
-  - **全ての回答は任意**。ユーザーが一部だけ回答しても問題ない。未回答の項目はプロとして最適な判断で進めよ。
-- 例:
-  ```json
-  [{{"id":"kpi","question":"一番伸ばしたい成果は？","type":"choice","options":["問い合わせ数","売上","アクセス数","その他"]}},{{"id":"target","question":"主なお客さんは？","type":"choice","options":["企業向け(B2B)","個人向け(B2C)","両方"]}},{{"id":"concern","question":"SEOで気になることがあれば教えてください","type":"text"}}]
-  ```
-
-## GA4ツール使用ルール
-
-### run_report（通常レポート）
-- **date_rangesは必須**: 必ず指定すること。省略するとエラーになる。
-- デフォルト期間: 指定がなければ `{{"start_date": "28daysAgo", "end_date": "yesterday"}}` を使え。
-- 比較する場合は date_ranges に2つの期間を入れろ: `[{{"start_date": "28daysAgo", "end_date": "yesterday", "name": "current"}}, {{"start_date": "56daysAgo", "end_date": "29daysAgo", "name": "previous"}}]`
-- よく使うdimensions: `date`, `sessionDefaultChannelGroup`, `sourceMedium`, `landingPagePlusQueryString`, `pagePathPlusQueryString`, `deviceCategory`, `country`, `eventName`
-- よく使うmetrics: `activeUsers`, `sessions`, `screenPageViews`, `eventCount`, `engagementRate`, `averageSessionDuration`, `conversions`, `totalRevenue`
-
-### run_realtime_report（リアルタイム）
-- date_rangesは不要（直近30分の自動集計）。
-- dimensionsに `sessionDefaultChannelGroup`, `sourceMedium` 等の流入元は使用できない。使えるのは `unifiedScreenName`, `deviceCategory`, `country`, `city`, `eventName` 等。
-- リアルタイムで流入元が必要な場合は run_report で `date_ranges: [{{"start_date": "today", "end_date": "today"}}]` を使え。
-
-### get_property_details / get_custom_dimensions_and_metrics / list_google_ads_links / get_account_summaries
-- 情報取得系。エラーは起きにくい。必要に応じて呼べ。
-
-## GSC（Google Search Console）ツール使用ルール
-
-### list_properties
-- GSCに登録されているサイトURLの一覧を取得。最初にこれを呼んで対象サイトのURLを特定せよ。
-- site_urlの形式: `sc-domain:example.com` または `https://example.com/`
-
-### get_search_analytics(site_url, days, dimensions)
-- 検索パフォーマンスデータ取得。dimensions: "query", "page", "country", "device", "date"
-- デフォルト28日。クリック、表示回数、CTR、平均掲載順位を返す。
-
-### get_performance_overview(site_url, days)
-- サマリー指標＋日別トレンド。SEO概況の把握に最適。
-
-### get_advanced_search_analytics(site_url, start_date, end_date, dimensions, ...)
-- フィルタリング・ソート対応の高度な検索分析。特定ページやクエリの深掘りに。
-- filter_dimension / filter_expression でページやクエリの絞り込み可能。
-
-### compare_search_periods(site_url, period1_start/end, period2_start/end, dimensions)
-- 2期間比較。SEOの成長・下落を定量化。
-
-### get_search_by_page_query(site_url, page_url, days)
-- 特定ページの検索クエリ一覧。LPのSEO診断に。
-
-### inspect_url_enhanced(site_url, page_url) / batch_url_inspection / check_indexing_issues
-- URL検査。インデックス状態、クロール状況、リッチリザルト、モバイルユーザビリティ。
-
-### get_sitemaps / submit_sitemap / delete_sitemap
-- サイトマップ管理。
-
-## 使い分けガイド
-| 質問のタイプ | 使うツール |
-|---|---|
-| SEO状況・検索順位・クエリ分析 | GSC: get_search_analytics, get_performance_overview |
-| サイト流入・行動・CV分析 | GA4: run_report |
-| SEO + サイト内行動の総合分析 | GSC + GA4 両方 |
-| インデックス状態・技術的SEO | GSC: inspect_url_enhanced, check_indexing_issues |
-| リアルタイム状況 | GA4: run_realtime_report |
-| サイトマップ確認 | GSC: get_sitemaps |
-
-## チャート描画ルール（render_chart ツール）
-- データ取得後、視覚化が有効と判断したら **必ず `render_chart` ツールを呼んでチャートを描画せよ**。
-- テキスト分析も併記すること（チャートだけ投げるな）。
-- チャートの `data` 配列の数値は **数値型**（文字列ではなく `100` や `3.5`）で入れること。
-- ラベルは日本語を使用。
-- 使い分け:
-  | データの特性 | type |
-  |---|---|
-  | 日別・月別の推移 | line |
-  | カテゴリ間の比較 | bar |
-  | 累積推移・内訳推移 | area |
-  | 構成比・シェア | pie または donut |
-  | 2変数の相関 | scatter |
-  | 多次元の比較 | radar |
-  | ステップごとの変換率 | funnel |
-  | 詳細データ一覧 | table |
-- **1回の分析で複数チャートを出してよい**（例: 推移のlineと内訳のpieをセットで）。
-- chart_spec例（折れ線）:
-  ```json
-  {{"type":"line","title":"日別セッション数","data":[{{"date":"1/1","sessions":150}},{{"date":"1/2","sessions":200}}],"xKey":"date","yKeys":[{{"key":"sessions","label":"セッション","color":"#3b82f6"}}]}}
-  ```
-- chart_spec例（円グラフ）:
-  ```json
-  {{"type":"pie","title":"デバイス構成比","data":[{{"device":"desktop","count":500}},{{"device":"mobile","count":300}},{{"device":"tablet","count":50}}],"nameKey":"device","valueKey":"count"}}
-  ```
-
-## 回答フォーマット
-- 数値データは**チャート + 簡潔なインサイト**で表示。チャートがある場合はマークダウンテーブルは不要。
-- チャートなしの場合はマークダウンテーブルを使え。
-- 数値は3桁カンマ区切り、パーセントは小数点1桁。
-- **2〜3行のインサイト**（増減の要因推定、改善示唆など）を簡潔に付けろ。
-- ユーザーと同じ言語で応答（主に日本語）。
-
-## やってはいけないこと
-- 「GA4ではSEOの順位は見えません」→ GSCツールを使って検索順位を取れ。GA4とGSCの両方が使える。
-- 「どちらの粒度がいいですか？」とユーザーに選択を委ねること → プロとして最適な粒度を自分で選べ。
-- ツールエラーをそのままユーザーに見せること → パラメータを直して再実行せよ。
-- 「API制約により取得できません」と言い訳すること → 別のパラメータやツールで代替取得を試みろ。
-{meta_ads_section}{wordpress_section}"""
-
     async def stream_chat(
         self,
         user_id: str,
@@ -373,8 +294,14 @@ GA4 property_id: {property_id}
         property_id: str,
         conversation_history: list[dict] | None = None,
         context_items: list[dict] | None = None,
+        conversation_id: str = "",
     ) -> AsyncGenerator[dict, None]:
-        pair = self.mcp_manager.create_server_pair(user_id, refresh_token)
+        budget = RunBudget(RunLimits.from_settings())
+        pair = self.mcp_manager.create_server_pair(
+            user_id, refresh_token, conversation_id=conversation_id, budget=budget
+        )
+        if conversation_id:
+            token_accountant.bind_conversation(conversation_id, user_id)
 
         try:
             async with AsyncExitStack() as stack:
@@ -396,41 +323,81 @@ GA4 property_id: {property_id}
                     """Callback passed to ChatContext — puts events into the queue."""
                     await queue.put(event)
 
+                budget.bind(queue.put_nowait)
+                watchdog = asyncio.create_task(budget.watch_deadline())
+                stack.callback(watchdog.cancel)
+
                 chat_context = ChatContext(
                     emit_event=emit_event,
                     ask_user_store=ask_user_store,
-                    conversation_id="",  # Will be set by the router
+                    result_store=result_store,
+                    analytics_store=analytics_store,
+                    conversation_id=conversation_id,
+                    budget=budget,
                 )
 
-                mcp_servers = [pair.ga4_server, pair.gsc_server]
+                wp_sites = settings.get_wordpress_sites() if pair.wordpress_servers else []
+                wp_labels = [site.label for site in wp_sites]
+
+                # Toolset selection: expose only the MCP servers relevant to
+                # this turn; the rest can be loaded via load_toolsets
+                toolsets = {"ga4": pair.ga4_server, "gsc": pair.gsc_server}
                 if pair.meta_ads_server:
-                    mcp_servers.append(pair.meta_ads_server)
-                mcp_servers.extend(pair.wordpress_servers)
-                print(f"[Agent] MCP servers total: {len(mcp_servers)} (wordpress: {len(pair.wordpress_servers)})")
-
-                wp_labels = [
-                    site.label for site in settings.get_wordpress_sites()
-                ] if pair.wordpress_servers else []
-
-                agent = Agent(
-                    name="GA4 & GSC Analytics Agent",
-                    instructions=self._build_system_prompt(
-                        property_id,
-                        meta_ads_enabled=pair.meta_ads_server is not None,
-                        wordpress_labels=wp_labels,
-                    ),
-                    model=settings.chat_model,
-                    mcp_servers=mcp_servers,
-                    tools=[ask_user, render_chart],
-                    model_settings=ModelSettings(
-                        reasoning=Reasoning(effort="medium", summary="detailed"),
-                        verbosity="low",
+                    toolsets["meta_ads"] = pair.meta_ads_server
+                for site, wp_server in zip(wp_sites, pair.wordpress_servers):
+                    toolsets[f"wordpress:{site.label}"] = wp_server
+                if settings.dynamic_tool_selection:
+                    selection = tool_router.select(
+                        conversation_id,
+                        message,
+                        list(toolsets),
+                        context_items=context_items,
+                        wordpress_prefixes={
+                            wordpress_tool_prefix(label): f"wordpress:{label}"
+                            for label in wp_labels
+                        } if len(wp_labels) > 1 else {},
+                    )
+                    active_toolsets = ActiveToolsets(toolsets, selection.active)
+                    chat_context.toolsets = active_toolsets
+                    tool_router.remember(conversation_id, active_toolsets.active)
+                    mcp_servers = active_toolsets.servers
+                else:
+                    mcp_servers = list(toolsets.values())
+                print(f"[Agent] MCP servers active: {len(mcp_servers)}/{len(toolsets)} (wordpress: {len(pair.wordpress_servers)})")
+
+                system_prompt = build_system_prompt(
+                    property_id,
+                    meta_ads_enabled=pair.meta_ads_server is not None,
+                    wordpress_labels=wp_labels,
+                    unloaded_toolsets=(
+                        chat_context.toolsets.inactive if chat_context.toolsets else None
                     ),
                 )
+                # Route requests sharing the static prefix (and this
+                # conversation's history) to the same prompt cache
+                cache_key = system_prompt.static_digest
+                if conversation_id:
+                    cache_key += f":{conversation_id}"
+                logger.info(
+                    f"[Agent] System prompt {system_prompt.static_digest}: "
+                    f"{system_prompt.static_chars}/{len(system_prompt.text)} chars static"
+                )
 
                 # Build input: prefer context_items (full Responses API format)
                 # over plain conversation_history (role+content only)
+                # Index of the first context item not yet persisted (None:
+                # history was rewritten, the full context must be saved; only
+                # on the turns where compaction runs, see context_compactor)
+                append_from: int | None = 0
                 if context_items:
+                    # Keep the replayed history under the token budget
+                    context_items, compaction = compact_context(
+                        context_items,
+                        token_budget=settings.context_token_budget,
+                        keep_recent_turns=settings.context_keep_recent_turns,
+                        target_ratio=settings.context_compaction_target_ratio,
+                    )
+                    append_from = None if compaction.changed else len(context_items)
                     input_messages = context_items + [
                         {"role": "user", "content": message}
                     ]
@@ -440,54 +407,224 @@ GA4 property_id: {property_id}
                         input_messages.extend(conversation_history)
                     input_messages.append({"role": "user", "content": message})
 
-                result = Runner.run_streamed(
-                    agent, input=input_messages, context=chat_context,
-                    max_turns=50,
-                )
+                # Model / reasoning-effort routing (lookup runs escalate on failure)
+                if settings.model_routing_enabled:
+                    active_names = (
+                        chat_context.toolsets.active if chat_context.toolsets else list(toolsets)
+                    )
+                    route = model_router.classify(
+                        message,
+                        extra_toolsets=sum(n not in CORE_TOOLSETS for n in active_names),
+                    )
+                else:
+                    route = model_router.default_route
+                logger.info(f"[Agent] Route: {route.name} ({route.model}, effort={route.effort})")
+
+                while True:
+                    agent = Agent(
+                        name="GA4 & GSC Analytics Agent",
+                        instructions=system_prompt.text,
+                        model=route.model,
+                        mcp_servers=mcp_servers,
+                        tools=_FUNCTION_TOOLS,
+                        model_settings=ModelSettings(
+                            reasoning=Reasoning(effort=route.effort, summary=route.summary),
+                            verbosity="low",
+                            # Independent calls (e.g. GA4 + GSC) run concurrently;
+                            # bounded per server in CompactMCPServer
+                            parallel_tool_calls=True,
+                            extra_args={"prompt_cache_key": cache_key},
+                        ),
+                    )
 
-                async def _pump_sdk_events() -> None:
-                    """Background task: read SDK stream events and put them into the queue."""
-                    try:
-                        async for event in result.stream_events():
-                            sdk_event = self._process_sdk_event(event)
-                            if sdk_event is not None:
-                                await queue.put(sdk_event)
-                    except Exception as e:
-                        await queue.put(
-                            {"type": "error", "message": str(e)}
+                    result = Runner.run_streamed(
+                        agent, input=input_messages, context=chat_context,
+                        max_turns=settings.run_max_turns or None,  # 0: no limit
+                        run_config=RunConfig(call_model_input_filter=budget.input_filter),
+                    )
+                    budget.attach_run(result)
+
+                    translation_tasks: set[asyncio.Task] = set()
+
+                    async def _translate_reasoning(reasoning_id: str, text: str) -> None:
+                        translated = await reasoning_translator.translate(text)
+                        if translated != text:
+                            await queue.put({
+                                "type": "reasoning_translated",
+                                "reasoning_id": reasoning_id,
+                                "content": translated,
+                            })
+
+                    async def _pump_sdk_events() -> None:
+                        """Background task: read SDK stream events and put them into the queue."""
+                        pending_calls: dict[str, tuple[str, str]] = {}
+                        try:
+                            async for event in result.stream_events():
+                                if conversation_id:
+                                    self._record_usage(event, conversation_id, pending_calls)
+                                usage = self._response_usage(event)
+                                if usage is not None:
+                                    budget.add_usage(*usage)
+                                sdk_event = self._process_sdk_event(event)
+                                if sdk_event is not None:
+                                    await queue.put(sdk_event)
+                                    if sdk_event["type"] == "reasoning" and sdk_event["has_summary"]:
+                                        task = asyncio.create_task(_translate_reasoning(
+                                            sdk_event["reasoning_id"], sdk_event["content"]
+                                        ))
+                                        translation_tasks.add(task)
+                                        task.add_done_callback(translation_tasks.discard)
+                            # Let in-flight translations land before "done"
+                            if translation_tasks:
+                                await asyncio.wait(
+                                    set(translation_tasks), timeout=_TRANSLATION_DRAIN_SECONDS
+                                )
+                        except Exception as e:
+                            await queue.put(
+                                {"type": "error", "message": str(e)}
+                            )
+                        finally:
+                            for task in list(translation_tasks):
+                                task.cancel()
+                            await queue.put(_SENTINEL)
+
+                    pump_task = asyncio.create_task(_pump_sdk_events())
+
+                    started = time.perf_counter()
+                    ttft_ms: float | None = None
+                    answered = False  # Answer text / chart / question streamed
+                    used_tools = False  # Tool calls would repeat in a re-run
+                    failed = False
+                    next_route = model_router.escalate(route)
+
+                    def should_escalate() -> bool:
+                        # No re-run once the run budget is spent: it would
+                        # run without any token / time cap
+                        return (
+                            bool(next_route)
+                            and not answered
+                            and not used_tools
+                            and not budget.exhausted
                         )
+
+                    try:
+                        while True:
+                            item = await queue.get()
+                            if item is _SENTINEL:
+                                break
+                            if item["type"] in _ANSWER_EVENT_TYPES:
+                                if ttft_ms is None:
+                                    ttft_ms = (time.perf_counter() - started) * 1000
+                                answered = True
+                            elif item["type"] in _TOOL_EVENT_TYPES:
+                                used_tools = True
+                            elif item["type"] == "error":
+                                failed = True
+                                if should_escalate():
+                                    continue  # Re-run on the escalated route
+                            yield item  # type: ignore[misc]
                     finally:
-                        await queue.put(_SENTINEL)
-
-                pump_task = asyncio.create_task(_pump_sdk_events())
-
-                try:
-                    while True:
-                        item = await queue.get()
-                        if item is _SENTINEL:
-                            break
-                        yield item  # type: ignore[misc]
-                finally:
-                    if not pump_task.done():
-                        pump_task.cancel()
-                        try:
-                            await pump_task
-                        except (asyncio.CancelledError, Exception):
-                            pass
-
-                # Extract full conversation context for next turn
-                try:
-                    full_context = result.to_input_list()
-                    # Serialize to JSON-safe dicts
-                    serialized = _serialize_input_list(full_context)
-                    yield {"type": "_context_items", "items": serialized}
-                except Exception as e:
-                    logger.warning(f"Failed to serialize context_items: {e}")
+                        # Cancel the SDK run explicitly (e.g. the agent run
+                        # was cancelled): model calls and tool calls stop now
+                        # instead of when the stream is garbage-collected
+                        if not result.is_complete:
+                            result.cancel()
+                        if not pump_task.done():
+                            pump_task.cancel()
+                            try:
+                                await pump_task
+                            except (asyncio.CancelledError, Exception):
+                                pass
+
+                    model_router.record(
+                        route, ttft_ms, (time.perf_counter() - started) * 1000, failed
+                    )
+                    if failed and should_escalate():
+                        logger.info(
+                            f"[Agent] Route {route.name} failed, escalating to {next_route.name}"
+                        )
+                        yield {
+                            "type": "route_escalated",
+                            "from": route.name,
+                            "to": next_route.name,
+                        }
+                        route = next_route
+                        continue
+
+                    # Extract full conversation context for next turn
+                    try:
+                        full_context = result.to_input_list()
+                        # Serialize to JSON-safe dicts
+                        serialized = _serialize_input_list(full_context)
+                        yield {
+                            "type": "_context_items",
+                            "items": serialized,
+                            "append_from": append_from,
+                        }
+                    except Exception as e:
+                        logger.warning(f"Failed to serialize context_items: {e}")
+                    break
 
                 yield {"type": "done"}
         finally:
             self.mcp_manager.cleanup_server_pair(pair)
 
+    @staticmethod
+    def _response_usage(event) -> tuple[int, int] | None:
+        """(input, output) tokens of a completed model response, else None."""
+        if event.type != "raw_response_event":
+            return None
+        data = event.data
+        if getattr(data, "type", "") != "response.completed":
+            return None
+        usage = getattr(getattr(data, "response", None), "usage", None)
+        if usage is None:
+            return None
+        return (
+            getattr(usage, "input_tokens", 0) or 0,
+            getattr(usage, "output_tokens", 0) or 0,
+        )
+
+    @staticmethod
+    def _record_usage(
+        event, conversation_id: str, pending_calls: dict[str, tuple[str, str]]
+    ) -> None:
+        """Token accounting: model usage per turn and function tool calls.
+
+        ``pending_calls`` maps call_id -> (tool name, arguments) between a
+        function tool call and its output within one run.
+        """
+        if event.type == "raw_response_event":
+            data = event.data
+            if getattr(data, "type", "") == "response.completed":
+                usage = getattr(getattr(data, "response", None), "usage", None)
+                if usage is not None:
+                    token_accountant.record_model_turn(
+                        conversation_id, usage_from_response(usage)
+                    )
+        elif event.type == "run_item_stream_event":
+            item = event.item
+            item_type = getattr(item, "type", "")
+            if item_type == "tool_call_item":
+                raw = item.raw_item
+                name = getattr(raw, "name", "")
+                call_id = getattr(raw, "call_id", None)
+                if name in _FUNCTION_TOOL_NAMES and call_id:
+                    pending_calls[call_id] = (name, getattr(raw, "arguments", ""))
+            elif item_type == "tool_call_output_item":
+                raw = item.raw_item
+                call_id = (
+                    raw.get("call_id")
+                    if isinstance(raw, dict)
+                    else getattr(raw, "call_id", None)
+                )
+                pending = pending_calls.pop(call_id, None)
+                if pending:
+                    name, arguments = pending
+                    token_accountant.record_tool_call(
+                        conversation_id, name, arguments, str(item.output)
+                    )
+
     def _process_sdk_event(self, event) -> dict | None:
         """Convert a single SDK stream event into a dict for SSE, or None to skip."""
         if event.type == "raw_response_event":
@@ -539,33 +676,15 @@ GA4 property_id: {property_id}
             if texts:
                 summary_text = " ".join(texts)
 
-        # Note: translation is sync-unfriendly here in the pump task.
-        # We'll handle translation in the queue consumer or skip for now.
-        # For simplicity, mark for translation in the event dict.
+        # The English summary is sent as-is; stream_chat schedules its
+        # translation and emits a "reasoning_translated" event for this id
         return {
             "type": "reasoning",
+            "reasoning_id": getattr(item.raw_item, "id", None) or uuid.uuid4().hex[:12],
             "content": summary_text or "分析中...",
             "has_summary": summary_text is not None,
-            "_needs_translation": summary_text is not None,
         }
 
-    async def _translate_to_japanese(self, text: str) -> str:
-        """英語の reasoning summary を Responses API で日本語に翻訳"""
-        try:
-            client = AsyncOpenAI(api_key=settings.openai_api_key)
-            response = await client.responses.create(
-                model=settings.reasoning_translate_model,
-                instructions="Translate the following text to Japanese. Output ONLY the translated text, nothing else. Keep any markdown formatting intact.",
-                input=text,
-                reasoning={"effort": "minimal", "summary": None},
-                text={"verbosity": "low"},
-                store=False,
-            )
-            return response.output_text or text
-        except Exception as e:
-            logger.warning(f"Reasoning summary 翻訳失敗、原文を使用: {e}")
-            return text
-
     async def list_properties(
         self,
         user_id: str,
@@ -0,0 +1,238 @@
+"""Per-conversation in-memory SQL store for fetched report data.
+
+Every structured tool result (GA4 report TSV, GSC markdown tables) is
+loaded into an in-memory SQLite database owned by the conversation, so
+follow-up slicing ("group that by device", "top 10 pages by engagement
+rate") runs locally via the ``query_results`` function tool instead of
+re-querying GA4/GSC through MCP.
+
+Tables are named ``{tool}_{n}`` (e.g. ``run_report_1``); column names are
+the report headers with non-word characters replaced by "_". Numeric
+columns ("1,234", "3.4%") are stored as numbers.
+"""
+
+import logging
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+SCOPE_TTL_SECONDS = 3600  # 1 hour since last use
+MAX_TABLES_PER_SCOPE = 50
+MAX_QUERY_ROWS = 200
+# SQLite VM instructions between progress-handler checks / per-query cap
+_PROGRESS_INTERVAL = 10_000
+_MAX_PROGRESS_CALLS = 2_000  # ~20M instructions
+
+_NON_WORD = re.compile(r"\W+")
+
+
+def _identifier(name: str, fallback: str) -> str:
+    ident = _NON_WORD.sub("_", name).strip("_")
+    if not ident:
+        return fallback
+    if ident[0].isdigit():
+        ident = f"c_{ident}"
+    return ident
+
+
+def _to_number(value: str) -> int | float | None:
+    text = value.replace(",", "").rstrip("%").strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+@dataclass
+class TableInfo:
+    """A loaded table: name, source tool and column definitions."""
+    name: str
+    tool_name: str
+    columns: list[tuple[str, str]]  # (column, SQL type)
+    row_count: int
+
+    def describe(self) -> str:
+        cols = ", ".join(f"{c} {t}" for c, t in self.columns)
+        return f"{self.name}({cols}) -- {self.row_count} rows from {self.tool_name}"
+
+
+@dataclass
+class _ScopeDB:
+    conn: sqlite3.Connection
+    tables: OrderedDict[str, TableInfo] = field(default_factory=OrderedDict)
+    counters: dict[str, int] = field(default_factory=dict)
+    last_used: float = field(default_factory=time.time)
+
+
+class AnalyticsStore:
+    def __init__(
+        self,
+        ttl_seconds: float = SCOPE_TTL_SECONDS,
+        max_tables: int = MAX_TABLES_PER_SCOPE,
+    ) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._max_tables = max_tables
+        self._scopes: dict[str, _ScopeDB] = {}
+
+    def _get_db(self, scope: str) -> _ScopeDB:
+        db = self._scopes.get(scope)
+        if db is None:
+            db = _ScopeDB(conn=sqlite3.connect(":memory:", check_same_thread=False))
+            self._scopes[scope] = db
+        db.last_used = time.time()
+        return db
+
+    def register(
+        self,
+        scope: str,
+        tool_name: str,
+        columns: list[str],
+        rows: list[list[str]],
+        text_columns: int = 0,
+    ) -> TableInfo | None:
+        """Load a table. The first ``text_columns`` columns are always TEXT
+        (e.g. GA4 dimensions such as date); the rest are typed by content."""
+        if not columns or not rows:
+            return None
+
+        db = self._get_db(scope)
+        base = _identifier(tool_name, "result").lower()
+        n = db.counters.get(base, 0) + 1
+        db.counters[base] = n
+        table = f"{base}_{n}"
+
+        # Unique column identifiers
+        idents: list[str] = []
+        for i, col in enumerate(columns):
+            ident = _identifier(col, f"col{i + 1}")
+            while ident.lower() in (x.lower() for x in idents):
+                ident = f"{ident}_{i + 1}"
+            idents.append(ident)
+
+        # Column typing: numeric when every non-empty value parses
+        width = len(columns)
+        typed_rows: list[list] = [
+            (r + [""] * (width - len(r)))[:width] for r in rows
+        ]
+        types: list[str] = []
+        for i in range(width):
+            if i < text_columns:
+                types.append("TEXT")
+                continue
+            nums = [_to_number(r[i]) for r in typed_rows if r[i] != ""]
+            if nums and all(x is not None for x in nums):
+                types.append(
+                    "INTEGER" if all(isinstance(x, int) for x in nums) else "REAL"
+                )
+                for r in typed_rows:
+                    r[i] = _to_number(r[i])
+            else:
+                types.append("TEXT")
+
+        col_defs = ", ".join(f'"{c}" {t}' for c, t in zip(idents, types))
+        placeholders = ", ".join("?" * width)
+        try:
+            with db.conn:
+                db.conn.execute(f'CREATE TABLE "{table}" ({col_defs})')
+                db.conn.executemany(
+                    f'INSERT INTO "{table}" VALUES ({placeholders})', typed_rows
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"[AnalyticsStore] Failed to load {table}: {e}")
+            return None
+
+        info = TableInfo(
+            name=table,
+            tool_name=tool_name,
+            columns=list(zip(idents, types)),
+            row_count=len(typed_rows),
+        )
+        db.tables[table] = info
+        while len(db.tables) > self._max_tables:
+            old, _ = db.tables.popitem(last=False)
+            db.conn.execute(f'DROP TABLE IF EXISTS "{old}"')
+        return info
+
+    def list_tables(self, scope: str) -> list[TableInfo]:
+        db = self._scopes.get(scope)
+        return list(db.tables.values()) if db else []
+
+    def describe(self, scope: str) -> str:
+        tables = self.list_tables(scope)
+        if not tables:
+            return "（この会話にはまだ読み込まれたテーブルがありません）"
+        return "Tables:\n" + "\n".join(t.describe() for t in tables)
+
+    def query(self, scope: str, sql: str, max_rows: int = MAX_QUERY_ROWS) -> str:
+        """Run a read-only SELECT and render the result as compact TSV."""
+        db = self._scopes.get(scope)
+        if db is None or not db.tables:
+            return self.describe(scope)
+        db.last_used = time.time()
+
+        if not sql.lstrip().lower().startswith(("select", "with")):
+            return "（SELECT 文のみ実行できます）\n" + self.describe(scope)
+
+        calls = 0
+
+        def _abort_long_query() -> int:
+            nonlocal calls
+            calls += 1
+            return 1 if calls > _MAX_PROGRESS_CALLS else 0
+
+        conn = db.conn
+        start = time.perf_counter()
+        conn.execute("PRAGMA query_only = ON")
+        conn.set_progress_handler(_abort_long_query, _PROGRESS_INTERVAL)
+        try:
+            cursor = conn.execute(sql)
+            rows = cursor.fetchmany(max_rows + 1)
+            names = [d[0] for d in cursor.description or ()]
+        except sqlite3.Error as e:
+            return f"（SQLエラー: {e}）\n" + self.describe(scope)
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.execute("PRAGMA query_only = OFF")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        more = len(rows) > max_rows
+        rows = rows[:max_rows]
+        lines = ["\t".join(names)]
+        lines.extend(
+            "\t".join("" if v is None else str(v) for v in row) for row in rows
+        )
+        lines.append("---")
+        lines.append(
+            f"rows: {len(rows)}{'+ (truncated, add LIMIT/OFFSET)' if more else ''}"
+        )
+        logger.info(
+            f"[AnalyticsStore] Query on {scope}: {len(rows)} rows in {elapsed_ms:.1f}ms"
+        )
+        return "\n".join(lines)
+
+    def clear(self, scope: str) -> None:
+        db = self._scopes.pop(scope, None)
+        if db:
+            db.conn.close()
+
+    def cleanup_expired(self) -> None:
+        now = time.time()
+        for scope in [
+            s for s, db in self._scopes.items()
+            if now - db.last_used > self._ttl_seconds
+        ]:
+            self.clear(scope)
+
+
+# Module-level singleton
+analytics_store = AnalyticsStore()
@@ -1,22 +1,47 @@
 """
 Compact MCP Server Wrapper
 ===========================
-MCPServerStdio をラップし、GA4 の verbose な proto_to_dict JSON 出力を
-compact TSV 形式に変換してトークン消費を ~76% 削減する。
+MCPServer をラップし、ツール出力をコンパクト化してトークン消費を削減する。
+ツールごとのコンパクタと文字数上限は compactors.py のレジストリで管理し、
+MCPSessionManager が生成する全サーバー（GA4 / GSC / Meta Ads / WordPress）に
+server_kind 単位で適用する。GA4 は verbose な proto_to_dict JSON を
+compact TSV 形式に変換する（~76% 削減）。
 
 変換対象ツール:
-  - run_report: dimension_headers/metric_headers/rows → TSV
-  - run_realtime_report: 同上
+  - GA4 run_report: dimension_headers/metric_headers/rows → TSV
+  - GA4 run_realtime_report: 同上
+  - Meta Ads / WordPress: compactors.py を参照
+
+文字数上限（max_tool_output_chars）を超えるレポートは先頭行で切らずに、
+主指標の上位 K 行 + 残りを合算した "(other)" 行 + 列ごとの total/min/max に
+集約する（合計値やシェアが失われないようにするため）。
+
+上限を超えた出力は result_store が渡されていれば会話単位で全件保存し、
+モデルには要約 + handle を返す（read_result ツールでページング・絞り込み可能）。
+表形式の結果（GA4 TSV / GSC マークダウン表）は analytics_store が渡されていれば
+会話単位のインメモリ SQLite にも読み込む（query_results ツールで SQL 集計可能）。
+
+dense_encoding=True（設定: COMPACT_DENSE_ENCODING）の場合は列ごとに
+辞書コード / ランレングス / 数値の短縮表記を試し、推定トークン数が最小の
+表現を採用する（凡例は "# 列名: ..." 行としてヘッダーの前に出力）。
+
+max_concurrency を指定すると、このサーバーへの同時 call_tool 数をセマフォで
+制限する（モデルの並列ツール呼び出し時。設定: MCP_DEFAULT_CONCURRENCY /
+MCP_MAX_CONCURRENCY）。
 
 非対象ツール（そのまま通す）:
   - get_account_summaries, get_property_details 等（出力が小さい）
-  - GSC ツール（既にマークダウンテーブル形式で効率的）
+  - GSC ツール（既にマークダウンテーブル形式で効率的。文字数上限のみ適用）
 """
 
 from __future__ import annotations
 
-import json
+import asyncio
+import io
 import logging
+import time
+from collections import Counter
+from itertools import chain, zip_longest
 from typing import Any, TYPE_CHECKING
 
 from mcp import Tool as MCPTool
@@ -27,6 +52,18 @@ from mcp.types import (
     TextContent,
 )
 
+from app.services.analytics_store import AnalyticsStore
+from app.services.serialization import dumps as _json_dumps, loads as _json_loads
+from app.services.compactors import (
+    CompactedOutput,
+    get_tool_compaction,
+    register_compactor,
+)
+from app.services.result_store import ResultStore, StoredResult, parse_table
+from app.services.run_budget import RunBudget
+from app.services.token_accounting import TokenAccountant
+from app.services.token_estimator import estimate_tokens
+
 if TYPE_CHECKING:
     from agents.mcp.server import MCPServer
     from agents.run_context import RunContextWrapper
@@ -34,11 +71,208 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
-# Tools whose output should be compacted
-_COMPACT_TOOLS = frozenset({"run_report", "run_realtime_report"})
+# Characters reserved at the end of a truncated output for the footer
+_FOOTER_RESERVE_CHARS = 80
+
+# Characters reserved for the result-handle / SQL-table notes
+_HANDLE_NOTE_RESERVE_CHARS = 240
+
+# GA4 metric types whose values can be summed across rows. Ratios, averages
+# and durations (TYPE_FLOAT, TYPE_SECONDS, ...) are only given min/max.
+_ADDITIVE_METRIC_TYPES = frozenset({"TYPE_INTEGER", "TYPE_CURRENCY"})
+
+
+def _row_values(row: dict) -> list[str]:
+    """Flatten one proto_to_dict report row into its string cell values."""
+    dim_vals = row.get("dimension_values") or row.get("dimensionValues") or ()
+    met_vals = row.get("metric_values") or row.get("metricValues") or ()
+    return [v.get("value", "") for v in chain(dim_vals, met_vals)]
+
+
+def _to_float(value: str) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_number(value: float | None) -> str:
+    if value is None:
+        return "-"
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.4f}".rstrip("0").rstrip(".")
+
+
+def _reduce_report(
+    header: str,
+    dim_count: int,
+    metric_headers: list[dict],
+    rows: list[dict],
+    budget: int,
+    row_count: Any,
+    max_chars: int,
+) -> tuple[str, int]:
+    """Aggregation-preserving reduction of a report that exceeds the budget.
+
+    Keeps the top-K rows by the primary (first) metric in their original
+    order, rolls every other row into one ``(other)`` row and appends
+    per-column total / min / max, so shares and sums stay answerable.
+    K is as large as the character budget allows. Returns (text, K).
+    """
+    metric_count = len(metric_headers)
+    additive = [
+        (h.get("type_") or h.get("type") or "") in _ADDITIVE_METRIC_TYPES
+        for h in metric_headers
+    ]
+
+    # One pass over every row: numeric metrics + column statistics
+    values: list[list[float | None]] = []
+    totals = [0.0] * metric_count
+    mins: list[float | None] = [None] * metric_count
+    maxs: list[float | None] = [None] * metric_count
+    for row in rows:
+        met_vals = row.get("metric_values") or row.get("metricValues") or ()
+        nums = [_to_float(v.get("value")) for v in met_vals]
+        nums.extend([None] * (metric_count - len(nums)))
+        values.append(nums)
+        for i, x in enumerate(nums):
+            if x is None:
+                continue
+            totals[i] += x
+            if mins[i] is None or x < mins[i]:
+                mins[i] = x
+            if maxs[i] is None or x > maxs[i]:
+                maxs[i] = x
+
+    def stat_line(label: str, stats: list[float | None]) -> str:
+        cells = [label] + [""] * (dim_count - 1) + [_format_number(x) for x in stats]
+        return "\t".join(cells)
+
+    total_line = stat_line(
+        "(total)", [t if add else None for t, add in zip(totals, additive)]
+    )
+    summary = "\n".join([
+        "---",
+        total_line,
+        stat_line("(min)", mins),
+        stat_line("(max)", maxs),
+        f"rows: {row_count}",
+    ])
+    # Space for the (other) row (never longer than the total row + label)
+    # and the reduction note
+    reserve = len(summary) + len(total_line) + 40 + _FOOTER_RESERVE_CHARS
+    row_budget = budget + _FOOTER_RESERVE_CHARS - reserve
+
+    # Rank rows by the primary metric, then fill the budget greedily
+    order = sorted(
+        range(len(rows)),
+        key=lambda i: values[i][0] if values[i][0] is not None else float("-inf"),
+        reverse=True,
+    )
+    picked: dict[int, str] = {}
+    size = len(header)
+    for i in order:
+        line = "\t".join(_row_values(rows[i]))
+        if size + len(line) + 1 > row_budget:
+            break
+        size += len(line) + 1
+        picked[i] = line
+    selected = sorted(picked)  # Preserve the report's own ordering (order_bys)
+
+    other = [0.0] * metric_count
+    for i, nums in enumerate(values):
+        if i in picked:
+            continue
+        for j, x in enumerate(nums):
+            if x is not None:
+                other[j] += x
+
+    other_count = len(rows) - len(selected)
+    lines = [header]
+    lines.extend(picked[i] for i in selected)
+    lines.append(stat_line(
+        f"(other: {other_count} rows)",
+        [o if add else None for o, add in zip(other, additive)],
+    ))
+    lines.append(summary)
+    primary = metric_headers[0].get("name", "") if metric_headers else ""
+    lines.append(
+        f"[reduced: top {len(selected)}/{len(rows)} rows by {primary}, "
+        f"rest rolled into (other); {max_chars} char limit]"
+    )
+    return "\n".join(lines), len(selected)
+
 
+# Dense encoding: max distinct values for a dictionary-coded column
+_DICT_MAX_CARDINALITY = 64
 
-def _compact_ga4_report(raw_json: str) -> str:
+
+def _run_encode(cells: list[str]) -> list[str]:
+    """Replace a value equal to the one in the previous row with a blank."""
+    out = []
+    prev = None
+    for cell in cells:
+        out.append("" if cell == prev else cell)
+        prev = cell
+    return out
+
+
+def _dense_encode_column(
+    name: str, cells: list[str], is_dimension: bool
+) -> tuple[list[str], str | None]:
+    """Pick the cheapest encoding for one column by estimated token count.
+
+    Candidates: plain, run-length (blank = same as row above), dictionary
+    codes with a legend line, dictionary + run-length for dimensions;
+    plain vs. compact numbers (max 4 decimals) for metrics.
+    Returns (encoded cells, legend line or None).
+    """
+    candidates: list[tuple[list[str], str | None]] = [(cells, None)]
+    if is_dimension:
+        rle_note = f"# {name}: blank = same as row above"
+        candidates.append((_run_encode(cells), rle_note))
+        counts = Counter(cells)
+        if len(counts) <= _DICT_MAX_CARDINALITY and len(counts) * 2 < len(cells):
+            codes = {v: str(i) for i, (v, _) in enumerate(counts.most_common())}
+            legend = f"# {name}: " + " | ".join(f"{c}={v}" for v, c in codes.items())
+            coded = [codes[c] for c in cells]
+            candidates.append((coded, legend))
+            candidates.append((_run_encode(coded), f"{legend} (blank = same as row above)"))
+    else:
+        compact = []
+        for cell in cells:
+            x = _to_float(cell)
+            compact.append(cell if x is None else _format_number(x))
+        candidates.append((compact, None))
+
+    def cost(candidate: tuple[list[str], str | None]) -> int:
+        encoded, legend = candidate
+        return estimate_tokens("\n".join(encoded)) + estimate_tokens(legend or "")
+
+    return min(candidates, key=cost)
+
+
+def _dense_encode(names: list[str], dim_count: int, table: list[list[str]]) -> str:
+    """Encode a report table column by column (see ``_dense_encode_column``)."""
+    columns = list(zip_longest(*table, fillvalue="")) or [()] * len(names)
+    legends: list[str] = []
+    encoded_columns = []
+    for i, (name, column) in enumerate(zip(names, columns)):
+        encoded, legend = _dense_encode_column(name, list(column), i < dim_count)
+        encoded_columns.append(encoded)
+        if legend:
+            legends.append(legend)
+    lines = legends + ["\t".join(names)]
+    lines.extend("\t".join(row) for row in zip(*encoded_columns))
+    return "\n".join(lines)
+
+
+def _compact_ga4_report(
+    raw_json: str,
+    max_chars: int | None = None,
+    dense: bool = False,
+) -> str:
     """Convert verbose GA4 proto_to_dict JSON into compact TSV.
 
     Input format (proto_to_dict):
@@ -61,48 +295,175 @@ def _compact_ga4_report(raw_json: str) -> str:
         ...
         ---
         rows: 140
+
+    Single pass: rows are written straight into one output buffer and
+    emission stops as soon as ``max_chars`` would be exceeded. Reports that
+    do not fit are handed to ``_reduce_report`` (top rows + ``(other)`` +
+    total/min/max). The footer always reports the true row total from the
+    API response.
     """
+    data = _parse_ga4_report(raw_json)
+    if data is None:
+        return raw_json  # Not a report response, return as-is
+    return _format_ga4_report(data, len(raw_json), max_chars, dense)[0]
+
+
+def _parse_ga4_report(raw_json: str) -> dict | None:
+    """Parse run_report JSON; None unless it has headers and rows."""
+    # Cheap pre-check: proto_to_dict output is always a JSON object
+    if not isinstance(raw_json, str) or not raw_json.lstrip().startswith("{"):
+        return None
+
     try:
-        data = json.loads(raw_json)
-    except (json.JSONDecodeError, TypeError):
-        return raw_json  # Not JSON, return as-is
+        data = _json_loads(raw_json)
+    except (ValueError, TypeError):
+        return None  # Not JSON
 
     if not isinstance(data, dict):
-        return raw_json
+        return None
 
     dim_headers = data.get("dimension_headers") or data.get("dimensionHeaders")
     metric_headers = data.get("metric_headers") or data.get("metricHeaders")
-    rows = data.get("rows")
+    if not dim_headers or not metric_headers or not data.get("rows"):
+        return None
+    return data
 
-    if not dim_headers or not metric_headers or not rows:
-        return raw_json  # Not a report response, return as-is
 
-    # Build header row
-    dim_names = [h.get("name", "") for h in dim_headers]
-    metric_names = [h.get("name", "") for h in metric_headers]
-    header = "\t".join(dim_names + metric_names)
+def _report_columns(data: dict) -> tuple[list[dict], list[dict], list[str]]:
+    """Return (dimension headers, metric headers, column names)."""
+    dim_headers = data.get("dimension_headers") or data.get("dimensionHeaders")
+    metric_headers = data.get("metric_headers") or data.get("metricHeaders")
+    names = [h.get("name", "") for h in chain(dim_headers, metric_headers)]
+    return dim_headers, metric_headers, names
 
-    # Build data rows
-    lines = [header]
-    for row in rows:
-        dim_vals = row.get("dimension_values") or row.get("dimensionValues") or []
-        met_vals = row.get("metric_values") or row.get("metricValues") or []
 
-        dim_strs = [v.get("value", "") for v in dim_vals]
-        met_strs = [v.get("value", "") for v in met_vals]
-        lines.append("\t".join(dim_strs + met_strs))
+def _format_ga4_report(
+    data: dict,
+    raw_len: int,
+    max_chars: int | None = None,
+    dense: bool = False,
+) -> tuple[str, int, int]:
+    """Format a parsed report (see ``_compact_ga4_report``).
 
-    # Add metadata footer
-    row_count = data.get("row_count") or data.get("rowCount") or len(rows)
-    lines.append("---")
-    lines.append(f"rows: {row_count}")
+    Returns (text, rows shown verbatim, rows returned by the API).
+    """
+    dim_headers, metric_headers, names = _report_columns(data)
+    rows = data["rows"]
+    returned = len(rows)
+    row_count = data.get("row_count") or data.get("rowCount") or returned
+
+    if dense:
+        table = [_row_values(row) for row in rows]
+        result = _dense_encode(names, len(dim_headers), table)
+        result += f"\n---\nrows: {row_count}"
+        if not max_chars or len(result) <= max_chars:
+            logger.info(
+                f"[CompactMCP] Dense-encoded GA4 report: {raw_len} → "
+                f"{len(result)} chars ({returned} rows)"
+            )
+            return result, returned, returned
+
+    # Header row
+    header = "\t".join(names)
+
+    budget = max_chars - _FOOTER_RESERVE_CHARS if max_chars else None
+    buf = io.StringIO()
+    buf.write(header)
+    size = len(header)
+    kept = 0
+
+    # Data rows
+    for row in rows:
+        line = "\t".join(_row_values(row))
+        size += len(line) + 1
+        if budget is not None and size > budget:
+            break
+        buf.write("\n")
+        buf.write(line)
+        kept += 1
+
+    if kept < returned:
+        # Over budget: keep top rows + (other) + totals instead of a head cut
+        result, kept = _reduce_report(
+            header, len(dim_headers), metric_headers, rows,
+            budget, row_count, max_chars,
+        )
+    else:
+        # Metadata footer
+        buf.write(f"\n---\nrows: {row_count}")
+        result = buf.getvalue()
 
-    result = "\n".join(lines)
     logger.info(
-        f"[CompactMCP] Compressed GA4 report: {len(raw_json)} → {len(result)} chars "
-        f"({100 - len(result) * 100 // max(len(raw_json), 1)}% reduction)"
+        f"[CompactMCP] Compressed GA4 report: {raw_len} → {len(result)} chars "
+        f"({100 - len(result) * 100 // max(raw_len, 1)}% reduction, "
+        f"{kept}/{returned} rows)"
+    )
+    return result, kept, returned
+
+
+@register_compactor("ga4", "run_report", "run_realtime_report")
+def compact_ga4_output(
+    text: str, max_chars: int, dense: bool
+) -> CompactedOutput | None:
+    """Registry entry for GA4 report tools (see ``_compact_ga4_report``)."""
+    data = _parse_ga4_report(text)
+    if data is None:
+        return None
+    compacted, kept, returned = _format_ga4_report(data, len(text), max_chars, dense)
+    dim_headers, _, names = _report_columns(data)
+    return CompactedOutput(
+        text=compacted,
+        columns=names,
+        # Built only if the result is spilled or loaded into SQL
+        row_factory=lambda: [_row_values(row) for row in data["rows"]],
+        text_columns=len(dim_headers),
+        complete=kept == returned,
+    )
+
+
+def _truncate_lines(text: str, max_chars: int) -> tuple[str, int, int]:
+    """Cut ``text`` at the last line boundary that fits in ``max_chars``.
+
+    Scans forward for newlines instead of splitting the whole text, so only
+    the kept prefix is ever copied. A first line longer than the budget is
+    cut mid-line. Returns (text, kept_lines, total_lines).
+    """
+    limit = max_chars - _FOOTER_RESERVE_CHARS
+    cut = 0
+    kept = 0
+    while True:
+        nl = text.find("\n", cut, limit + 1)
+        if nl == -1:
+            break
+        cut = nl + 1
+        kept += 1
+    total = text.count("\n") + 1
+    if cut == 0:
+        # A single line over the budget (e.g. one-line JSON): keep its head
+        return (
+            f"{text[:limit]}\n---\n"
+            f"[truncated: showing {limit}/{len(text)} chars, {max_chars} char limit]"
+        ), 0, total
+    truncated = (
+        f"{text[:cut]}---\n"
+        f"[truncated: showing {kept}/{total} lines, {max_chars} char limit]"
     )
-    return result
+    return truncated, kept, total
+
+
+def _handle_note(stored: StoredResult) -> str:
+    if stored.is_table:
+        size = f"{len(stored.rows)} rows x {len(stored.columns)} cols"
+    else:
+        size = f"{len(stored.text)} chars"
+    return (
+        f"\n[full result stored: handle={stored.handle} ({size}). "
+        f'Use read_result(handle="{stored.handle}") to page, filter or sort it]'
+    )
+
+
+def _table_note(table_name: str) -> str:
+    return f"\n[sql table: {table_name}. Use query_results to aggregate it with SQL]"
 
 
 class CompactMCPServer:
@@ -110,15 +471,46 @@ class CompactMCPServer:
 
     Implements the same interface as MCPServer so the Agents SDK treats it
     as a regular MCP server. Delegates all calls to the inner server,
-    but transforms call_tool outputs for specific tools.
+    but transforms call_tool outputs with the compactor registered for
+    (server_kind, tool_name).
 
     Also enforces a max character limit on ALL tool outputs to prevent
-    context window overflow.
+    context window overflow. When given a result store and scope, outputs
+    over the limit are stored in full and returned as a summary + handle.
     """
 
-    def __init__(self, inner: Any, max_output_chars: int = 16000):
+    def __init__(
+        self,
+        inner: Any,
+        max_output_chars: int = 16000,
+        dense_encoding: bool = False,
+        result_store: ResultStore | None = None,
+        result_scope: str | None = None,
+        analytics_store: AnalyticsStore | None = None,
+        server_kind: str = "ga4",
+        tool_budgets: dict[str, int] | None = None,
+        accountant: TokenAccountant | None = None,
+        max_concurrency: int | None = None,
+        budget: RunBudget | None = None,
+    ):
         self._inner = inner
         self._max_output_chars = max_output_chars
+        self._dense_encoding = dense_encoding
+        # Oversized outputs are spilled here (per conversation) when set
+        self._result_store = result_store if result_scope else None
+        self._result_scope = result_scope
+        # Tabular outputs are loaded as SQL tables (per conversation) when set
+        self._analytics_store = analytics_store
+        # Compactor registry key, e.g. "ga4" / "gsc" / "meta_ads" / "wordpress"
+        self._server_kind = server_kind
+        # Per-tool char budget overrides: {"tool"} or {"kind:tool"} -> chars
+        self._tool_budgets = tool_budgets or {}
+        # Per-call token accounting (argument / raw / compacted output tokens)
+        self._accountant = accountant if result_scope else None
+        # Max in-flight call_tool requests to this server (None: unlimited)
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        # Per-run tool-call budget (calls past the limit return a tool error)
+        self._budget = budget
 
     # --- Proxied properties ---
 
@@ -157,51 +549,130 @@ class CompactMCPServer:
     async def call_tool(
         self, tool_name: str, arguments: dict[str, Any] | None
     ) -> CallToolResult:
-        result = await self._inner.call_tool(tool_name, arguments)
+        if self._budget is not None:
+            refused = self._budget.check_tool_call(self._server_kind)
+            if refused:
+                return CallToolResult(
+                    content=[TextContent(type="text", text=refused)], isError=True
+                )
+
+        if self._semaphore is None:
+            result = await self._inner.call_tool(tool_name, arguments)
+        else:
+            queued = time.perf_counter()
+            async with self._semaphore:
+                waited_ms = (time.perf_counter() - queued) * 1000
+                if waited_ms >= 1:
+                    logger.info(
+                        f"[CompactMCP] {self._server_kind}:{tool_name} waited "
+                        f"{waited_ms:.0f}ms for a concurrency slot"
+                    )
+                result = await self._inner.call_tool(tool_name, arguments)
 
         if not result or not hasattr(result, "content") or not result.content:
             return result
 
         new_content = []
+        raw_texts: list[str] = []
+        texts: list[str] = []
         for item in result.content:
             if not hasattr(item, "text") or not item.text:
                 new_content.append(item)
                 continue
 
-            text = item.text
-
-            # Apply GA4 report compaction for specific tools
-            if tool_name in _COMPACT_TOOLS:
-                text = _compact_ga4_report(text)
-
-            # Enforce max output character limit
-            if len(text) > self._max_output_chars:
-                # For TSV: truncate by lines to keep data coherent
-                lines = text.split("\n")
-                truncated_lines = []
-                char_count = 0
-                for line in lines:
-                    if char_count + len(line) + 1 > self._max_output_chars - 80:
-                        break
-                    truncated_lines.append(line)
-                    char_count += len(line) + 1
-                total_lines = len(lines)
-                kept_lines = len(truncated_lines)
-                truncated_lines.append("---")
-                truncated_lines.append(
-                    f"[truncated: showing {kept_lines}/{total_lines} lines, "
-                    f"{self._max_output_chars} char limit]"
-                )
-                text = "\n".join(truncated_lines)
-                logger.info(
-                    f"[CompactMCP] Truncated {tool_name} output: "
-                    f"{kept_lines}/{total_lines} lines kept"
-                )
-
+            text = self._compact_text(tool_name, item.text)
             new_content.append(TextContent(type="text", text=text))
+            raw_texts.append(item.text)
+            texts.append(text)
+
+        if self._accountant is not None:
+            self._accountant.record_tool_call(
+                self._result_scope,
+                tool_name,
+                _json_dumps(arguments or {}),
+                "\n".join(raw_texts),
+                "\n".join(texts),
+            )
 
         return CallToolResult(content=new_content, isError=result.isError)
 
+    def _budget_for(self, tool_name: str, registered: int | None) -> int:
+        """Char budget: settings override > registry default > global cap."""
+        return (
+            self._tool_budgets.get(f"{self._server_kind}:{tool_name}")
+            or self._tool_budgets.get(tool_name)
+            or registered
+            or self._max_output_chars
+        )
+
+    def _compact_text(self, tool_name: str, text: str) -> str:
+        """Compact one text content item and enforce the output budget.
+
+        The registered compactor for (server_kind, tool) runs first. With a
+        result store configured, anything that does not fit is stored in
+        full and the returned text ends with a handle note. With an
+        analytics store configured, every tabular result is also loaded as
+        a SQL table and the table name is noted.
+        """
+        scope = self._result_scope
+        spill = self._result_store is not None
+        analytics = self._analytics_store if scope else None
+        compaction = get_tool_compaction(self._server_kind, tool_name)
+        max_chars = self._budget_for(
+            tool_name, compaction.max_chars if compaction else None
+        )
+        if spill or analytics is not None:
+            max_chars -= _HANDLE_NOTE_RESERVE_CHARS
+
+        # Registered compactor (budget-aware)
+        if compaction is not None and compaction.compactor is not None:
+            out = compaction.compactor(text, max_chars, self._dense_encoding)
+            if out is not None:
+                compacted = out.text
+                store = spill and not out.complete
+                needs_table = out.columns and (store or analytics is not None)
+                rows = out.table_rows() if needs_table else None
+                if rows:
+                    if store:
+                        stored = self._result_store.put(
+                            scope, tool_name, columns=out.columns, rows=rows
+                        )
+                        compacted += _handle_note(stored)
+                    if analytics is not None:
+                        info = analytics.register(
+                            scope, tool_name, out.columns, rows,
+                            text_columns=out.text_columns,
+                        )
+                        if info is not None:
+                            compacted += _table_note(info.name)
+                return compacted
+
+        table_name = None
+        if analytics is not None:
+            parsed = parse_table(text)
+            if parsed and parsed[1]:
+                info = analytics.register(scope, tool_name, *parsed)
+                table_name = info.name if info else None
+
+        # Enforce max output character limit
+        if len(text) > max_chars:
+            stored = (
+                self._result_store.put_text(scope, tool_name, text)
+                if spill else None
+            )
+            # Truncate by lines to keep data coherent
+            text, kept_lines, total_lines = _truncate_lines(text, max_chars)
+            logger.info(
+                f"[CompactMCP] Truncated {tool_name} output: "
+                f"{kept_lines}/{total_lines} lines kept"
+            )
+            if stored is not None:
+                text += _handle_note(stored)
+
+        if table_name:
+            text += _table_note(table_name)
+        return text
+
     async def list_prompts(self) -> ListPromptsResult:
         return await self._inner.list_prompts()
 
@@ -0,0 +1,297 @@
+"""
+Tool Output Compactor Registry
+===============================
+(server_kind, tool_name) ごとの出力コンパクタと文字数上限を登録するレジストリ。
+CompactMCPServer が全 MCP サーバー（GA4 / GSC / Meta Ads / WordPress）の
+ツール出力に一律で適用する。
+
+server_kind: "ga4" | "gsc" | "meta_ads" | "wordpress"
+tool_name:   完全一致、または fnmatch パターン（例: "*posts*"）
+
+登録済みコンパクタ:
+  - ga4:       run_report / run_realtime_report → TSV（compact_mcp.py）
+  - meta_ads:  get_insights / get_campaigns 等 → TSV（actions は列に展開）
+  - wordpress: 投稿・固定ページ一覧 → TSV（本文 HTML を除去、抜粋のみ）
+"""
+
+from __future__ import annotations
+
+import html
+import logging
+import re
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Any, Callable
+
+from app.services.serialization import dumps as _json_dumps, loads as _json_loads
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CompactedOutput:
+    """Result of a compactor.
+
+    ``columns``/``rows`` carry the full table (all rows, not only the ones
+    shown in ``text``) so it can be stored for paging and SQL. A compactor
+    may pass ``row_factory`` instead of ``rows`` so the table is only built
+    when it is actually stored (``table_rows()``).
+    ``complete`` is False when ``text`` omits rows of the table.
+    """
+    text: str
+    columns: list[str] = field(default_factory=list)
+    rows: list[list[str]] = field(default_factory=list)
+    text_columns: int = 0  # Leading columns that are always TEXT in SQL
+    complete: bool = True
+    row_factory: Callable[[], list[list[str]]] | None = None
+
+    def table_rows(self) -> list[list[str]]:
+        """The full table rows, built on first use when deferred."""
+        if self.row_factory is not None:
+            self.rows = self.row_factory()
+            self.row_factory = None
+        return self.rows
+
+
+# compactor(text, max_chars, dense) -> CompactedOutput, or None to fall back
+# to the generic path (output passed through with the character cap)
+Compactor = Callable[[str, int, bool], "CompactedOutput | None"]
+
+
+@dataclass(frozen=True)
+class ToolCompaction:
+    compactor: Compactor | None
+    max_chars: int | None = None  # None: settings.max_tool_output_chars
+
+
+_REGISTRY: dict[tuple[str, str], ToolCompaction] = {}
+
+
+def register_compactor(
+    server_kind: str, *tool_patterns: str, max_chars: int | None = None
+) -> Callable[[Compactor], Compactor]:
+    """Decorator registering a compactor for (server_kind, tool) patterns."""
+    def decorator(fn: Compactor) -> Compactor:
+        for pattern in tool_patterns:
+            _REGISTRY[(server_kind, pattern)] = ToolCompaction(fn, max_chars)
+        return fn
+    return decorator
+
+
+def get_tool_compaction(server_kind: str, tool_name: str) -> ToolCompaction | None:
+    """Look up a compaction: exact tool name first, then fnmatch patterns."""
+    exact = _REGISTRY.get((server_kind, tool_name))
+    if exact is not None:
+        return exact
+    for (kind, pattern), compaction in _REGISTRY.items():
+        if kind == server_kind and fnmatchcase(tool_name, pattern):
+            return compaction
+    return None
+
+
+# ── Shared helpers ──
+
+
+def emit_tsv(
+    columns: list[str],
+    rows: list[list[str]],
+    max_chars: int | None,
+    footer: str,
+    reserve: int = 80,
+) -> tuple[str, int]:
+    """Write header + rows as TSV until ``max_chars`` (minus ``reserve`` for
+    the footer) would be exceeded. Returns (text, rows written)."""
+    budget = max_chars - reserve if max_chars else None
+    header = "\t".join(columns)
+    lines = [header]
+    size = len(header)
+    for row in rows:
+        line = "\t".join(row)
+        size += len(line) + 1
+        if budget is not None and size > budget:
+            break
+        lines.append(line)
+    kept = len(lines) - 1
+    lines.append("---")
+    lines.append(footer)
+    if kept < len(rows):
+        lines.append(
+            f"[truncated: showing {kept}/{len(rows)} rows, {max_chars} char limit]"
+        )
+    return "\n".join(lines), kept
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.replace("\t", " ").replace("\n", " ")
+    if isinstance(value, (int, float, bool)):
+        return str(value)
+    return _json_dumps(value)
+
+
+def records_to_table(records: list[dict]) -> tuple[list[str], list[list[str]]]:
+    """Flatten a list of JSON records into (columns, rows).
+
+    - Lists of {"action_type", "value"} (Meta Ads actions) become one column
+      per action type: ``actions.link_click``.
+    - Nested dicts are flattened one level: ``targeting.age_min``.
+    - Anything else nested is kept as compact JSON.
+    """
+    flat_records: list[dict[str, str]] = []
+    columns: dict[str, None] = {}  # Ordered set
+    for record in records:
+        flat: dict[str, str] = {}
+        for key, value in record.items():
+            if (
+                isinstance(value, list)
+                and value
+                and all(isinstance(v, dict) and "action_type" in v for v in value)
+            ):
+                for v in value:
+                    flat[f"{key}.{v['action_type']}"] = _cell(v.get("value"))
+            elif isinstance(value, dict):
+                for sub, sub_value in value.items():
+                    flat[f"{key}.{sub}"] = _cell(sub_value)
+            else:
+                flat[key] = _cell(value)
+        for key in flat:
+            columns.setdefault(key, None)
+        flat_records.append(flat)
+
+    names = list(columns)
+    rows = [[flat.get(c, "") for c in names] for flat in flat_records]
+    return names, rows
+
+
+def _parse_json(text: str) -> Any:
+    stripped = text.lstrip()
+    if not stripped.startswith(("{", "[")):
+        return None
+    try:
+        return _json_loads(text)
+    except (ValueError, TypeError):
+        return None
+
+
+# ── Meta Ads ──
+
+
+@register_compactor(
+    "meta_ads",
+    "get_insights", "get_campaigns", "get_adsets", "get_ads",
+    max_chars=12000,
+)
+def compact_meta_records(
+    text: str, max_chars: int, dense: bool
+) -> CompactedOutput | None:
+    """Graph API list responses ({"data": [...], "paging": {...}}) → TSV.
+
+    ``paging`` cursors are dropped; the rows footer reports how many records
+    the response contained.
+    """
+    data = _parse_json(text)
+    if isinstance(data, dict):
+        records = data.get("data")
+    else:
+        records = data
+    if (
+        not isinstance(records, list)
+        or not records
+        or not all(isinstance(r, dict) for r in records)
+    ):
+        return None  # Errors, single objects, etc.
+
+    columns, rows = records_to_table(records)
+    more = " (more pages available)" if isinstance(data, dict) and (
+        data.get("paging") or {}
+    ).get("next") else ""
+    compacted, kept = emit_tsv(
+        columns, rows, max_chars, f"rows: {len(rows)}{more}"
+    )
+    logger.info(
+        f"[Compactors] Meta Ads records: {len(text)} → {len(compacted)} chars "
+        f"({kept}/{len(rows)} rows)"
+    )
+    return CompactedOutput(
+        text=compacted, columns=columns, rows=rows, complete=kept == len(rows)
+    )
+
+
+# ── WordPress ──
+
+_HTML_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+_EXCERPT_CHARS = 160
+# Fields that are large and useless in a listing
+_WP_DROP_FIELDS = frozenset({
+    "content", "_links", "_embedded", "guid", "meta",
+    "yoast_head", "yoast_head_json", "block_data", "class_list",
+})
+_WP_POST_FIELDS = frozenset({"title", "slug", "link", "status"})
+# Listing tools (optionally site-prefixed, e.g. achieve__wp-mcp-get-posts-by-category)
+_WP_LISTING_TOOLS = (
+    "*get-posts*", "*get-pages*", "*list-posts*", "*list-pages*", "*search-posts*",
+)
+
+
+def _strip_html(value: str) -> str:
+    text = html.unescape(_HTML_TAG.sub(" ", value))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _wp_listing(data: Any) -> list[dict] | None:
+    """Return the post/page records of a listing response, else None."""
+    if isinstance(data, dict):
+        for key in ("posts", "pages", "items", "data", "results"):
+            if isinstance(data.get(key), list):
+                data = data[key]
+                break
+    if not isinstance(data, list) or not data:
+        return None
+    if not all(isinstance(r, dict) and _WP_POST_FIELDS & r.keys() for r in data):
+        return None
+    return data
+
+
+# Only listings get the tighter budget; other tools (single posts, edits)
+# keep the global cap
+@register_compactor("wordpress", "*")
+@register_compactor("wordpress", *_WP_LISTING_TOOLS, max_chars=8000)
+def compact_wordpress_listing(
+    text: str, max_chars: int, dense: bool
+) -> CompactedOutput | None:
+    """Post / page listings → TSV without HTML bodies.
+
+    ``content`` and other heavy fields are dropped; ``{"rendered": ...}``
+    objects are unwrapped and the excerpt is reduced to plain text.
+    Single-post responses are left untouched (their body is needed for
+    editing).
+    """
+    records = _wp_listing(_parse_json(text))
+    if records is None:
+        return None
+
+    slim = []
+    for record in records:
+        item = {}
+        for key, value in record.items():
+            if key in _WP_DROP_FIELDS:
+                continue
+            if isinstance(value, dict) and "rendered" in value:
+                value = value["rendered"]
+            if key == "excerpt" and isinstance(value, str):
+                value = _strip_html(value)[:_EXCERPT_CHARS]
+            item[key] = value
+        slim.append(item)
+
+    columns, rows = records_to_table(slim)
+    compacted, kept = emit_tsv(columns, rows, max_chars, f"rows: {len(rows)}")
+    logger.info(
+        f"[Compactors] WordPress listing: {len(text)} → {len(compacted)} chars "
+        f"({kept}/{len(rows)} rows)"
+    )
+    return CompactedOutput(
+        text=compacted, columns=columns, rows=rows, complete=kept == len(rows)
+    )
@@ -0,0 +1,240 @@
+"""Rolling compaction of saved conversation context.
+
+``stream_chat`` replays the saved ``context_items`` (Responses API input
+format) on every turn. This module keeps that input under a token budget
+before it reaches ``Runner.run_streamed``:
+
+1. The most recent turns (user message onward) are always kept verbatim.
+2. In older turns, tool outputs are replaced by a short head plus an
+   elision marker (result-handle / SQL-table notes are preserved so the
+   data stays reachable via read_result / query_results), and large tool
+   arguments are elided.
+3. Older reasoning items are dropped. The items generated after them
+   (function calls, assistant messages) lose their ``fc_`` / ``msg_`` ids,
+   since the API rejects an item whose paired reasoning item is missing.
+4. If still over budget, the oldest turns are dropped entirely.
+
+Each step runs oldest-first and only until the context is down to
+``target_ratio`` of the budget. The headroom lets the next turns append to
+the compacted context unchanged (an append-only save, and a stable cached
+prompt prefix) until the budget is crossed again. A single developer note
+tells the model that earlier context was compacted, and a
+``ContextCompactionReport`` records what was elided.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.services.serialization import dumps
+from app.services.token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_NOTE_MARKER = "[context-compaction]"
+_COMPACTION_NOTE = (
+    f"{COMPACTION_NOTE_MARKER} 会話が長いため、以前のターンのツール出力・推論の一部を省略した。"
+    "省略されたデータが必要な場合は、出力に残っている handle / sql table を "
+    "read_result / query_results で参照するか、ツールを再実行せよ。"
+)
+_OUTPUT_HEAD_CHARS = 300
+_ARGUMENTS_MAX_CHARS = 1000
+# Notes appended by CompactMCPServer that must survive elision
+_PRESERVED_NOTE_PREFIXES = ("[full result stored:", "[sql table:")
+# Token counts of recently seen items, keyed by the hash of their JSON: the
+# whole history is re-measured every turn, but only the new items need
+# tokenizing
+_TOKEN_CACHE_SIZE = 8192
+_token_cache: OrderedDict[int, int] = OrderedDict()
+
+
+@dataclass
+class ContextCompactionReport:
+    tokens_before: int = 0
+    tokens_after: int = 0
+    elided_outputs: int = 0
+    elided_arguments: int = 0
+    dropped_reasoning: int = 0
+    dropped_turns: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(
+            self.elided_outputs or self.elided_arguments
+            or self.dropped_reasoning or self.dropped_turns
+        )
+
+
+def _item_tokens(item: dict) -> int:
+    text = dumps(item, default=str)
+    key = hash(text)
+    tokens = _token_cache.get(key)
+    if tokens is None:
+        tokens = _token_cache[key] = estimate_tokens(text)
+        if len(_token_cache) > _TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    else:
+        _token_cache.move_to_end(key)
+    return tokens
+
+
+def _is_user_message(item: dict) -> bool:
+    return item.get("role") == "user" and item.get("type", "message") == "message"
+
+
+def _is_model_output(item: dict) -> bool:
+    """Function calls and assistant messages: generated together with the
+    reasoning item before them (their ``fc_`` / ``msg_`` ids refer to it)."""
+    item_type = item.get("type", "message")
+    return item_type == "function_call" or (
+        item_type == "message" and item.get("role") == "assistant"
+    )
+
+
+def _is_compaction_note(item: dict) -> bool:
+    content = item.get("content")
+    return (
+        item.get("role") == "developer"
+        and isinstance(content, str)
+        and content.startswith(COMPACTION_NOTE_MARKER)
+    )
+
+
+def _output_text(output) -> str:
+    if isinstance(output, str):
+        return output
+    return json.dumps(output, ensure_ascii=False, default=str)
+
+
+def _elide_output(output) -> str:
+    text = _output_text(output)
+    notes = [
+        line for line in text.splitlines()
+        if line.startswith(_PRESERVED_NOTE_PREFIXES)
+    ]
+    head = text[:_OUTPUT_HEAD_CHARS].rsplit("\n", 1)[0]
+    return "\n".join(
+        [head, f"[elided: {len(text)} chars of earlier tool output]", *notes]
+    )
+
+
+def _split_turns(items: list[dict]) -> list[list[dict]]:
+    """Group items into turns, each starting at a user message."""
+    turns: list[list[dict]] = []
+    for item in items:
+        if _is_user_message(item) or not turns:
+            turns.append([])
+        turns[-1].append(item)
+    return turns
+
+
+def _with_note(items: list[dict], note: bool) -> list[dict]:
+    if not note:
+        return items
+    return [{"role": "developer", "content": _COMPACTION_NOTE}, *items]
+
+
+def compact_context(
+    items: list[dict],
+    token_budget: int,
+    keep_recent_turns: int = 3,
+    target_ratio: float = 1.0,
+) -> tuple[list[dict], ContextCompactionReport]:
+    """Return (items under ``token_budget`` where possible, report).
+
+    Over the budget, items are compacted down to ``token_budget *
+    target_ratio``.
+
+    Items are copied only when modified; the input list is not mutated.
+    """
+    report = ContextCompactionReport()
+    # The note is re-inserted at the front below; never duplicate it
+    had_note = any(_is_compaction_note(item) for item in items)
+    if had_note:
+        items = [item for item in items if not _is_compaction_note(item)]
+    sizes = [_item_tokens(item) for item in items]
+    total = sum(sizes)
+    report.tokens_before = report.tokens_after = total
+    if total <= token_budget:
+        return _with_note(items, had_note), report
+
+    turns = _split_turns(items)
+    old_turns = turns[:-keep_recent_turns] if keep_recent_turns else turns
+    if not old_turns:
+        return _with_note(items, had_note), report
+    target = int(token_budget * target_ratio)
+
+    size_of: dict[int, int] = {id(item): size for item, size in zip(items, sizes)}
+
+    # 1. Elide old tool outputs / large arguments, oldest first
+    for turn in old_turns:
+        for i, item in enumerate(turn):
+            if total <= target:
+                break
+            item_type = item.get("type")
+            if item_type == "function_call_output":
+                text = _output_text(item.get("output", ""))
+                if len(text) <= _OUTPUT_HEAD_CHARS:
+                    continue
+                new_item = {**item, "output": _elide_output(text)}
+                report.elided_outputs += 1
+            elif item_type == "function_call":
+                arguments = item.get("arguments") or ""
+                if len(arguments) <= _ARGUMENTS_MAX_CHARS:
+                    continue
+                new_item = {
+                    **item,
+                    "arguments": json.dumps({"_elided": f"{len(arguments)} chars"}),
+                }
+                report.elided_arguments += 1
+            else:
+                continue
+            new_size = _item_tokens(new_item)
+            total -= size_of.get(id(item), 0) - new_size
+            size_of[id(new_item)] = new_size
+            turn[i] = new_item
+
+    # 2. Drop old reasoning items, oldest first, with the ids of the items
+    #    they produced
+    for turn in old_turns:
+        if total <= target:
+            break
+        kept = []
+        orphaned = False  # After a dropped reasoning item
+        for item in turn:
+            if item.get("type") == "reasoning":
+                orphaned = total > target
+                if orphaned:
+                    total -= size_of.get(id(item), 0)
+                    report.dropped_reasoning += 1
+                    continue
+            elif orphaned and "id" in item and _is_model_output(item):
+                new_item = {k: v for k, v in item.items() if k != "id"}
+                new_size = _item_tokens(new_item)
+                total -= size_of.get(id(item), 0) - new_size
+                size_of[id(new_item)] = new_size
+                item = new_item
+            kept.append(item)
+        turn[:] = kept
+
+    # 3. Drop whole old turns, oldest first
+    dropped = 0
+    while dropped < len(old_turns) and total > target:
+        total -= sum(size_of.get(id(item), 0) for item in old_turns[dropped])
+        dropped += 1
+    report.dropped_turns = dropped
+
+    result = [item for turn in turns[dropped:] for item in turn]
+    report.tokens_after = total
+    if report.changed:
+        logger.info(
+            f"[ContextCompactor] {report.tokens_before} → {report.tokens_after} tokens "
+            f"(outputs elided={report.elided_outputs}, "
+            f"arguments elided={report.elided_arguments}, "
+            f"reasoning dropped={report.dropped_reasoning}, "
+            f"turns dropped={report.dropped_turns})"
+        )
+    return _with_note(result, had_note or report.changed), report
@@ -0,0 +1,124 @@
+"""Async Supabase data layer.
+
+One ``AsyncClient`` per worker, backed by a pooled keep-alive httpx client,
+replaces the sync client that ``get_supabase()`` used to build per request
+(and whose ``.execute()`` calls blocked the event loop).
+
+Queries are built as usual and awaited through ``database.execute``, which
+records per-query latency keyed by "<HTTP method> <table>":
+
+    result = await database.execute(
+        database.table("users").select("*").eq("clerk_id", clerk_id)
+    )
+
+Tests can swap the client for a local stand-in with ``database.use(client)``
+(anything with a supabase-style ``table()`` builder whose ``execute()`` is
+awaitable).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.config import get_settings
+from app.services.latency import latency_samples, latency_summary
+
+logger = logging.getLogger(__name__)
+
+_SLOW_QUERY_MS = 1000
+
+
+@dataclass
+class QueryMetrics:
+    count: int = 0
+    errors: int = 0
+    latency_ms: deque = field(default_factory=latency_samples)
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "errors": self.errors, **latency_summary(self.latency_ms)}
+
+
+def _query_label(query: Any) -> str:
+    request = getattr(query, "request", None)
+    if request is None:
+        return "query"
+    table = str(getattr(request, "path", "")).rstrip("/").rsplit("/", 1)[-1]
+    return f"{getattr(request, 'http_method', '?')} {table}"
+
+
+def _create_client() -> AsyncClient:
+    settings = get_settings()
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.supabase_max_connections,
+            max_keepalive_connections=settings.supabase_max_connections,
+            keepalive_expiry=settings.supabase_keepalive_seconds,
+        ),
+        timeout=settings.supabase_timeout_seconds,
+        follow_redirects=True,
+    )
+    return AsyncClient(
+        settings.supabase_url,
+        settings.supabase_service_role_key,
+        AsyncClientOptions(httpx_client=http_client),
+    )
+
+
+class Database:
+    def __init__(self) -> None:
+        self._client: Any = None
+        self._lock = threading.Lock()
+        self._metrics: dict[str, QueryMetrics] = {}
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = _create_client()
+        return self._client
+
+    def use(self, client: Any) -> None:
+        """Replace the client (e.g. a local stand-in in tests)."""
+        self._client = client
+
+    def table(self, name: str) -> Any:
+        return self.client.table(name)
+
+    async def execute(self, query: Any) -> Any:
+        label = _query_label(query)
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await query.execute()
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                metrics = self._metrics.setdefault(label, QueryMetrics())
+                metrics.count += 1
+                metrics.errors += failed
+                metrics.latency_ms.append(elapsed_ms)
+            if elapsed_ms >= _SLOW_QUERY_MS:
+                logger.warning(f"[Database] Slow query {label}: {elapsed_ms:.0f}ms")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {label: m.to_dict() for label, m in sorted(self._metrics.items())}
+
+    async def aclose(self) -> None:
+        """Close pooled connections (shutdown)."""
+        client, self._client = self._client, None
+        postgrest = getattr(client, "_postgrest", None)
+        if postgrest is not None:
+            await postgrest.aclose()
+
+
+# Module-level singleton
+database = Database()
@@ -0,0 +1,106 @@
+"""Stream stages between ``AgentService.stream_chat`` and the SSE response.
+
+``coalesce_text_deltas`` merges consecutive ``text_delta`` events (often a
+single token each) into one event per ``interval_ms`` or ``max_bytes``,
+whichever comes first. Any other event flushes the pending text first and
+is passed through immediately, so ordering is preserved and tool / chart /
+ask_user events are never delayed.
+"""
+
+import asyncio
+import time
+from typing import AsyncGenerator, AsyncIterator
+
+_END = object()
+
+
+async def coalesce_text_deltas(
+    events: AsyncIterator[dict],
+    interval_ms: int = 50,
+    max_bytes: int = 1024,
+) -> AsyncGenerator[dict, None]:
+    """Yield ``events`` with consecutive text deltas merged.
+
+    ``interval_ms <= 0`` disables coalescing (events pass through as-is).
+    """
+    if interval_ms <= 0:
+        async for event in events:
+            yield event
+        return
+
+    # The source is consumed by a single producer task: stream_chat holds
+    # MCP sessions (anyio scopes) that must be entered and exited in the
+    # same task.
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def _produce() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            # Close the source here (same task) rather than leaving it to
+            # async generator finalization: it owns the run's MCP sessions
+            aclose = getattr(events, "aclose", None)
+            try:
+                if aclose is not None:
+                    await aclose()
+            finally:
+                await queue.put(_END)
+
+    producer = asyncio.create_task(_produce())
+    interval = interval_ms / 1000
+    parts: list[str] = []
+    size = 0
+    deadline = 0.0
+
+    def _flush() -> dict:
+        nonlocal parts, size
+        event = {"type": "text_delta", "content": "".join(parts)}
+        parts, size = [], 0
+        return event
+
+    try:
+        while True:
+            if parts:
+                try:
+                    item = await asyncio.wait_for(
+                        queue.get(), max(deadline - time.monotonic(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    yield _flush()
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                if parts:
+                    yield _flush()
+                raise item
+
+            if item.get("type") == "text_delta":
+                content = item.get("content", "")
+                if not parts:
+                    deadline = time.monotonic() + interval
+                parts.append(content)
+                size += len(content.encode())
+                if size >= max_bytes:
+                    yield _flush()
+                continue
+
+            if parts:
+                yield _flush()
+            yield item
+
+        if parts:
+            yield _flush()
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,25 @@
+"""Rolling latency samples and their percentile summary, shared by the
+worker metrics exposed under ``/api/usage`` (routes, runs, DB queries)."""
+
+import statistics
+from collections import deque
+from typing import Iterable
+
+LATENCY_SAMPLES = 500  # Most recent samples kept per metric
+
+
+def latency_samples() -> deque:
+    """A bounded window of the most recent samples (dataclass default_factory)."""
+    return deque(maxlen=LATENCY_SAMPLES)
+
+
+def latency_summary(samples: Iterable[float], digits: int = 1) -> dict:
+    """p50 / p95 / max of ``samples`` (all None when there are none)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50": None, "p95": None, "max": None}
+    return {
+        "p50": round(statistics.median(ordered), digits),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], digits),
+        "max": round(ordered[-1], digits),
+    }
@@ -10,6 +10,10 @@ from app.config import get_settings
 from app.services.credentials_manager import CredentialsManager
 from app.services.compact_mcp import CompactMCPServer
 from app.services.prefixed_mcp import PrefixedMCPServer
+from app.services.analytics_store import analytics_store
+from app.services.result_store import result_store
+from app.services.token_accounting import token_accountant
+from app.services.run_budget import RunBudget
 
 SESSION_TIMEOUT_SECONDS = 600  # 10 minutes
 
@@ -18,6 +22,13 @@ _BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 GSC_SERVER_SCRIPT = os.path.join(_BACKEND_DIR, "scripts", "gsc_server.py")
 
 
+def wordpress_tool_prefix(label: str) -> str:
+    """Short tool-name prefix for a multi-site WordPress server:
+    "wordpress" -> "wp", "wordpress_achieve" -> "achieve"."""
+    parts = label.split("_", 1)
+    return parts[1] if len(parts) > 1 else "wp"
+
+
 @dataclass
 class MCPSession:
     server: MCPServerStdio
@@ -35,11 +46,11 @@ class MCPSession:
 @dataclass
 class MCPServerPair:
     """GA4 + GSC + optional extra MCP servers with credential paths for cleanup."""
-    ga4_server: MCPServerStdio
-    gsc_server: MCPServerStdio
+    ga4_server: CompactMCPServer
+    gsc_server: CompactMCPServer
     ga4_creds_path: str
     gsc_creds_path: str
-    meta_ads_server: MCPServerStdio | None = None
+    meta_ads_server: CompactMCPServer | None = None
     wordpress_servers: list = field(default_factory=list)
 
 
@@ -64,8 +75,37 @@ class MCPSessionManager:
             purpose=purpose,
         )
 
-    def create_ga4_server(self, user_id: str, refresh_token: str) -> tuple[CompactMCPServer, str]:
+    def _wrap(
+        self, raw_server, server_kind: str, conversation_id: str | None = None,
+        budget: RunBudget | None = None,
+    ) -> CompactMCPServer:
+        """Wrap a raw MCP server with CompactMCPServer: the compactor registry
+        for ``server_kind``, per-tool char budgets, and (when conversation_id
+        is given) the per-conversation result and SQL stores and token
+        accounting. ``budget`` enforces the run's tool-call limit per server."""
+        settings = get_settings()
+        return CompactMCPServer(
+            raw_server,
+            max_output_chars=settings.max_tool_output_chars,
+            dense_encoding=settings.compact_dense_encoding,
+            result_store=result_store,
+            result_scope=conversation_id,
+            analytics_store=analytics_store,
+            server_kind=server_kind,
+            tool_budgets=settings.tool_output_char_budgets,
+            accountant=token_accountant,
+            max_concurrency=settings.mcp_max_concurrency.get(
+                server_kind, settings.mcp_default_concurrency
+            ),
+            budget=budget,
+        )
+
+    def create_ga4_server(
+        self, user_id: str, refresh_token: str, conversation_id: str | None = None,
+        budget: RunBudget | None = None,
+    ) -> tuple[CompactMCPServer, str]:
         """Create GA4 MCP server wrapped with CompactMCPServer for token optimization.
+        Oversized outputs are stored per conversation when conversation_id is given.
         Returns (server, creds_path) for cleanup."""
         settings = get_settings()
         creds_path = self._create_creds(user_id, refresh_token, purpose="ga4")
@@ -82,10 +122,14 @@ class MCPSessionManager:
             cache_tools_list=True,
             client_session_timeout_seconds=120,
         )
-        return CompactMCPServer(raw_server, max_output_chars=settings.max_tool_output_chars), creds_path
+        return self._wrap(raw_server, "ga4", conversation_id, budget), creds_path
 
-    def create_gsc_server(self, user_id: str, refresh_token: str) -> tuple[MCPServerStdio, str]:
-        """Create GSC MCP server. Returns (server, creds_path) for cleanup."""
+    def create_gsc_server(
+        self, user_id: str, refresh_token: str, conversation_id: str | None = None,
+        budget: RunBudget | None = None,
+    ) -> tuple[CompactMCPServer, str]:
+        """Create GSC MCP server wrapped with CompactMCPServer (output cap + result store).
+        Returns (server, creds_path) for cleanup."""
         creds_path = self._create_creds(user_id, refresh_token, purpose="gsc")
         server = MCPServerStdio(
             params=MCPServerStdioParams(
@@ -98,10 +142,13 @@ class MCPSessionManager:
             cache_tools_list=True,
             client_session_timeout_seconds=120,
         )
-        return server, creds_path
+        return self._wrap(server, "gsc", conversation_id, budget), creds_path
 
-    def create_meta_ads_server(self) -> MCPServerStdio | None:
-        """Create Meta Ads MCP server if enabled. Returns server or None."""
+    def create_meta_ads_server(
+        self, conversation_id: str | None = None, budget: RunBudget | None = None,
+    ) -> CompactMCPServer | None:
+        """Create Meta Ads MCP server (wrapped with CompactMCPServer) if enabled.
+        Returns server or None."""
         settings = get_settings()
         if not settings.meta_ads_enabled or not settings.meta_access_token:
             return None
@@ -117,12 +164,16 @@ class MCPSessionManager:
             cache_tools_list=True,
             client_session_timeout_seconds=120,
         )
-        return server
+        return self._wrap(server, "meta_ads", conversation_id, budget)
 
-    def create_wordpress_servers(self) -> list:
+    def create_wordpress_servers(
+        self, conversation_id: str | None = None, budget: RunBudget | None = None,
+    ) -> list:
         """Create WordPress MCP servers from environment variables.
         When multiple sites exist, wraps each with PrefixedMCPServer to avoid
-        duplicate tool names (e.g. achieve__wp-mcp-get-posts-by-category)."""
+        duplicate tool names (e.g. achieve__wp-mcp-get-posts-by-category).
+        CompactMCPServer sits inside the prefix wrapper so compactors see the
+        real tool names."""
         settings = get_settings()
         sites = settings.get_wordpress_sites()
         print(f"[WordPress MCP] wordpress_enabled={settings.wordpress_enabled}, sites found: {len(sites)}")
@@ -138,23 +189,29 @@ class MCPSessionManager:
                 cache_tools_list=True,
                 client_session_timeout_seconds=120,
             )
+            compact_server = self._wrap(raw_server, "wordpress", conversation_id, budget)
             if need_prefix:
-                # Extract short prefix from label: "wordpress" -> "wp", "wordpress_achieve" -> "achieve"
-                parts = site.label.split("_", 1)
-                prefix = parts[1] if len(parts) > 1 else "wp"
-                server = PrefixedMCPServer(raw_server, prefix=prefix)
+                prefix = wordpress_tool_prefix(site.label)
+                server = PrefixedMCPServer(compact_server, prefix=prefix)
                 print(f"[WordPress MCP] Prefixed: {prefix}__<tool_name>")
             else:
-                server = raw_server
+                server = compact_server
             servers.append(server)
         return servers
 
-    def create_server_pair(self, user_id: str, refresh_token: str) -> MCPServerPair:
+    def create_server_pair(
+        self, user_id: str, refresh_token: str, conversation_id: str | None = None,
+        budget: RunBudget | None = None,
+    ) -> MCPServerPair:
         """Create GA4, GSC, and optionally Meta Ads / WordPress servers."""
-        ga4_server, ga4_creds = self.create_ga4_server(user_id, refresh_token)
-        gsc_server, gsc_creds = self.create_gsc_server(user_id, refresh_token)
-        meta_ads_server = self.create_meta_ads_server()
-        wordpress_servers = self.create_wordpress_servers()
+        ga4_server, ga4_creds = self.create_ga4_server(
+            user_id, refresh_token, conversation_id, budget
+        )
+        gsc_server, gsc_creds = self.create_gsc_server(
+            user_id, refresh_token, conversation_id, budget
+        )
+        meta_ads_server = self.create_meta_ads_server(conversation_id, budget)
+        wordpress_servers = self.create_wordpress_servers(conversation_id, budget)
         return MCPServerPair(
             ga4_server=ga4_server,
             gsc_server=gsc_server,
@@ -0,0 +1,145 @@
+"""Per-request model and reasoning-effort routing.
+
+Most traffic is simple lookups ("昨日のユーザー数は？") that do not need the
+full model at medium reasoning. ``ModelRouter.classify`` picks a route from
+cheap message heuristics:
+
+- lookup:   short factual questions → light model, low effort
+- standard: everything else → chat_model, medium effort (previous default)
+- deep:     long requests, or analysis / writing requests spanning several
+            integrations → chat_model, high effort
+
+When a lookup run errors before it streamed an answer or called any tool,
+the turn is re-run on the standard route (a run that called tools is not
+re-run: the calls would repeat). Time-to-first-token and total latency are
+recorded per route.
+"""
+
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+from app.config import get_settings
+from app.services.latency import latency_samples, latency_summary
+
+logger = logging.getLogger(__name__)
+
+_LOOKUP_MAX_CHARS = 80
+_DEEP_MIN_CHARS = 300
+_LOOKUP_KEYWORDS = (
+    "何人", "何件", "何回", "いくつ", "どれくらい", "どのくらい", "数は", "数を",
+    "昨日", "今日", "先週", "先月", "今月", "ユーザー数", "セッション数", "pv",
+    "how many", "how much", "what was", "yesterday", "last week",
+)
+_DEEP_KEYWORDS = (
+    "分析", "比較", "要因", "原因", "なぜ", "改善", "提案", "戦略", "施策", "診断",
+    "レポート", "詳しく", "深掘り", "記事を", "書いて", "作成して", "ファネル",
+    "analy", "compare", "why", "strategy", "recommend", "improve", "audit", "write",
+)
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    model: str
+    effort: str
+    summary: str
+    escalate_to: str | None = None
+
+
+@dataclass
+class RouteMetrics:
+    requests: int = 0
+    failures: int = 0  # Failed runs (escalated when the route allows it)
+    ttft_ms: deque = field(default_factory=latency_samples)
+    total_ms: deque = field(default_factory=latency_samples)
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "ttft_ms": latency_summary(self.ttft_ms),
+            "total_ms": latency_summary(self.total_ms),
+        }
+
+
+def _default_routes() -> dict[str, Route]:
+    settings = get_settings()
+    return {
+        "lookup": Route(
+            "lookup", settings.chat_model_light, "low", "auto", escalate_to="standard"
+        ),
+        "standard": Route("standard", settings.chat_model, "medium", "detailed"),
+        "deep": Route("deep", settings.chat_model, "high", "detailed"),
+    }
+
+
+class ModelRouter:
+    def __init__(self, routes: dict[str, Route] | None = None) -> None:
+        self._routes = routes or _default_routes()
+        self._lock = threading.Lock()
+        self._metrics: dict[str, RouteMetrics] = {
+            name: RouteMetrics() for name in self._routes
+        }
+
+    def classify(self, message: str, extra_toolsets: int = 0) -> Route:
+        """Pick a route. ``extra_toolsets``: non-core toolsets active this
+        turn (cross-integration questions are not simple lookups)."""
+        text = message.lower()
+        deep_keyword = any(k in text for k in _DEEP_KEYWORDS)
+        if len(message) >= _DEEP_MIN_CHARS or (deep_keyword and extra_toolsets > 0):
+            name = "deep"
+        elif (
+            len(message) <= _LOOKUP_MAX_CHARS
+            and extra_toolsets == 0
+            and not deep_keyword
+            and any(k in text for k in _LOOKUP_KEYWORDS)
+        ):
+            name = "lookup"
+        else:
+            name = "standard"
+        return self._routes[name]
+
+    @property
+    def default_route(self) -> Route:
+        return self._routes["standard"]
+
+    def escalate(self, route: Route) -> Route | None:
+        return self._routes.get(route.escalate_to) if route.escalate_to else None
+
+    def record(
+        self,
+        route: Route,
+        ttft_ms: float | None,
+        total_ms: float,
+        failed: bool = False,
+    ) -> None:
+        with self._lock:
+            metrics = self._metrics[route.name]
+            metrics.requests += 1
+            if failed:
+                metrics.failures += 1
+            if ttft_ms is not None:
+                metrics.ttft_ms.append(ttft_ms)
+            metrics.total_ms.append(total_ms)
+        ttft = f"{ttft_ms:.0f}ms" if ttft_ms is not None else "-"
+        logger.info(
+            f"[ModelRouter] {route.name} ({route.model}, {route.effort}): "
+            f"ttft={ttft} total={total_ms:.0f}ms{' FAILED' if failed else ''}"
+        )
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "model": self._routes[name].model,
+                    "effort": self._routes[name].effort,
+                    **metrics.to_dict(),
+                }
+                for name, metrics in self._metrics.items()
+            }
+
+
+# Module-level singleton
+model_router = ModelRouter()
@@ -0,0 +1,255 @@
+"""Background writer for chat persistence.
+
+The SSE loop in ``chat.py`` enqueues its Supabase writes here instead of
+running them inline, so streaming never waits on the database and one slow
+write does not stall other streams in the worker.
+
+- Writes run on a single worker task, in submission order.
+- Consecutive inserts into the same table with the same columns are sent
+  as one batch insert.
+- Failed writes are retried with exponential backoff; an op may carry a
+  ``fallback`` op that is tried once all retries failed (e.g. inserting a
+  message without a column that may not exist yet).
+- ``drain(key)`` waits for a conversation's pending writes (read-your-writes
+  before loading its context); ``stop()`` flushes the queue on shutdown.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from app.config import get_settings
+from app.services.database import Database, database
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WriteOp:
+    table: str = ""
+    action: str = "insert"  # "insert" | "update" | "call"
+    payload: dict[str, Any] | None = None
+    match: dict[str, Any] = field(default_factory=dict)  # eq filters (update)
+    call: Callable[[], Awaitable[Any]] | None = None  # action="call"
+    key: str = ""  # Drain key, usually the conversation id
+    fallback: "WriteOp | None" = None
+
+    def describe(self) -> str:
+        if self.action == "call":
+            fn = getattr(self.call, "func", self.call)  # functools.partial
+            return getattr(fn, "__name__", "call")
+        return f"{self.action} {self.table}"
+
+
+@dataclass
+class WriterStats:
+    ops: int = 0
+    batches: int = 0
+    retries: int = 0
+    failures: int = 0
+    max_queue_depth: int = 0
+
+
+class PersistenceWriter:
+    def __init__(
+        self,
+        max_batch: int = 50,
+        max_attempts: int = 4,
+        backoff_base_seconds: float = 0.5,
+        db: Database = database,
+    ) -> None:
+        self._max_batch = max_batch
+        self._max_attempts = max_attempts
+        self._backoff_base = backoff_base_seconds
+        self._db = db
+        self._queue: asyncio.Queue[WriteOp] | None = None
+        self._task: asyncio.Task | None = None
+        self._carry: WriteOp | None = None
+        self._pending: dict[str, int] = {}
+        self._idle: asyncio.Condition | None = None
+        self.stats = WriterStats()
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._idle = asyncio.Condition()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Flush pending writes (up to ``timeout``) and stop the worker."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"[PersistenceWriter] Shutdown with {self._queue.qsize()} writes unflushed"
+            )
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # --- Submission ---
+
+    def submit(self, op: WriteOp) -> None:
+        if self._queue is None:
+            self.start()
+        if op.key:
+            self._pending[op.key] = self._pending.get(op.key, 0) + 1
+        self._queue.put_nowait(op)
+        depth = self._queue.qsize()
+        if depth > self.stats.max_queue_depth:
+            self.stats.max_queue_depth = depth
+
+    def insert(self, table: str, row: dict, key: str = "", fallback: WriteOp | None = None) -> None:
+        self.submit(WriteOp(table=table, action="insert", payload=row, key=key, fallback=fallback))
+
+    def update(self, table: str, values: dict, match: dict[str, Any], key: str = "") -> None:
+        self.submit(WriteOp(table=table, action="update", payload=values, match=match, key=key))
+
+    def call(self, fn: Callable[[], Awaitable[Any]], key: str = "") -> None:
+        """Run an async persistence function in order with other writes."""
+        self.submit(WriteOp(action="call", call=fn, key=key))
+
+    async def drain(self, key: str, timeout: float = 10.0) -> None:
+        """Wait until all writes submitted under ``key`` are done."""
+        if not self._pending.get(key) or self._idle is None:
+            return
+        try:
+            async with self._idle:
+                await asyncio.wait_for(
+                    self._idle.wait_for(lambda: not self._pending.get(key)), timeout
+                )
+        except asyncio.TimeoutError:
+            logger.warning(f"[PersistenceWriter] drain({key}) timed out")
+
+    # --- Worker ---
+
+    async def _next_batch(self) -> list[WriteOp]:
+        op = self._carry or await self._queue.get()
+        self._carry = None
+        batch = [op]
+        if op.action != "insert":
+            return batch
+        while len(batch) < self._max_batch and not self._queue.empty():
+            nxt = self._queue.get_nowait()
+            # PostgREST fills columns missing from some rows with NULL, not
+            # their defaults, so only rows with the same keys share a batch
+            if (
+                nxt.action == "insert"
+                and nxt.table == op.table
+                and nxt.payload.keys() == op.payload.keys()
+            ):
+                batch.append(nxt)
+            else:
+                self._carry = nxt
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write_batch(batch)
+            except Exception as e:  # Never let the worker die
+                logger.error(f"[PersistenceWriter] Unexpected error: {e}")
+            finally:
+                for op in batch:
+                    self._queue.task_done()
+                await self._mark_done(batch)
+
+    async def _mark_done(self, batch: list[WriteOp]) -> None:
+        keys = [op.key for op in batch if op.key]
+        if not keys:
+            return
+        for key in keys:
+            remaining = self._pending.get(key, 1) - 1
+            if remaining > 0:
+                self._pending[key] = remaining
+            else:
+                self._pending.pop(key, None)
+        async with self._idle:
+            self._idle.notify_all()
+
+    async def _write_batch(self, batch: list[WriteOp]) -> None:
+        start = time.perf_counter()
+        if len(batch) > 1:
+            rows = [op.payload for op in batch]
+            table = batch[0].table
+            if await self._attempt(
+                lambda: self._db.execute(self._db.table(table).insert(rows)),
+                f"insert {table} x{len(rows)}",
+            ):
+                self.stats.ops += len(batch)
+                self.stats.batches += 1
+                logger.debug(
+                    f"[PersistenceWriter] insert {table} x{len(rows)} in "
+                    f"{(time.perf_counter() - start) * 1000:.0f}ms"
+                )
+                return
+            # Batch failed: write rows one by one so a bad row only drops
+            # itself and fallbacks can apply
+            for op in batch:
+                await self._write_one(op)
+            return
+        await self._write_one(batch[0])
+
+    async def _write_one(self, op: WriteOp) -> None:
+        if await self._attempt(lambda: self._execute(op), op.describe()):
+            self.stats.ops += 1
+            self.stats.batches += 1
+            return
+        if op.fallback is not None:
+            logger.warning(f"[PersistenceWriter] {op.describe()} failed, trying fallback")
+            if await self._attempt(lambda: self._execute(op.fallback), op.fallback.describe()):
+                self.stats.ops += 1
+                self.stats.batches += 1
+                return
+        self.stats.failures += 1
+        logger.error(f"[PersistenceWriter] Dropped write: {op.describe()}")
+
+    async def _execute(self, op: WriteOp) -> Any:
+        if op.action == "call":
+            return await op.call()
+        query = self._db.table(op.table)
+        if op.action == "insert":
+            return await self._db.execute(query.insert(op.payload))
+        query = query.update(op.payload)
+        for column, value in op.match.items():
+            query = query.eq(column, value)
+        return await self._db.execute(query)
+
+    async def _attempt(
+        self, fn: Callable[[], Awaitable[Any]], label: str, attempts: int | None = None
+    ) -> bool:
+        attempts = attempts or self._max_attempts
+        for attempt in range(attempts):
+            try:
+                await fn()
+                return True
+            except Exception as e:
+                if attempt + 1 >= attempts:
+                    logger.warning(f"[PersistenceWriter] {label} failed: {e}")
+                    return False
+                self.stats.retries += 1
+                delay = self._backoff_base * (2 ** attempt)
+                logger.info(
+                    f"[PersistenceWriter] {label} failed ({e}), retry in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+        return False
+
+
+# Module-level singleton
+_settings = get_settings()
+persistence_writer = PersistenceWriter(
+    max_batch=_settings.persistence_batch_size,
+    max_attempts=_settings.persistence_max_attempts,
+)
@@ -0,0 +1,265 @@
+"""Off-critical-path translation of reasoning summaries into Japanese.
+
+Reasoning summaries arrive in English. ``stream_chat`` emits them
+immediately and schedules a translation here; the result is sent later as
+a ``reasoning_translated`` event that replaces the original text.
+
+- One shared ``AsyncOpenAI`` client (connection pool) for all requests.
+- A semaphore bounds concurrent translation calls per worker.
+- Short summaries submitted within a small window are batched into one
+  call (JSON array in, JSON array out); long ones are translated alone.
+- Translations are memoized by normalized text (whitespace collapsed,
+  case-folded) in a per-worker LRU and, optionally, in the Supabase
+  ``reasoning_translations`` table shared by all workers.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from openai import AsyncOpenAI
+
+from app.config import get_settings
+from app.services.database import database
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+_SINGLE_INSTRUCTIONS = (
+    "Translate the following text to Japanese. Output ONLY the translated text, "
+    "nothing else. Keep any markdown formatting intact."
+)
+_BATCH_INSTRUCTIONS = (
+    "The input is a JSON array of texts. Translate each text to Japanese, keeping "
+    "any markdown formatting intact. Output ONLY a JSON array of the translated "
+    "strings, in the same order and with the same length."
+)
+
+
+def _cache_key(text: str) -> str:
+    normalized = _WHITESPACE.sub(" ", text).strip().casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+@dataclass
+class TranslationCacheStats:
+    memory_hits: int = 0
+    persistent_hits: int = 0
+    misses: int = 0
+
+    def to_dict(self) -> dict:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            **asdict(self),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ReasoningTranslator:
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        batch_window_ms: int = 50,
+        batch_max_chars: int = 400,
+        batch_max_items: int = 8,
+        cache_size: int = 2048,
+        persist: bool = False,
+    ) -> None:
+        self._max_concurrency = max_concurrency
+        self._batch_window = batch_window_ms / 1000
+        self._batch_max_chars = batch_max_chars
+        self._batch_max_items = batch_max_items
+        self._client: AsyncOpenAI | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._pending: list[tuple[str, asyncio.Future[str]]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._cache_size = cache_size
+        self._persist = persist
+        # Batch and cache-write tasks (the loop only keeps weak references)
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = TranslationCacheStats()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=get_settings().openai_api_key)
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    async def translate(self, text: str) -> str:
+        """Translate ``text``; returns the original text on failure."""
+        key = _cache_key(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.stats.memory_hits += 1
+            return cached
+        if self._persist:
+            cached = await self._load_persisted(key)
+            if cached is not None:
+                self.stats.persistent_hits += 1
+                self._remember(key, cached)
+                return cached
+        self.stats.misses += 1
+
+        translated = await self._translate_uncached(text)
+        if translated != text:  # Failures return the original; don't cache them
+            self._remember(key, translated)
+            if self._persist:
+                self._spawn(self._save_persisted(key, text, translated))
+        return translated
+
+    def _remember(self, key: str, translated: str) -> None:
+        self._cache[key] = translated
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    async def _load_persisted(key: str) -> str | None:
+        try:
+            result = await database.execute(
+                database.table("reasoning_translations")
+                .select("translated")
+                .eq("text_hash", key)
+            )
+        except Exception as e:
+            logger.warning(f"[ReasoningTranslator] Cache lookup failed: {e}")
+            return None
+        return result.data[0]["translated"] if result.data else None
+
+    @staticmethod
+    async def _save_persisted(key: str, source: str, translated: str) -> None:
+        try:
+            await database.execute(
+                database.table("reasoning_translations").upsert(
+                    {"text_hash": key, "source": source, "translated": translated}
+                )
+            )
+        except Exception as e:
+            logger.warning(f"[ReasoningTranslator] Cache write failed: {e}")
+
+    async def _translate_uncached(self, text: str) -> str:
+        if len(text) > self._batch_max_chars:
+            return await self._translate_one(text)
+
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self._batch_max_items:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self._batch_window, self._flush
+            )
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._spawn(self._run_batch(batch))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[ReasoningTranslator] Background task failed: {task.exception()}")
+
+    async def _run_batch(self, batch: list[tuple[str, asyncio.Future[str]]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            if len(texts) == 1:
+                results = [await self._translate_one(texts[0])]
+            else:
+                results = await self._translate_many(texts)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            # Cancelled or failed: waiters get the original text
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(text)
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """Flush the pending batch and wait (up to ``timeout``) for batch and
+        cache-write tasks; cancel what is left."""
+        self._flush()
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"[ReasoningTranslator] Cancelled {len(pending)} tasks on shutdown")
+                await asyncio.wait(pending)
+
+    async def _request(self, instructions: str, text: str) -> str:
+        settings = get_settings()
+        async with self._get_semaphore():
+            response = await self.client.responses.create(
+                model=settings.reasoning_translate_model,
+                instructions=instructions,
+                input=text,
+                reasoning={"effort": "minimal", "summary": None},
+                text={"verbosity": "low"},
+                store=False,
+            )
+        return response.output_text or ""
+
+    async def _translate_one(self, text: str) -> str:
+        try:
+            return await self._request(_SINGLE_INSTRUCTIONS, text) or text
+        except Exception as e:
+            logger.warning(f"Reasoning summary 翻訳失敗、原文を使用: {e}")
+            return text
+
+    async def _translate_many(self, texts: list[str]) -> list[str]:
+        try:
+            output = await self._request(
+                _BATCH_INSTRUCTIONS, json.dumps(texts, ensure_ascii=False)
+            )
+            translated = json.loads(output)
+            if (
+                isinstance(translated, list)
+                and len(translated) == len(texts)
+                and all(isinstance(t, str) for t in translated)
+            ):
+                logger.info(f"[ReasoningTranslator] Batched {len(texts)} summaries")
+                return [t or src for t, src in zip(translated, texts)]
+            logger.warning("[ReasoningTranslator] Batch shape mismatch, translating individually")
+        except Exception as e:
+            logger.warning(f"[ReasoningTranslator] Batch failed, translating individually: {e}")
+        return list(await asyncio.gather(*(self._translate_one(t) for t in texts)))
+
+
+def _create_translator() -> ReasoningTranslator:
+    settings = get_settings()
+    return ReasoningTranslator(
+        max_concurrency=settings.reasoning_translate_concurrency,
+        batch_window_ms=settings.reasoning_translate_batch_window_ms,
+        batch_max_chars=settings.reasoning_translate_batch_max_chars,
+        cache_size=settings.reasoning_translate_cache_size,
+        persist=settings.reasoning_translate_cache_persist,
+    )
+
+
+# Module-level singleton
+reasoning_translator = _create_translator()
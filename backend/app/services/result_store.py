@@ -0,0 +1,208 @@
+"""In-memory store for oversized tool results.
+
+When a tool output does not fit in the model's tool-output budget, the
+full result is kept here under a short handle, scoped to the conversation.
+The agent receives a compact summary plus the handle and can page, filter
+and sort the stored rows later via the ``read_result`` function tool.
+"""
+
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+RESULT_TTL_SECONDS = 3600  # 1 hour
+MAX_RESULTS_PER_SCOPE = 20
+MAX_PAGE_ROWS = 200
+
+# Markdown table row: | a | b | c |
+_MD_ROW = re.compile(r"^\s*\|(.+)\|\s*$")
+_MD_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}")
+
+
+@dataclass
+class StoredResult:
+    """A full tool result kept for later paging."""
+    handle: str
+    tool_name: str
+    columns: list[str]
+    rows: list[list[str]]
+    text: str = ""  # Raw text for non-tabular results
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def is_table(self) -> bool:
+        return bool(self.columns)
+
+
+def parse_table(text: str) -> tuple[list[str], list[list[str]]] | None:
+    """Extract the first table from compact TSV or a markdown table.
+
+    TSV: header line followed by tab-separated rows, ending at "---".
+    Markdown: "| a | b |" header, "|---|---|" separator, then rows.
+    Returns (columns, rows) or None if no table is found.
+    """
+    lines = text.split("\n")
+
+    # Markdown table (GSC tools)
+    for i in range(len(lines) - 1):
+        header = _MD_ROW.match(lines[i])
+        if header and _MD_SEPARATOR.match(lines[i + 1]):
+            columns = [c.strip() for c in header.group(1).split("|")]
+            rows = []
+            for line in lines[i + 2:]:
+                m = _MD_ROW.match(line)
+                if not m:
+                    break
+                rows.append([c.strip() for c in m.group(1).split("|")])
+            return columns, rows
+
+    # Compact TSV (GA4 tools); skip "# ..." legend lines
+    body = [line for line in lines if not line.startswith("# ")]
+    if body and "\t" in body[0]:
+        columns = body[0].split("\t")
+        rows = []
+        for line in body[1:]:
+            if line == "---":
+                break
+            rows.append(line.split("\t"))
+        return columns, rows
+
+    return None
+
+
+def _sort_key(value: str) -> tuple[int, float | str]:
+    """Numeric-aware sort key ("1,234", "3.4%" and "12" compare as numbers)."""
+    try:
+        return (0, float(value.replace(",", "").rstrip("%")))
+    except ValueError:
+        return (1, value)
+
+
+def render_page(
+    stored: StoredResult,
+    offset: int = 0,
+    limit: int = 50,
+    filter_column: str = "",
+    filter_value: str = "",
+    sort_by: str = "",
+    descending: bool = True,
+    columns: list[str] | None = None,
+) -> str:
+    """Render one page of a stored result as TSV (or lines for text results)."""
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), MAX_PAGE_ROWS)
+
+    if not stored.is_table:
+        lines = stored.text.split("\n")
+        page = lines[offset:offset + limit]
+        footer = f"---\nlines {offset + 1}-{offset + len(page)} of {len(lines)}"
+        if offset + len(page) < len(lines):
+            footer += f" (next: offset={offset + len(page)})"
+        return "\n".join(page + [footer])
+
+    index = {name: i for i, name in enumerate(stored.columns)}
+    for name in [filter_column, sort_by, *(columns or [])]:
+        if name and name not in index:
+            return (
+                f"（列 {name} は存在しません。利用可能な列: "
+                f"{', '.join(stored.columns)}）"
+            )
+
+    rows = stored.rows
+    if filter_column and filter_value:
+        col = index[filter_column]
+        needle = filter_value.lower()
+        rows = [r for r in rows if col < len(r) and needle in r[col].lower()]
+    if sort_by:
+        col = index[sort_by]
+        rows = sorted(
+            rows,
+            key=lambda r: _sort_key(r[col] if col < len(r) else ""),
+            reverse=descending,
+        )
+
+    picked = [index[c] for c in columns] if columns else list(range(len(stored.columns)))
+    page = rows[offset:offset + limit]
+    lines = ["\t".join(stored.columns[i] for i in picked)]
+    lines.extend("\t".join(r[i] if i < len(r) else "" for i in picked) for r in page)
+    footer = f"---\nrows {offset + 1}-{offset + len(page)} of {len(rows)}"
+    if len(rows) != len(stored.rows):
+        footer += f" (filtered from {len(stored.rows)})"
+    if offset + len(page) < len(rows):
+        footer += f" (next: offset={offset + len(page)})"
+    lines.append(footer)
+    return "\n".join(lines)
+
+
+class ResultStore:
+    def __init__(
+        self,
+        ttl_seconds: float = RESULT_TTL_SECONDS,
+        max_per_scope: int = MAX_RESULTS_PER_SCOPE,
+    ) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._max_per_scope = max_per_scope
+        # scope (conversation_id) -> handle -> StoredResult, oldest first
+        self._scopes: dict[str, OrderedDict[str, StoredResult]] = {}
+
+    def put(
+        self,
+        scope: str,
+        tool_name: str,
+        columns: list[str] | None = None,
+        rows: list[list[str]] | None = None,
+        text: str = "",
+    ) -> StoredResult:
+        """Store a result. Pass columns/rows for tables, text otherwise."""
+        results = self._scopes.setdefault(scope, OrderedDict())
+        handle = f"r_{uuid.uuid4().hex[:8]}"
+        stored = StoredResult(
+            handle=handle,
+            tool_name=tool_name,
+            columns=columns or [],
+            rows=rows or [],
+            text=text,
+        )
+        results[handle] = stored
+        while len(results) > self._max_per_scope:
+            results.popitem(last=False)
+        return stored
+
+    def put_text(self, scope: str, tool_name: str, text: str) -> StoredResult:
+        """Store a text result, parsing it into a table when possible."""
+        table = parse_table(text)
+        if table and table[1]:
+            return self.put(scope, tool_name, columns=table[0], rows=table[1])
+        return self.put(scope, tool_name, text=text)
+
+    def get(self, scope: str, handle: str) -> Optional[StoredResult]:
+        stored = self._scopes.get(scope, {}).get(handle)
+        if stored and time.time() - stored.created_at > self._ttl_seconds:
+            self._scopes[scope].pop(handle, None)
+            return None
+        return stored
+
+    def list_results(self, scope: str) -> list[StoredResult]:
+        return list(self._scopes.get(scope, {}).values())
+
+    def clear(self, scope: str) -> None:
+        self._scopes.pop(scope, None)
+
+    def cleanup_expired(self) -> None:
+        now = time.time()
+        for scope in list(self._scopes):
+            results = self._scopes[scope]
+            for handle in [
+                h for h, r in results.items()
+                if now - r.created_at > self._ttl_seconds
+            ]:
+                results.pop(handle, None)
+            if not results:
+                self._scopes.pop(scope, None)
+
+
+# Module-level singleton
+result_store = ResultStore()
@@ -0,0 +1,255 @@
+"""Per-run budgets: wall-clock time, model tokens and tool calls per server.
+
+One ``RunBudget`` covers one ``stream_chat`` turn (including an escalated
+re-run). Usage is fed from the SDK event pump (tokens), CompactMCPServer
+(tool calls) and a watchdog task (time).
+
+- Time is agent time: the clock is paused while ask_user waits for the
+  user (``paused()``).
+- Tokens are output tokens plus *new* input tokens per model call. Each
+  call re-sends the whole run so far; only the growth over the previous
+  call's input is counted, so the limit tracks how much the run produces
+  rather than how often it re-reads its context.
+
+- At ``wrap_up_ratio`` of any limit a ``budget_warning`` SSE event is
+  emitted and, via ``RunConfig.call_model_input_filter``, a developer note
+  is appended to the model input telling the agent to stop calling tools
+  and summarise what it has.
+- At the limit a ``budget_exhausted`` event is emitted. Time / token
+  exhaustion cancels the run after the current turn (immediately after a
+  grace period); an exhausted server budget makes further calls to that
+  server return a tool error.
+
+Warnings and exhaustions are counted per budget kind in ``budget_metrics``.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from agents.run_config import CallModelData, ModelInputData
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_WRAP_UP_NOTE = (
+    "[run-budget] この実行の予算（{reasons}）の上限が近い。"
+    "これ以上ツールを呼ばず、取得済みのデータで回答をまとめよ。"
+)
+
+
+@dataclass(frozen=True)
+class RunLimits:
+    max_seconds: float
+    max_tokens: int
+    max_tool_calls_per_server: int
+    wrap_up_ratio: float = 0.8
+    grace_seconds: float = 30.0
+
+    @classmethod
+    def from_settings(cls) -> "RunLimits":
+        settings = get_settings()
+        return cls(
+            max_seconds=settings.run_max_seconds,
+            max_tokens=settings.run_max_tokens,
+            max_tool_calls_per_server=settings.run_max_tool_calls_per_server,
+            wrap_up_ratio=settings.run_budget_wrap_up_ratio,
+            grace_seconds=settings.run_budget_grace_seconds,
+        )
+
+
+class BudgetMetrics:
+    """Worker-wide counts of runs, warnings and exhaustions per budget kind."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.warnings: Counter[str] = Counter()
+        self.exhausted: Counter[str] = Counter()
+
+    def record(self, counter: Counter[str], kind: str) -> None:
+        with self._lock:
+            counter[kind] += 1
+
+    def record_run(self) -> None:
+        with self._lock:
+            self.runs += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "warnings": dict(self.warnings),
+                "exhausted": dict(self.exhausted),
+            }
+
+
+class RunBudget:
+    def __init__(
+        self,
+        limits: RunLimits,
+        emit: Callable[[dict], None] | None = None,
+    ) -> None:
+        self.limits = limits
+        self._emit = emit
+        self._started = time.monotonic()
+        # Time spent waiting on the user (ask_user), excluded from elapsed
+        self._paused = 0
+        self._paused_since = 0.0
+        self._paused_total = 0.0
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self.tokens = 0
+        self._last_input_tokens = 0  # Input of the previous model call
+        self.tool_calls: Counter[str] = Counter()
+        self._warned: set[str] = set()
+        self._exhausted: set[str] = set()
+        self._cancel_run: Callable[[str], None] | None = None
+        budget_metrics.record_run()
+
+    def bind(self, emit: Callable[[dict], None]) -> None:
+        """Set the (non-blocking) SSE event sink."""
+        self._emit = emit
+
+    def attach_run(self, result: Any) -> None:
+        """Register the running RunResultStreaming so exhaustion can cancel it.
+
+        A run attached after the time / token budget is already spent (e.g.
+        a re-run) is cancelled right away: exhaustion only fires once per kind.
+        """
+        self._cancel_run = result.cancel
+        self._last_input_tokens = 0  # A new run starts a new input
+        if self.exhausted:
+            result.cancel("immediate")
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds the run has been working (pauses excluded)."""
+        now = time.monotonic()
+        paused = self._paused_total
+        if self._paused:
+            paused += now - self._paused_since
+        return now - self._started - paused
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Stop the run clock while waiting on the user (nestable)."""
+        if self._paused == 0:
+            self._paused_since = time.monotonic()
+            self._resumed.clear()
+        self._paused += 1
+        try:
+            yield
+        finally:
+            self._paused -= 1
+            if self._paused == 0:
+                self._paused_total += time.monotonic() - self._paused_since
+                self._resumed.set()
+
+    @property
+    def exhausted(self) -> bool:
+        return "time" in self._exhausted or "tokens" in self._exhausted
+
+    # --- Usage ---
+
+    def add_usage(self, input_tokens: int, output_tokens: int) -> None:
+        """Count one model call: output plus input beyond the previous call's."""
+        new_input = max(input_tokens - self._last_input_tokens, 0)
+        self._last_input_tokens = input_tokens
+        self.tokens += new_input + output_tokens
+        self._check("tokens", self.tokens, self.limits.max_tokens)
+
+    def check_time(self) -> None:
+        self._check("time", self.elapsed, self.limits.max_seconds)
+
+    def check_tool_call(self, server_kind: str) -> str | None:
+        """Count a tool call. Returns an error message when the server's
+        budget is already spent (the call must not be made)."""
+        kind = f"tool_calls:{server_kind}"
+        limit = self.limits.max_tool_calls_per_server
+        if limit <= 0:  # Disabled
+            self.tool_calls[server_kind] += 1
+            return None
+        if self.tool_calls[server_kind] >= limit:
+            return (
+                f"（{server_kind} のツール呼び出し上限 {limit} 回に達した。"
+                "取得済みのデータで回答をまとめよ）"
+            )
+        self.tool_calls[server_kind] += 1
+        self._check(kind, self.tool_calls[server_kind], limit)
+        return None
+
+    def _check(self, kind: str, used: float, limit: float) -> None:
+        if limit <= 0:
+            return
+        if used >= limit and kind not in self._exhausted:
+            self._exhausted.add(kind)
+            self._warned.add(kind)
+            budget_metrics.record(budget_metrics.exhausted, kind)
+            logger.warning(f"[RunBudget] {kind} exhausted: {used:g}/{limit:g}")
+            self._send("budget_exhausted", kind, used, limit)
+            if kind in ("time", "tokens") and self._cancel_run is not None:
+                self._cancel_run("after_turn")
+        elif used >= limit * self.limits.wrap_up_ratio and kind not in self._warned:
+            self._warned.add(kind)
+            budget_metrics.record(budget_metrics.warnings, kind)
+            logger.info(f"[RunBudget] {kind} near limit: {used:g}/{limit:g}")
+            self._send("budget_warning", kind, used, limit)
+
+    def _send(self, event_type: str, kind: str, used: float, limit: float) -> None:
+        if self._emit is not None:
+            self._emit({
+                "type": event_type, "budget": kind, "used": round(used, 1), "limit": limit,
+            })
+
+    # --- Integration ---
+
+    async def _sleep_until(self, seconds: float) -> None:
+        """Sleep until ``elapsed`` reaches ``seconds`` (longer while paused)."""
+        while True:
+            if self._paused:
+                await self._resumed.wait()
+                continue
+            remaining = seconds - self.elapsed
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def watch_deadline(self) -> None:
+        """Watchdog task: time warning, after-turn cancel, then hard cancel."""
+        limits = self.limits
+        if limits.max_seconds <= 0:
+            return
+        await self._sleep_until(limits.max_seconds * limits.wrap_up_ratio)
+        self.check_time()
+        await self._sleep_until(limits.max_seconds)
+        self.check_time()
+        await self._sleep_until(limits.max_seconds + limits.grace_seconds)
+        if self._cancel_run is not None:
+            logger.warning("[RunBudget] Grace period over, cancelling run")
+            self._cancel_run("immediate")
+
+    def input_filter(self, data: CallModelData[Any]) -> ModelInputData:
+        """``call_model_input_filter``: append the wrap-up note near limits.
+
+        The note goes at the end of the input so the cached prompt prefix
+        is unaffected; it is not part of the saved conversation context.
+        """
+        self.check_time()
+        if not self._warned:
+            return data.model_data
+        note = _WRAP_UP_NOTE.format(reasons=", ".join(sorted(self._warned)))
+        return ModelInputData(
+            input=[*data.model_data.input, {"role": "developer", "content": note}],
+            instructions=data.model_data.instructions,
+        )
+
+
+# Module-level singleton
+budget_metrics = BudgetMetrics()
@@ -0,0 +1,285 @@
+"""Detached agent runs.
+
+``/api/chat/stream`` submits a run here and subscribes to its replay log;
+the run itself is an asyncio task owned by the executor, so it carries on,
+persists its results and releases its MCP sessions whether or not a client
+is still connected. Clients reconnect through the replay log, poll the run
+status or cancel it.
+
+At most ``max_concurrent`` runs execute at once per worker; further runs
+wait in "queued" state. Finished runs stay visible for ``RUN_TTL_SECONDS``.
+
+Orphaned runs: when the last SSE subscriber of an active run disconnects,
+the run is cancelled unless a client resubscribes (``Last-Event-ID``) within
+``orphan_grace_seconds``. Cancellation unwinds the run task, which cancels
+the SDK run and its event pump and closes the run's MCP servers. A run whose
+teardown takes longer than ``cancel_timeout_seconds`` is released anyway
+(marked cancelled, its slot freed) and its task is left to finish in the
+background. How long orphaned work survives, and how long teardown takes,
+is recorded in ``RunExecutor.metrics``.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.config import get_settings
+from app.services.latency import latency_samples, latency_summary
+from app.services.stream_replay import RUN_TTL_SECONDS, ReplayLog
+
+logger = logging.getLogger(__name__)
+
+# A run body: receives the run's log and appends client events to it
+RunBody = Callable[[ReplayLog], Awaitable[None]]
+
+ACTIVE_STATES = ("queued", "running")
+
+
+@dataclass
+class AgentRun:
+    run_id: str
+    owner: str
+    conversation_id: str
+    log: ReplayLog
+    status: str = "queued"  # queued | running | completed | failed | cancelled
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    task: asyncio.Task | None = None
+    subscribers: int = 0
+    orphaned_at: float | None = None  # Last subscriber left while active
+    orphan_timer: asyncio.Task | None = None
+    cancel_reason: str | None = None  # "client" | "orphaned" | "shutdown"
+    cancel_requested_at: float | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "conversation_id": self.conversation_id,
+            "events": self.log.last_id,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "subscribers": self.subscribers,
+            "cancel_reason": self.cancel_reason,
+        }
+
+
+@dataclass
+class RunMetrics:
+    runs: int = 0
+    orphaned: int = 0  # Runs that lost all subscribers while active
+    resumed: int = 0  # Orphaned runs a client resubscribed to
+    cancelled: dict[str, int] = field(default_factory=dict)  # Per reason
+    # Cancelled runs that did not unwind within cancel_timeout (released anyway)
+    slow_teardowns: int = 0
+    # Seconds from the last subscriber leaving to the run task finishing
+    orphan_survival: deque = field(default_factory=latency_samples)
+    # Seconds from cancel request to the run task finishing
+    teardown: deque = field(default_factory=latency_samples)
+
+    def to_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "orphaned": self.orphaned,
+            "resumed": self.resumed,
+            "cancelled": dict(self.cancelled),
+            "slow_teardowns": self.slow_teardowns,
+            "orphan_survival_seconds": latency_summary(self.orphan_survival, digits=2),
+            "teardown_seconds": latency_summary(self.teardown, digits=2),
+        }
+
+
+class RunExecutor:
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        ttl_seconds: float = RUN_TTL_SECONDS,
+        orphan_grace_seconds: float = 30.0,
+        cancel_timeout_seconds: float = 10.0,
+    ) -> None:
+        self._slots = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+        self._ttl = ttl_seconds
+        self._orphan_grace = orphan_grace_seconds
+        self._cancel_timeout = cancel_timeout_seconds
+        self._runs: dict[str, AgentRun] = {}
+        # Run bodies released before they finished unwinding
+        self._abandoned: set[asyncio.Task] = set()
+        self.metrics = RunMetrics()
+
+    def submit(
+        self,
+        owner: str,
+        conversation_id: str,
+        body: RunBody,
+        max_events: int,
+    ) -> AgentRun:
+        run_id = uuid.uuid4().hex
+        run = AgentRun(
+            run_id=run_id,
+            owner=owner,
+            conversation_id=conversation_id,
+            log=ReplayLog(run_id, owner, max_events),
+        )
+        run.log.append({
+            "type": "run_started",
+            "run_id": run_id,
+            "conversation_id": conversation_id,
+        })
+        self._runs[run_id] = run
+        self.metrics.runs += 1
+        run.task = asyncio.create_task(self._execute(run, body))
+        return run
+
+    def get(self, run_id: str, owner: str) -> AgentRun | None:
+        run = self._runs.get(run_id)
+        if run is None or run.owner != owner:
+            return None
+        return run
+
+    def cancel(self, run: AgentRun, reason: str = "client") -> bool:
+        """Request cancellation. Returns False if the run already finished."""
+        if run.status not in ACTIVE_STATES or run.task is None:
+            return False
+        if run.cancel_requested_at is None:
+            run.cancel_reason = reason
+            run.cancel_requested_at = time.time()
+            self.metrics.cancelled[reason] = self.metrics.cancelled.get(reason, 0) + 1
+            logger.info(f"[RunExecutor] Cancelling {run.run_id} ({reason})")
+            # Once only: a second cancel would cut the bounded teardown wait
+            run.task.cancel()
+        return True
+
+    # --- Subscribers (SSE responses) ---
+
+    def subscribe(self, run: AgentRun) -> None:
+        run.subscribers += 1
+        if run.orphan_timer is not None:
+            run.orphan_timer.cancel()
+            run.orphan_timer = None
+        if run.orphaned_at is not None:
+            run.orphaned_at = None
+            self.metrics.resumed += 1
+
+    def unsubscribe(self, run: AgentRun) -> None:
+        run.subscribers = max(run.subscribers - 1, 0)
+        if run.subscribers or run.status not in ACTIVE_STATES:
+            return
+        run.orphaned_at = time.time()
+        self.metrics.orphaned += 1
+        if self._orphan_grace >= 0:
+            run.orphan_timer = asyncio.create_task(self._cancel_orphan(run))
+
+    async def _cancel_orphan(self, run: AgentRun) -> None:
+        await asyncio.sleep(self._orphan_grace)
+        if run.subscribers == 0:
+            run.orphan_timer = None
+            self.cancel(run, reason="orphaned")
+
+    async def _execute(self, run: AgentRun, body: RunBody) -> None:
+        try:
+            if self._slots is not None:
+                async with self._slots:
+                    await self._supervise(run, body)
+            else:
+                await self._supervise(run, body)
+        except asyncio.CancelledError:
+            run.status = "cancelled"
+            run.log.append({"type": "cancelled", "run_id": run.run_id})
+        finally:
+            run.finished_at = time.time()
+            run.log.close()
+            self._record_finish(run)
+            logger.info(
+                f"[RunExecutor] {run.run_id} {run.status} in "
+                f"{run.finished_at - run.created_at:.1f}s ({run.log.last_id} events)"
+            )
+
+    async def _supervise(self, run: AgentRun, body: RunBody) -> None:
+        """Run the body in its own task; on cancel, wait at most
+        ``cancel_timeout`` for it to unwind, then release the run."""
+        body_task = asyncio.create_task(self._run_body(run, body))
+        try:
+            await asyncio.shield(body_task)
+        except asyncio.CancelledError:
+            body_task.cancel()
+            done, _ = await asyncio.wait({body_task}, timeout=self._cancel_timeout)
+            if not done:
+                self.metrics.slow_teardowns += 1
+                logger.warning(
+                    f"[RunExecutor] {run.run_id} did not unwind within "
+                    f"{self._cancel_timeout:g}s after cancel, releasing it"
+                )
+                self._abandoned.add(body_task)
+                body_task.add_done_callback(
+                    lambda task: self._abandoned_done(run, task)
+                )
+            raise
+
+    def _abandoned_done(self, run: AgentRun, task: asyncio.Task) -> None:
+        self._abandoned.discard(task)
+        logger.info(
+            f"[RunExecutor] Released run {run.run_id} finished unwinding after "
+            f"{time.time() - (run.cancel_requested_at or run.created_at):.1f}s"
+        )
+
+    def _record_finish(self, run: AgentRun) -> None:
+        if run.orphan_timer is not None:
+            run.orphan_timer.cancel()
+            run.orphan_timer = None
+        if run.orphaned_at is not None:
+            self.metrics.orphan_survival.append(run.finished_at - run.orphaned_at)
+        if run.cancel_requested_at is not None:
+            self.metrics.teardown.append(run.finished_at - run.cancel_requested_at)
+
+    async def _run_body(self, run: AgentRun, body: RunBody) -> None:
+        run.status = "running"
+        run.started_at = time.time()
+        try:
+            await body(run.log)
+            if run.finished_at is None:  # Not released by a cancel meanwhile
+                run.status = "completed"
+        except Exception as e:
+            logger.error(f"[RunExecutor] {run.run_id} failed: {e}")
+            if run.finished_at is None:
+                run.status = "failed"
+                run.error = str(e)
+                run.log.append({"type": "error", "message": str(e)})
+
+    async def shutdown(self, timeout: float = 10.0) -> None:
+        """Cancel active runs and wait (up to ``timeout``) for them to unwind."""
+        tasks = [
+            run.task for run in self._runs.values()
+            if run.status in ACTIVE_STATES and run.task is not None
+        ]
+        for run in list(self._runs.values()):
+            self.cancel(run, reason="shutdown")
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def cleanup_expired(self) -> None:
+        now = time.time()
+        expired = [
+            run_id for run_id, run in self._runs.items()
+            if run.finished_at is not None and now - run.finished_at > self._ttl
+        ]
+        for run_id in expired:
+            del self._runs[run_id]
+        if expired:
+            logger.info(f"[RunExecutor] Dropped {len(expired)} finished runs")
+
+
+# Module-level singleton
+_settings = get_settings()
+run_executor = RunExecutor(
+    max_concurrent=_settings.max_concurrent_runs,
+    orphan_grace_seconds=_settings.run_orphan_grace_seconds,
+    cancel_timeout_seconds=_settings.run_cancel_timeout_seconds,
+)
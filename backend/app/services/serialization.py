@@ -0,0 +1,75 @@
+"""JSON serialization for the hot paths (SSE frames, context items, tool
+output parsing).
+
+Uses orjson (a project dependency). The stdlib ``json`` fallback covers
+environments without it and values orjson cannot encode (e.g. integers
+beyond 64 bits). Output is compact and keeps non-ASCII text
+as-is (``ensure_ascii=False``).
+"""
+
+import json
+from typing import Any, Callable
+
+try:  # Fast JSON backend (stdlib json if it is not installed)
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+# json.dumps builds a new encoder per call when given options; reuse one
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _stdlib_dumps(obj: Any, default: Callable[[Any], Any] | None) -> str:
+    if default is None:
+        return _ENCODER.encode(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default)
+
+
+def dumps_bytes(obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:
+    """Serialize to UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj, default).encode()
+
+
+def dumps(obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+    """Serialize to a JSON string."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS).decode()
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj, default)
+
+
+def loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Coerce an arbitrary object into JSON-compatible values (unknown types
+    become strings). Only for objects that are not plain JSON already."""
+    return loads(dumps_bytes(obj, default=str))
+
+
+def sse_frame(event: dict, event_id: int | None = None) -> bytes:
+    """Encode one Server-Sent Events frame."""
+    if orjson is None:
+        data = _stdlib_dumps(event, None)
+        if event_id is None:
+            return f"data: {data}\n\n".encode()
+        return f"id: {event_id}\ndata: {data}\n\n".encode()
+    data = dumps_bytes(event)
+    if event_id is None:
+        return b"data: " + data + b"\n\n"
+    return b"id: %d\ndata: %s\n\n" % (event_id, data)
@@ -0,0 +1,78 @@
+"""Numbered, bounded replay logs for chat SSE streams.
+
+Each chat run appends its client-facing events to a ``ReplayLog``; events
+get increasing ids (sent as the SSE ``id:`` field). The HTTP response is just
+a subscriber of the log, so when the browser connection drops the run keeps
+going, and a reconnecting client resumes with ``Last-Event-ID`` instead of
+re-running the agent.
+
+Logs keep the most recent ``max_events`` events; ``run_executor`` drops
+them ``RUN_TTL_SECONDS`` after the run finished.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import AsyncGenerator
+
+RUN_TTL_SECONDS = 300  # Keep finished runs resumable for 5 minutes
+MAX_EVENTS_PER_RUN = 5000
+
+
+class ReplayGap(Exception):
+    """The requested events were already evicted from the log."""
+
+
+class ReplayLog:
+    def __init__(self, run_id: str, owner: str, max_events: int = MAX_EVENTS_PER_RUN) -> None:
+        self.run_id = run_id
+        self.owner = owner
+        self._events: deque[tuple[int, dict]] = deque(maxlen=max_events)
+        self._last_id = 0
+        self._changed = asyncio.Event()  # Replaced after each wake-up
+        self.closed = False
+        self.closed_at: float | None = None
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    @property
+    def first_id(self) -> int:
+        return self._events[0][0] if self._events else self._last_id + 1
+
+    def append(self, event: dict) -> int:
+        if self.closed:  # e.g. a released run still unwinding
+            return self._last_id
+        self._last_id += 1
+        self._events.append((self._last_id, event))
+        self._notify()
+        return self._last_id
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.closed_at = time.time()
+            self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def events(self, after: int = 0) -> AsyncGenerator[tuple[int, dict], None]:
+        """Yield (id, event) for events with id > ``after`` until the run ends."""
+        if after + 1 < self.first_id:
+            raise ReplayGap(f"events {after + 1}..{self.first_id - 1} no longer available")
+        cursor = after
+        while True:
+            while cursor < self._last_id:
+                first = self.first_id
+                if cursor + 1 < first:
+                    raise ReplayGap("subscriber fell behind the replay window")
+                # Ids are contiguous, so the next event's index is known
+                event_id, event = self._events[cursor + 1 - first]
+                cursor = event_id
+                yield event_id, event
+            if self.closed:
+                return
+            await self._changed.wait()
@@ -1,48 +1,216 @@
-from supabase import create_client, Client
-from app.config import get_settings
+import logging
+from dataclasses import dataclass, field
 
+from app.services.database import Database
+from app.services.user_cache import user_cache
 
-def get_supabase_client() -> Client:
-    settings = get_settings()
-    return create_client(settings.supabase_url, settings.supabase_service_role_key)
+logger = logging.getLogger(__name__)
 
 
-async def get_or_create_user(supabase: Client, clerk_id: str, email: str | None = None, display_name: str | None = None) -> dict:
-    result = supabase.table("users").select("*").eq("clerk_id", clerk_id).execute()
-    if result.data:
-        return result.data[0]
+async def _select_user(db: Database, clerk_id: str) -> dict | None:
+    result = await db.execute(db.table("users").select("*").eq("clerk_id", clerk_id))
+    return result.data[0] if result.data else None
+
+
+async def get_user(db: Database, clerk_id: str) -> dict | None:
+    """The user's row (including Google connection status), via ``user_cache``."""
+    return await user_cache.get(clerk_id, lambda: _select_user(db, clerk_id))
+
+
+async def get_or_create_user(db: Database, clerk_id: str, email: str | None = None, display_name: str | None = None) -> dict:
+    user = await get_user(db, clerk_id)
+    if user is not None:
+        return user
     new_user = {
         "clerk_id": clerk_id,
         "email": email,
         "display_name": display_name,
         "google_connected": False,
     }
-    result = supabase.table("users").insert(new_user).execute()
-    return result.data[0]
+    try:
+        result = await db.execute(db.table("users").insert(new_user))
+        user = result.data[0]
+    except Exception:
+        # Stale negative cache entry: the row was created by another worker
+        user = await _select_user(db, clerk_id)
+        if user is None:
+            raise
+    user_cache.set(clerk_id, user)
+    return user
 
 
-async def update_user_google_token(supabase: Client, clerk_id: str, refresh_token: str) -> dict:
-    result = (
-        supabase.table("users")
-        .update({"google_refresh_token": refresh_token, "google_connected": True})
-        .eq("clerk_id", clerk_id)
-        .execute()
-    )
+async def update_user_google_token(db: Database, clerk_id: str, refresh_token: str) -> dict:
+    try:
+        result = await db.execute(
+            db.table("users")
+            .update({"google_refresh_token": refresh_token, "google_connected": True})
+            .eq("clerk_id", clerk_id)
+        )
+    finally:
+        user_cache.invalidate(clerk_id)
     return result.data[0] if result.data else {}
 
 
-async def get_user_google_token(supabase: Client, clerk_id: str) -> str | None:
-    result = supabase.table("users").select("google_refresh_token").eq("clerk_id", clerk_id).execute()
-    if result.data and result.data[0].get("google_refresh_token"):
-        return result.data[0]["google_refresh_token"]
+async def get_user_google_token(db: Database, clerk_id: str, user: dict | None = None) -> str | None:
+    """Refresh token from ``user`` if given (a row from ``get_or_create_user``),
+    otherwise from the cached row."""
+    if user is None:
+        user = await get_user(db, clerk_id)
+    if user and user.get("google_refresh_token"):
+        return user["google_refresh_token"]
     return None
 
 
-async def disconnect_user_google(supabase: Client, clerk_id: str) -> dict:
-    result = (
-        supabase.table("users")
-        .update({"google_refresh_token": None, "google_connected": False})
-        .eq("clerk_id", clerk_id)
-        .execute()
-    )
+async def disconnect_user_google(db: Database, clerk_id: str) -> dict:
+    try:
+        result = await db.execute(
+            db.table("users")
+            .update({"google_refresh_token": None, "google_connected": False})
+            .eq("clerk_id", clerk_id)
+        )
+    finally:
+        user_cache.invalidate(clerk_id)
     return result.data[0] if result.data else {}
+
+
+# ---------------------------------------------------------------------------
+# Conversation context (Responses API input items)
+#
+# Stored append-only in ``context_segments``: each turn inserts one 'append'
+# segment with its new items. When earlier items were rewritten (rolling
+# context compaction), the full list is written as a 'snapshot' and older
+# segments are deleted. The context is the latest snapshot followed by the
+# later segments. ``conversations.context_items`` is the legacy single-column
+# storage and is only read as a fallback.
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class SavedContext:
+    items: list[dict] = field(default_factory=list)
+    next_seq: int = 0
+    legacy: bool = False  # Loaded from conversations.context_items
+
+
+# Conflicting seq inserts (overlapping runs on one conversation) to retry
+_SEQ_CONFLICT_RETRIES = 3
+# PostgREST "table not in schema cache" / Postgres undefined_table
+_MISSING_TABLE_CODES = frozenset({"PGRST205", "42P01"})
+_UNIQUE_VIOLATION_CODE = "23505"
+
+
+def _is_missing_table(error: Exception) -> bool:
+    return getattr(error, "code", None) in _MISSING_TABLE_CODES
+
+
+def _is_unique_violation(error: Exception) -> bool:
+    return getattr(error, "code", None) == _UNIQUE_VIOLATION_CODE
+
+
+async def _next_segment_seq(db: Database, conversation_id: str) -> int:
+    result = await db.execute(
+        db.table("context_segments")
+        .select("seq")
+        .eq("conversation_id", conversation_id)
+        .order("seq", desc=True)
+        .limit(1)
+    )
+    return result.data[0]["seq"] + 1 if result.data else 0
+
+
+async def load_context_items(db: Database, conversation_id: str) -> SavedContext:
+    try:
+        result = await db.execute(
+            db.table("context_segments")
+            .select("seq, kind, items")
+            .eq("conversation_id", conversation_id)
+            .order("seq")
+        )
+        segments = result.data or []
+    except Exception as e:
+        # Fallback: context_segments table may not exist yet
+        if not _is_missing_table(e):
+            raise
+        logger.warning(f"[ContextStore] Failed to load segments: {e}")
+        segments = []
+
+    if segments:
+        start = 0
+        for i, segment in enumerate(segments):
+            if segment["kind"] == "snapshot":
+                start = i
+        items = [item for segment in segments[start:] for item in segment["items"]]
+        return SavedContext(items=items, next_seq=segments[-1]["seq"] + 1)
+
+    conv_data = await db.execute(
+        db.table("conversations")
+        .select("context_items")
+        .eq("id", conversation_id)
+        .single()
+    )
+    legacy_items = conv_data.data.get("context_items") if conv_data.data else None
+    return SavedContext(items=legacy_items or [], legacy=bool(legacy_items))
+
+
+async def save_context_items(
+    db: Database,
+    conversation_id: str,
+    saved: SavedContext,
+    items: list[dict],
+    append_from: int | None,
+) -> None:
+    """Persist the context after a turn.
+
+    ``append_from`` is the index of the first item not yet stored, or None
+    when the stored prefix was rewritten and a snapshot is required.
+    Runs on the persistence writer: errors other than a missing segments
+    table propagate so the writer retries them, and a seq taken by an
+    overlapping run is retried after the latest segment.
+    """
+    snapshot = append_from is None or saved.legacy
+    new_items = items if snapshot else items[append_from:]
+    if not snapshot and not new_items:
+        return
+    seq = saved.next_seq
+    for attempt in range(_SEQ_CONFLICT_RETRIES + 1):
+        try:
+            await db.execute(
+                db.table("context_segments").insert(
+                    {
+                        "conversation_id": conversation_id,
+                        "seq": seq,
+                        "kind": "snapshot" if snapshot else "append",
+                        "items": new_items,
+                    }
+                )
+            )
+            break
+        except Exception as e:
+            if _is_missing_table(e):
+                # Fallback: context_segments table does not exist yet
+                logger.warning(f"[ContextStore] No segments table, using legacy column: {e}")
+                await db.execute(
+                    db.table("conversations").update(
+                        {"context_items": items}
+                    ).eq("id", conversation_id)
+                )
+                return
+            if not _is_unique_violation(e) or attempt == _SEQ_CONFLICT_RETRIES:
+                raise  # Retried by the persistence writer
+            # Another run on this conversation took the seq: append after it
+            seq = await _next_segment_seq(db, conversation_id)
+            logger.info(f"[ContextStore] seq conflict on {conversation_id}, retrying as {seq}")
+
+    if snapshot and seq > 0:
+        try:
+            await db.execute(
+                db.table("context_segments").delete().eq(
+                    "conversation_id", conversation_id
+                ).lt("seq", seq)
+            )
+        except Exception as e:
+            # Readers start from the latest snapshot, so stale segments are harmless
+            logger.warning(f"[ContextStore] Failed to prune old segments: {e}")
+    saved.items = items
+    saved.next_seq = seq + 1
+    saved.legacy = False
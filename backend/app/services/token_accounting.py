@@ -0,0 +1,189 @@
+"""In-memory token accounting per user, conversation and tool.
+
+Records, for every tool call, the argument tokens and the output tokens
+before and after compaction (see CompactMCPServer), and for every model
+turn the prompt / cached / reasoning / output tokens reported in the
+Responses API usage. Aggregates are kept per worker process and exposed
+via ``GET /api/usage``.
+
+Tool token counts are character-based estimates (``approximate_tokens``):
+raw tool outputs can be hundreds of KB, and tokenizing them on every call
+would block the event loop for the sake of a metric.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from app.services.token_estimator import approximate_tokens
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_CONVERSATIONS = 1000
+
+
+@dataclass
+class ToolUsage:
+    calls: int = 0
+    argument_tokens: int = 0
+    raw_output_tokens: int = 0  # Before compaction
+    output_tokens: int = 0  # What the model actually saw
+
+    def add(self, other: "ToolUsage") -> None:
+        self.calls += other.calls
+        self.argument_tokens += other.argument_tokens
+        self.raw_output_tokens += other.raw_output_tokens
+        self.output_tokens += other.output_tokens
+
+
+@dataclass
+class ModelUsage:
+    turns: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
+    output_tokens: int = 0
+
+    def add(self, other: "ModelUsage") -> None:
+        self.turns += other.turns
+        self.input_tokens += other.input_tokens
+        self.cached_tokens += other.cached_tokens
+        self.reasoning_tokens += other.reasoning_tokens
+        self.output_tokens += other.output_tokens
+
+    @property
+    def cache_hit_rate(self) -> float:
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+
+@dataclass
+class UsageTotals:
+    model: ModelUsage = field(default_factory=ModelUsage)
+    tools: dict[str, ToolUsage] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "model": {
+                **asdict(self.model),
+                "cache_hit_rate": round(self.model.cache_hit_rate, 4),
+            },
+            "tools": {name: asdict(usage) for name, usage in self.tools.items()},
+        }
+
+
+def usage_from_response(usage: Any) -> ModelUsage:
+    """Build a ModelUsage from a Responses API ``usage`` object."""
+    input_details = getattr(usage, "input_tokens_details", None)
+    output_details = getattr(usage, "output_tokens_details", None)
+    return ModelUsage(
+        turns=1,
+        input_tokens=getattr(usage, "input_tokens", 0) or 0,
+        cached_tokens=getattr(input_details, "cached_tokens", 0) or 0,
+        reasoning_tokens=getattr(output_details, "reasoning_tokens", 0) or 0,
+        output_tokens=getattr(usage, "output_tokens", 0) or 0,
+    )
+
+
+class TokenAccountant:
+    def __init__(self, max_conversations: int = MAX_TRACKED_CONVERSATIONS) -> None:
+        self._lock = threading.Lock()
+        self._max_conversations = max_conversations
+        self._conversation_users: dict[str, str] = {}
+        self._by_conversation: OrderedDict[str, UsageTotals] = OrderedDict()
+        self._by_user: dict[str, UsageTotals] = {}
+        self._by_tool: dict[str, ToolUsage] = {}
+        self._model = ModelUsage()  # Worker-wide (prompt cache hit rate)
+
+    def bind_conversation(self, conversation_id: str, user_id: str) -> None:
+        """Associate a conversation with its user for per-user aggregates."""
+        with self._lock:
+            self._conversation_users[conversation_id] = user_id
+
+    def conversation_owner(self, conversation_id: str) -> str | None:
+        return self._conversation_users.get(conversation_id)
+
+    def _targets(self, conversation_id: str) -> list[UsageTotals]:
+        conv = self._by_conversation.get(conversation_id)
+        if conv is None:
+            conv = self._by_conversation[conversation_id] = UsageTotals()
+            while len(self._by_conversation) > self._max_conversations:
+                old, _ = self._by_conversation.popitem(last=False)
+                self._conversation_users.pop(old, None)
+        else:
+            self._by_conversation.move_to_end(conversation_id)
+        targets = [conv]
+        user_id = self._conversation_users.get(conversation_id)
+        if user_id:
+            targets.append(self._by_user.setdefault(user_id, UsageTotals()))
+        return targets
+
+    def record_tool_call(
+        self,
+        conversation_id: str,
+        tool_name: str,
+        arguments: Any,
+        raw_output: str,
+        output: str | None = None,
+    ) -> ToolUsage:
+        """Record one tool call. ``output`` defaults to ``raw_output``
+        (no compaction)."""
+        raw_tokens = approximate_tokens(raw_output)
+        usage = ToolUsage(
+            calls=1,
+            argument_tokens=approximate_tokens(
+                arguments if isinstance(arguments, str) else str(arguments or "")
+            ),
+            raw_output_tokens=raw_tokens,
+            output_tokens=raw_tokens if output is None else approximate_tokens(output),
+        )
+        with self._lock:
+            for totals in self._targets(conversation_id):
+                totals.tools.setdefault(tool_name, ToolUsage()).add(usage)
+            self._by_tool.setdefault(tool_name, ToolUsage()).add(usage)
+        return usage
+
+    def record_model_turn(self, conversation_id: str, usage: ModelUsage) -> None:
+        with self._lock:
+            for totals in self._targets(conversation_id):
+                totals.model.add(usage)
+            self._model.add(usage)
+        logger.info(
+            f"[Tokens] {conversation_id}: input={usage.input_tokens} "
+            f"(cached={usage.cached_tokens}, {usage.cache_hit_rate:.0%}) "
+            f"reasoning={usage.reasoning_tokens} output={usage.output_tokens}"
+        )
+
+    def conversation_usage(self, conversation_id: str) -> dict:
+        with self._lock:
+            totals = self._by_conversation.get(conversation_id)
+            return totals.to_dict() if totals else UsageTotals().to_dict()
+
+    def user_usage(self, user_id: str) -> dict:
+        """User totals plus a per-conversation breakdown."""
+        with self._lock:
+            totals = self._by_user.get(user_id) or UsageTotals()
+            conversations = {
+                conv_id: usage.to_dict()
+                for conv_id, usage in self._by_conversation.items()
+                if self._conversation_users.get(conv_id) == user_id
+            }
+            return {**totals.to_dict(), "conversations": conversations}
+
+    def tool_usage(self) -> dict:
+        """Worker-wide per-tool aggregates (all users)."""
+        with self._lock:
+            return {name: asdict(usage) for name, usage in self._by_tool.items()}
+
+    def model_usage(self) -> dict:
+        """Worker-wide model usage, including the prompt cache hit rate."""
+        with self._lock:
+            return {
+                **asdict(self._model),
+                "cache_hit_rate": round(self._model.cache_hit_rate, 4),
+            }
+
+
+# Module-level singleton
+token_accountant = TokenAccountant()
@@ -0,0 +1,48 @@
+"""Token count estimation.
+
+Uses tiktoken (o200k_base, the GPT-5 family encoding). The Docker image
+bakes the encoding into ``TIKTOKEN_CACHE_DIR``; if it still cannot be loaded
+(e.g. a local run without network access), counts fall back to a cheap
+character-class heuristic: ~4 ASCII chars per token and ~1 token per
+non-ASCII (e.g. Japanese) character (logged as a warning).
+
+``approximate_tokens`` always uses the heuristic: it is linear C-speed work
+instead of BPE encoding, for bookkeeping on large texts on the event loop.
+"""
+
+from __future__ import annotations
+
+import logging
+from functools import lru_cache
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> Any:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # ImportError, or BPE file download failure
+        logger.warning(f"[Tokens] tiktoken unavailable, token counts are estimates: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of model tokens in ``text``."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return approximate_tokens(text)
+
+
+def approximate_tokens(text: str) -> int:
+    """Character-class estimate of the number of model tokens in ``text``."""
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
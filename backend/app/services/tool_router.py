@@ -0,0 +1,176 @@
+"""Per-turn selection of the MCP toolsets exposed to the model.
+
+Every MCP server's tool schemas are sent with each model call, so exposing
+Meta Ads and every WordPress site on a plain GA4 question costs prompt
+tokens and time-to-first-token. Before the Agent is built, ``ToolRouter``
+picks the toolsets relevant to the turn:
+
+- GA4 and GSC are always active (the core of the agent).
+- Meta Ads / WordPress sites are activated by keywords in the message,
+  by site-name mentions, or because the conversation already used them
+  (tool calls in the saved context, or toolsets loaded in earlier turns).
+
+The remaining toolsets stay connected; the ``load_toolsets`` function tool
+appends them to the running agent's ``mcp_servers`` on demand, and the
+SDK picks them up on the next model call.
+
+Toolset names: "ga4", "gsc", "meta_ads", "wordpress:<site label>".
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+CORE_TOOLSETS = ("ga4", "gsc")
+MAX_TRACKED_CONVERSATIONS = 1000
+
+_META_ADS_KEYWORDS = (
+    "meta", "facebook", "instagram", "fb広告", "インスタ", "フェイスブック",
+    "広告", "キャンペーン", "広告セット", "クリエイティブ", "ターゲティング",
+    "cpa", "cpc", "cpm", "roas", "campaign", "adset", " ads",
+)
+_WORDPRESS_KEYWORDS = (
+    "wordpress", "ワードプレス", "wp", "記事", "投稿", "固定ページ", "ブログ",
+    "下書き", "公開", "カテゴリ", "タグ", "メディア", "blog", "post", "draft",
+)
+# Meta Ads MCP tool names (to recognise earlier use in saved context)
+_META_ADS_TOOLS = frozenset({
+    "get_ad_accounts", "get_campaigns", "get_adsets", "get_ads", "get_insights",
+    "get_campaign_details", "get_adset_details", "get_ad_details",
+    "search_interests", "search_behaviors", "search_geo_locations",
+})
+
+
+@dataclass
+class ToolSelection:
+    active: list[str]
+    reasons: dict[str, str] = field(default_factory=dict)
+
+
+class ActiveToolsets:
+    """The toolsets of one run. ``servers`` is the list handed to
+    ``Agent(mcp_servers=...)``; loading a toolset appends to it."""
+
+    def __init__(self, toolsets: dict[str, Any], active: list[str]) -> None:
+        self._toolsets = toolsets
+        self.active = [name for name in toolsets if name in active]
+        self.servers: list[Any] = [toolsets[name] for name in self.active]
+
+    @property
+    def inactive(self) -> list[str]:
+        return [name for name in self._toolsets if name not in self.active]
+
+    def load(self, names: list[str]) -> tuple[list[str], list[str]]:
+        """Activate toolsets by name ("all" for every toolset).
+        Returns (newly loaded, unknown names)."""
+        if "all" in names:
+            names = list(self._toolsets)
+        loaded, unknown = [], []
+        for name in names:
+            if name not in self._toolsets:
+                unknown.append(name)
+            elif name not in self.active:
+                self.active.append(name)
+                self.servers.append(self._toolsets[name])
+                loaded.append(name)
+        return loaded, unknown
+
+
+def _mentions(text: str, keywords: tuple[str, ...]) -> bool:
+    return any(keyword in text for keyword in keywords)
+
+
+def _used_in_context(
+    context_items: list[dict] | None, wordpress_prefixes: dict[str, str]
+) -> dict[str, str]:
+    """Toolsets whose tools appear in earlier function calls."""
+    used: dict[str, str] = {}
+    for item in context_items or []:
+        if item.get("type") != "function_call":
+            continue
+        name = item.get("name") or ""
+        if name in _META_ADS_TOOLS:
+            used["meta_ads"] = f"used earlier ({name})"
+        prefix, sep, _ = name.partition("__")
+        if sep and prefix in wordpress_prefixes:
+            used[wordpress_prefixes[prefix]] = f"used earlier ({name})"
+    return used
+
+
+class ToolRouter:
+    def __init__(self, max_conversations: int = MAX_TRACKED_CONVERSATIONS) -> None:
+        self._lock = threading.Lock()
+        self._max_conversations = max_conversations
+        # conversation_id -> toolsets active in earlier turns
+        self._sticky: OrderedDict[str, set[str]] = OrderedDict()
+
+    def select(
+        self,
+        conversation_id: str,
+        message: str,
+        available: list[str],
+        context_items: list[dict] | None = None,
+        wordpress_prefixes: dict[str, str] | None = None,
+    ) -> ToolSelection:
+        """Pick the toolsets for this turn.
+
+        ``wordpress_prefixes`` maps tool-name prefixes ("achieve") to
+        toolset names ("wordpress:wordpress_achieve") for multi-site setups.
+        """
+        text = message.lower()
+        reasons: dict[str, str] = {name: "core" for name in CORE_TOOLSETS}
+
+        if "meta_ads" in available and _mentions(text, _META_ADS_KEYWORDS):
+            reasons["meta_ads"] = "keyword"
+
+        sites = [name for name in available if name.startswith("wordpress:")]
+        named_sites = [
+            name for name in sites
+            if any(
+                part and part in text
+                for part in name.split(":", 1)[1].lower().split("_")[1:]
+            )
+        ]
+        if named_sites:
+            for name in named_sites:
+                reasons[name] = "site mentioned"
+        elif sites and _mentions(text, _WORDPRESS_KEYWORDS):
+            for name in sites:
+                reasons[name] = "keyword"
+
+        for name, reason in _used_in_context(
+            context_items, wordpress_prefixes or {}
+        ).items():
+            reasons.setdefault(name, reason)
+        with self._lock:
+            for name in self._sticky.get(conversation_id, ()):
+                reasons.setdefault(name, "active in earlier turn")
+
+        active = [name for name in available if name in reasons]
+        logger.info(
+            f"[ToolRouter] {conversation_id or '-'}: {len(active)}/{len(available)} "
+            f"toolsets active ({', '.join(f'{n}={reasons[n]}' for n in active)})"
+        )
+        return ToolSelection(
+            active=active, reasons={n: reasons[n] for n in active}
+        )
+
+    def remember(self, conversation_id: str, active: list[str]) -> None:
+        """Keep non-core toolsets active for the conversation's next turns."""
+        if not conversation_id:
+            return
+        extra = {name for name in active if name not in CORE_TOOLSETS}
+        with self._lock:
+            sticky = self._sticky.setdefault(conversation_id, set())
+            sticky.update(extra)
+            self._sticky.move_to_end(conversation_id)
+            while len(self._sticky) > self._max_conversations:
+                self._sticky.popitem(last=False)
+
+
+# Module-level singleton
+tool_router = ToolRouter()
@@ -0,0 +1,133 @@
+"""Per-worker cache of user rows (clerk_id -> ``users`` row).
+
+Nearly every authenticated request resolves its ``users`` row, and chat also
+needs the Google refresh token from the same row; both read through this
+cache. Entries live for ``ttl_seconds``; a clerk_id without a row is cached
+as ``None`` for ``negative_ttl_seconds``. Concurrent misses for the same
+clerk_id share one lookup.
+
+The cache is per worker: writes through ``supabase_service`` (Google
+connect/disconnect, user creation) invalidate or refresh the local entry,
+but other workers keep their copy until it expires, so keep the TTL short.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+UserLoader = Callable[[], Awaitable[dict | None]]
+
+
+class UserCache:
+    def __init__(
+        self,
+        ttl_seconds: float = 60.0,
+        negative_ttl_seconds: float = 10.0,
+        max_entries: int = 10000,
+    ) -> None:
+        self._ttl = ttl_seconds
+        self._negative_ttl = negative_ttl_seconds
+        self._max_entries = max_entries
+        # clerk_id -> (expires_at, row or None), least recently used first
+        self._entries: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        # In-flight lookups that raced with invalidate(): not cached
+        self._invalidated: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0
+
+    def lookup(self, clerk_id: str) -> tuple[bool, dict | None]:
+        """Return (found, row). ``row`` is None for a cached negative entry."""
+        entry = self._entries.get(clerk_id)
+        if entry is None:
+            return False, None
+        expires_at, row = entry
+        if expires_at <= time.monotonic():
+            del self._entries[clerk_id]
+            return False, None
+        self._entries.move_to_end(clerk_id)
+        return True, row
+
+    async def get(self, clerk_id: str, loader: UserLoader) -> dict | None:
+        """Cached row for ``clerk_id``, loading it with ``loader`` on a miss."""
+        found, row = self.lookup(clerk_id)
+        if found:
+            self.hits += 1
+            return row
+        self.misses += 1
+        pending = self._inflight.get(clerk_id)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # This request was cancelled
+                # The request doing the lookup was cancelled; do our own
+                return await loader()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[clerk_id] = future
+        try:
+            row = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(clerk_id, None)
+            stale = clerk_id in self._invalidated
+            self._invalidated.discard(clerk_id)
+        # Don't cache a read that raced with an invalidation
+        if not stale:
+            self.set(clerk_id, row)
+        future.set_result(row)
+        return row
+
+    def set(self, clerk_id: str, row: dict | None) -> None:
+        if not self.enabled:
+            return
+        ttl = self._ttl if row is not None else self._negative_ttl
+        if ttl <= 0:
+            self._entries.pop(clerk_id, None)
+            return
+        self._entries[clerk_id] = (time.monotonic() + ttl, row)
+        self._entries.move_to_end(clerk_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, clerk_id: str) -> None:
+        self._entries.pop(clerk_id, None)
+        if clerk_id in self._inflight:
+            self._invalidated.add(clerk_id)
+        logger.debug(f"[UserCache] Invalidated {clerk_id}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# Module-level singleton
+_settings = get_settings()
+user_cache = UserCache(
+    ttl_seconds=_settings.user_cache_ttl_seconds,
+    negative_ttl_seconds=_settings.user_cache_negative_ttl_seconds,
+    max_entries=_settings.user_cache_max_entries,
+)
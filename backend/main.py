@@ -9,7 +9,13 @@ load_dotenv()  # Load .env into os.environ (needed for dynamic env parsing like
 
 from app.config import get_settings
 from app.deps import get_mcp_manager
-from app.routers import auth, chat, properties, conversations
+from app.routers import auth, chat, properties, conversations, usage
+from app.services.analytics_store import analytics_store
+from app.services.database import database
+from app.services.persistence_writer import persistence_writer
+from app.services.reasoning_translator import reasoning_translator
+from app.services.result_store import result_store
+from app.services.run_executor import run_executor
 
 # Ensure OPENAI_API_KEY is in os.environ for the OpenAI Agents SDK
 _settings = get_settings()
@@ -21,16 +27,24 @@ if _settings.openai_api_key and not os.environ.get("OPENAI_API_KEY"):
 async def lifespan(app: FastAPI):
     # Startup
     mcp_manager = get_mcp_manager()
+    persistence_writer.start()
 
     async def cleanup_loop():
         while True:
             await asyncio.sleep(60)
             await mcp_manager.cleanup_expired()
+            result_store.cleanup_expired()
+            analytics_store.cleanup_expired()
+            run_executor.cleanup_expired()
 
     task = asyncio.create_task(cleanup_loop())
     yield
     # Shutdown
     task.cancel()
+    await run_executor.shutdown()
+    await reasoning_translator.shutdown()
+    await persistence_writer.stop(_settings.persistence_shutdown_flush_seconds)
+    await database.aclose()
     mcp_manager.credentials_manager.cleanup_all()
 
 
@@ -54,6 +68,7 @@ app.include_router(auth.router)
 app.include_router(chat.router)
 app.include_router(properties.router)
 app.include_router(conversations.router)
+app.include_router(usage.router)
 
 
 @app.get("/api/health")
@@ -0,0 +1,68 @@
+from app.services.activity_items import ActivityBuilder
+
+
+def _build(events: list[dict]) -> ActivityBuilder:
+    builder = ActivityBuilder()
+    for event in events:
+        builder.apply(event)
+    return builder
+
+
+def test_route_escalation_drops_the_abandoned_run():
+    builder = _build([
+        {"type": "reasoning", "reasoning_id": "rs_1", "content": "lookup"},
+        {"type": "route_escalated", "from": "lookup", "to": "standard"},
+        {"type": "text_delta", "content": "1,234人です"},
+        {"type": "done"},
+    ])
+
+    assert builder.to_list() == [{"kind": "text", "sequence": 1, "content": "1,234人です"}]
+    assert builder.full_response == "1,234人です"
+
+
+def test_text_segments_split_on_activity():
+    builder = _build([
+        {"type": "text_delta", "content": "前半"},
+        {"type": "text_delta", "content": "です"},
+        {"type": "tool_call", "call_id": "c1", "name": "run_report", "arguments": "{}"},
+        {"type": "text_delta", "content": "後半"},
+        {"type": "done"},
+    ])
+
+    items = builder.to_list()
+    assert [(item["kind"], item["sequence"]) for item in items] == [
+        ("text", 1), ("tool", 2), ("text", 3)
+    ]
+    assert items[0]["content"] == "前半です"
+    assert items[1]["output"] == "(completed)"  # No result before done
+    assert builder.full_response == "前半です後半"
+    assert [call["call_id"] for call in builder.tool_calls] == ["c1"]
+
+
+def test_tool_results_match_by_call_id_then_oldest_pending():
+    builder = _build([
+        {"type": "tool_call", "call_id": "c1", "name": "run_report"},
+        {"type": "tool_call", "call_id": "c2", "name": "run_report"},
+        {"type": "tool_call", "call_id": None, "name": "get_post"},
+        {"type": "tool_result", "call_id": "c2", "output": "second"},
+        {"type": "tool_result", "call_id": None, "output": "untagged"},
+        {"type": "tool_result", "call_id": None, "output": "untagged 2"},
+    ])
+
+    assert [item.get("output") for item in builder.to_list()] == [
+        "untagged", "second", "untagged 2"
+    ]
+
+
+def test_translations_and_answers_update_their_items():
+    builder = _build([
+        {"type": "reasoning", "reasoning_id": "rs_1", "content": "Checking sessions"},
+        {"type": "reasoning_translated", "reasoning_id": "rs_1", "content": "セッションを確認"},
+        {"type": "reasoning_translated", "reasoning_id": "rs_9", "content": "unknown"},
+        {"type": "ask_user", "group_id": "g1", "questions": [{"id": "q1"}]},
+        {"type": "_ask_user_responses", "group_id": "g1", "responses": {"q1": "はい"}},
+    ])
+
+    reasoning, ask = builder.to_list()
+    assert reasoning["content"] == "セッションを確認"
+    assert ask["groupId"] == "g1" and ask["responses"] == {"q1": "はい"}
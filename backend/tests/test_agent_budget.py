@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services import agent_service
+from app.services.agent_service import AgentService
+from app.services.model_router import model_router
+from app.services.run_budget import RunLimits
+
+
+class _FakeServer:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+
+class _FakeMCPManager:
+    def create_server_pair(self, *args, **kwargs):
+        return SimpleNamespace(
+            ga4_server=_FakeServer(),
+            gsc_server=_FakeServer(),
+            meta_ads_server=None,
+            wordpress_servers=[],
+        )
+
+    def cleanup_server_pair(self, pair):
+        pass
+
+
+def _usage_event(input_tokens: int, output_tokens: int):
+    usage = SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens)
+    return SimpleNamespace(
+        type="raw_response_event",
+        data=SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=usage)),
+    )
+
+
+class _FakeRun:
+    """A model run that spends tokens and ends without an answer."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.is_complete = False
+        self.cancelled: str | None = None
+
+    def cancel(self, mode: str = "immediate") -> None:
+        self.cancelled = mode
+
+    async def stream_events(self):
+        if self.cancelled is None:
+            yield _usage_event(input_tokens=500, output_tokens=800)
+        self.is_complete = True
+
+    def to_input_list(self):
+        return []
+
+
+def test_exhausted_budget_does_not_escalate(monkeypatch):
+    runs: list[_FakeRun] = []
+
+    def run_streamed(agent, **kwargs):
+        runs.append(_FakeRun(agent.model))
+        return runs[-1]
+
+    monkeypatch.setattr(agent_service.Runner, "run_streamed", run_streamed)
+    monkeypatch.setattr(agent_service.settings, "dynamic_tool_selection", False)
+    monkeypatch.setattr(agent_service.settings, "model_routing_enabled", True)
+    lookup = model_router._routes["lookup"]
+    monkeypatch.setattr(model_router, "classify", lambda *args, **kwargs: lookup)
+    monkeypatch.setattr(
+        RunLimits,
+        "from_settings",
+        classmethod(lambda cls: RunLimits(
+            max_seconds=0, max_tokens=1000, max_tool_calls_per_server=0
+        )),
+    )
+
+    async def collect() -> list[dict]:
+        service = AgentService(_FakeMCPManager())
+        return [
+            event async for event in service.stream_chat(
+                "user", "token", "昨日のユーザー数は？", "123"
+            )
+        ]
+
+    events = asyncio.run(collect())
+    types = [event["type"] for event in events]
+
+    assert len(runs) == 1
+    assert runs[0].model == lookup.model
+    assert runs[0].cancelled == "after_turn"
+    assert "budget_exhausted" in types
+    assert "route_escalated" not in types
+    assert types[-1] == "done"
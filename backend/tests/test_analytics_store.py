@@ -0,0 +1,60 @@
+from app.services.analytics_store import AnalyticsStore
+
+
+def _store() -> tuple[AnalyticsStore, str]:
+    store = AnalyticsStore()
+    info = store.register(
+        "conv",
+        "run_report",
+        ["date", "device Category", "sessions", "bounce rate"],
+        [
+            ["20260101", "mobile", "1,200", "40.5%"],
+            ["20260101", "desktop", "800", "35%"],
+            ["20260102", "mobile", "1,000", ""],
+        ],
+        text_columns=1,
+    )
+    return store, info.name
+
+
+def test_columns_are_typed_by_content():
+    store, table = _store()
+
+    assert table == "run_report_1"
+    assert store.list_tables("conv")[0].columns == [
+        ("date", "TEXT"),
+        ("device_Category", "TEXT"),
+        ("sessions", "INTEGER"),
+        ("bounce_rate", "REAL"),
+    ]
+
+
+def test_query_aggregates_locally():
+    store, table = _store()
+
+    out = store.query(
+        "conv",
+        f'SELECT device_Category, SUM(sessions) AS s FROM "{table}" '
+        "GROUP BY device_Category ORDER BY s DESC",
+    )
+
+    assert out.splitlines() == ["device_Category\ts", "mobile\t2200", "desktop\t800", "---", "rows: 2"]
+
+
+def test_only_reads_are_allowed():
+    store, table = _store()
+
+    assert store.query("conv", f'DELETE FROM "{table}"').startswith("（SELECT 文のみ")
+    # A write hidden in a CTE fails on the read-only connection
+    out = store.query("conv", f'WITH x AS (SELECT 1) INSERT INTO "{table}" (date) SELECT 1')
+    assert out.startswith("（SQLエラー")
+    assert store.query("conv", f'SELECT COUNT(*) FROM "{table}"').splitlines()[1] == "3"
+
+
+def test_row_cap_and_scope_isolation():
+    store, table = _store()
+
+    out = store.query("conv", f'SELECT * FROM "{table}"', max_rows=2)
+
+    assert out.splitlines()[-1] == "rows: 2+ (truncated, add LIMIT/OFFSET)"
+    assert "まだ読み込まれたテーブルがありません" in store.query("other", "SELECT 1")
@@ -0,0 +1,74 @@
+import json
+
+from app.services.compact_mcp import CompactMCPServer
+from app.services.compactors import get_tool_compaction
+
+
+def _server(kind: str, max_output_chars: int = 16000) -> CompactMCPServer:
+    return CompactMCPServer(None, max_output_chars=max_output_chars, server_kind=kind)
+
+
+def _post(n: int, body_chars: int = 200) -> dict:
+    return {
+        "id": n,
+        "title": {"rendered": f"Post {n}"},
+        "slug": f"post-{n}",
+        "status": "publish",
+        "link": f"https://example.com/post-{n}",
+        "excerpt": {"rendered": f"<p>Excerpt <b>{n}</b></p>"},
+        "content": {"rendered": "<p>" + "x" * body_chars + "</p>"},
+    }
+
+
+def test_wordpress_budget_only_applies_to_listings():
+    listing = get_tool_compaction("wordpress", "achieve__wp-mcp-get-posts-by-category")
+    single = get_tool_compaction("wordpress", "wp-mcp-get-post")
+    assert listing.max_chars == 8000
+    assert single.compactor is listing.compactor
+    assert single.max_chars is None
+
+
+def test_wordpress_single_post_is_left_untouched():
+    # One-line JSON, over the listing budget but under the global cap
+    text = json.dumps(_post(1, body_chars=12000))
+    assert 8000 < len(text) < 16000
+
+    assert _server("wordpress")._compact_text("wp-mcp-get-post", text) == text
+
+
+def test_wordpress_listing_drops_bodies():
+    text = json.dumps([_post(n, body_chars=3000) for n in range(5)])
+
+    out = _server("wordpress")._compact_text("wp-mcp-get-posts-by-category", text)
+
+    lines = out.splitlines()
+    assert "content" not in lines[0].split("\t")
+    assert "Excerpt 0" in out and "<p>" not in out
+    assert lines[-1] == "rows: 5"
+
+
+def test_single_line_over_budget_keeps_its_head():
+    text = json.dumps({"content": "y" * 30000})
+
+    out = _server("wordpress")._compact_text("wp-mcp-get-post", text)
+
+    assert out.startswith(text[:1000])
+    assert len(out) <= 16000
+    assert "[truncated: showing" in out
+
+
+def test_meta_ads_records_become_tsv():
+    text = json.dumps({
+        "data": [
+            {"campaign_name": "A", "spend": "10.5", "actions": [{"type": "click", "value": "3"}]},
+            {"campaign_name": "B", "spend": "2"},
+        ],
+        "paging": {"next": "https://graph.facebook.com/next"},
+    })
+
+    out = _server("meta_ads")._compact_text("get_insights", text)
+
+    lines = out.splitlines()
+    assert lines[0].split("\t")[:2] == ["campaign_name", "spend"]
+    assert lines[1].startswith("A\t10.5")
+    assert lines[-1] == "rows: 2 (more pages available)"
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+from app.services import context_compactor
+from app.services.context_compactor import compact_context
+
+
+def _turn(n: int) -> list[dict]:
+    return [
+        {"role": "user", "content": f"question {n}"},
+        {
+            "type": "reasoning",
+            "id": f"rs_{n}a",
+            "summary": [],
+            "encrypted_content": "x" * 4000,
+        },
+        {
+            "type": "function_call",
+            "id": f"fc_{n}",
+            "call_id": f"call_{n}",
+            "name": "run_report",
+            "arguments": "{}",
+        },
+        {"type": "function_call_output", "call_id": f"call_{n}", "output": "ok"},
+        {
+            "type": "reasoning",
+            "id": f"rs_{n}b",
+            "summary": [],
+            "encrypted_content": "x" * 4000,
+        },
+        {
+            "type": "message",
+            "id": f"msg_{n}",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": f"answer {n}"}],
+        },
+    ]
+
+
+def _orphaned_ids(items: list[dict]) -> list[str]:
+    """Ids of model outputs whose reasoning item is no longer in the input."""
+    orphaned = []
+    has_reasoning = False
+    for item in items:
+        item_type = item.get("type", "message")
+        if item_type == "message" and item.get("role") == "user":
+            has_reasoning = False
+        elif item_type == "reasoning":
+            has_reasoning = True
+        elif "id" in item and not has_reasoning:
+            orphaned.append(item["id"])
+    return orphaned
+
+
+def test_dropped_reasoning_leaves_no_orphaned_ids():
+    items = [item for n in range(6) for item in _turn(n)]
+    _, full = compact_context(items, token_budget=10**9)
+
+    # Room for the recent turns plus part of the old reasoning
+    compacted, report = compact_context(
+        items, token_budget=full.tokens_before * 2 // 3, keep_recent_turns=2
+    )
+
+    assert report.dropped_reasoning > 0
+    assert report.dropped_turns == 0
+    assert _orphaned_ids(compacted) == []
+    # Calls and messages are kept (without ids), with their call ids intact
+    call_ids = {item["call_id"] for item in compacted if item.get("type") == "function_call"}
+    assert call_ids == {f"call_{n}" for n in range(6)}
+    # The input is not mutated
+    assert _orphaned_ids(items) == []
+    assert all("id" in item for item in items if item.get("type") == "function_call")
+
+
+def test_next_turns_append_to_compacted_context_unchanged():
+    items = [item for n in range(6) for item in _turn(n)]
+    _, full = compact_context(items, token_budget=10**9)
+    budget = full.tokens_before * 2 // 3
+
+    compacted, report = compact_context(
+        items, token_budget=budget, keep_recent_turns=2, target_ratio=0.75
+    )
+    assert report.changed
+    assert report.tokens_after <= budget * 0.75
+
+    # The next turn fits in the headroom: replayed as saved, no new snapshot
+    grown = compacted + _turn(6)
+    again, report = compact_context(
+        grown, token_budget=budget, keep_recent_turns=2, target_ratio=0.75
+    )
+    assert not report.changed
+    assert again == grown
+
+
+def test_item_token_counts_are_cached_across_turns(monkeypatch):
+    monkeypatch.setattr(context_compactor, "_token_cache", OrderedDict())
+    encoded: list[str] = []
+    estimate = context_compactor.estimate_tokens
+    monkeypatch.setattr(
+        context_compactor, "estimate_tokens", lambda text: encoded.append(text) or estimate(text)
+    )
+    items = [item for n in range(3) for item in _turn(n)]
+    compact_context(items, token_budget=10**9)
+    encoded.clear()
+
+    # The replayed history is measured from the cache; only new items encode
+    compact_context(items + _turn(3), token_budget=10**9)
+
+    assert len(encoded) == len(_turn(3))
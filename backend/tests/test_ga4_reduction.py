@@ -0,0 +1,58 @@
+import json
+
+from app.services.compact_mcp import _compact_ga4_report
+
+
+def _report(n: int) -> str:
+    return json.dumps({
+        "dimension_headers": [{"name": "pagePath"}],
+        "metric_headers": [
+            {"name": "sessions", "type_": "TYPE_INTEGER"},
+            {"name": "bounceRate", "type_": "TYPE_FLOAT"},
+        ],
+        "rows": [
+            {
+                "dimension_values": [{"value": f"/page-{i}"}],
+                "metric_values": [{"value": str(i + 1)}, {"value": "0.5"}],
+            }
+            for i in range(n)
+        ],
+        "row_count": n,
+    })
+
+
+def _stat(lines: list[str], label: str) -> list[str]:
+    return next(line for line in lines if line.startswith(label)).split("\t")
+
+
+def test_report_under_budget_is_plain_tsv():
+    out = _compact_ga4_report(_report(3), max_chars=16000)
+
+    assert out.splitlines() == [
+        "pagePath\tsessions\tbounceRate",
+        "/page-0\t1\t0.5",
+        "/page-1\t2\t0.5",
+        "/page-2\t3\t0.5",
+        "---",
+        "rows: 3",
+    ]
+
+
+def test_reduction_keeps_top_rows_and_exact_totals():
+    n = 500
+    out = _compact_ga4_report(_report(n), max_chars=2000)
+    lines = out.splitlines()
+
+    assert len(out) <= 2000
+    kept = [line.split("\t") for line in lines[1:] if line.startswith("/page-")]
+    # The busiest pages, in the report's own order
+    assert [int(row[1]) for row in kept] == list(range(n - len(kept) + 1, n + 1))
+    other = _stat(lines, "(other:")
+    assert other[0] == f"(other: {n - len(kept)} rows)"
+    # Totals cover every row; rates are not summed
+    assert _stat(lines, "(total)")[1:] == [str(n * (n + 1) // 2), "-"]
+    assert int(other[1]) + sum(int(row[1]) for row in kept) == n * (n + 1) // 2
+    assert _stat(lines, "(min)")[1:] == ["1", "0.5"]
+    assert _stat(lines, "(max)")[1:] == [str(n), "0.5"]
+    assert f"rows: {n}" in lines
+    assert lines[-1].startswith(f"[reduced: top {len(kept)}/{n} rows by sessions")
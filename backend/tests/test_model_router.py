@@ -0,0 +1,141 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services import agent_service
+from app.services.agent_service import AgentService
+from app.services.model_router import ModelRouter
+
+
+class _FakeServer:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+
+class _FakeMCPManager:
+    def create_server_pair(self, *args, **kwargs):
+        return SimpleNamespace(
+            ga4_server=_FakeServer(),
+            gsc_server=_FakeServer(),
+            meta_ads_server=None,
+            wordpress_servers=[],
+        )
+
+    def cleanup_server_pair(self, pair):
+        pass
+
+
+def _text_event(delta: str):
+    return SimpleNamespace(
+        type="raw_response_event",
+        data=SimpleNamespace(type="response.output_text.delta", delta=delta),
+    )
+
+
+def _tool_call_event():
+    raw = SimpleNamespace(call_id="call_1", name="run_report", arguments="{}")
+    return SimpleNamespace(
+        type="run_item_stream_event",
+        item=SimpleNamespace(type="tool_call_item", raw_item=raw),
+    )
+
+
+class _ScriptedRun:
+    """Streams ``events``, then raises ``error`` if given."""
+
+    def __init__(self, events: list, error: Exception | None = None):
+        self.events = events
+        self.error = error
+        self.is_complete = False
+
+    def cancel(self, mode: str = "immediate") -> None:
+        pass
+
+    async def stream_events(self):
+        for event in self.events:
+            yield event
+        self.is_complete = True
+        if self.error is not None:
+            raise self.error
+
+    def to_input_list(self):
+        return []
+
+
+def _chat(monkeypatch, scripts: dict[str, _ScriptedRun]) -> tuple[list[dict], list[str], ModelRouter]:
+    router = ModelRouter()
+    lookup = router._routes["lookup"]
+    models: list[str] = []
+
+    def run_streamed(agent, **kwargs):
+        models.append(agent.model)
+        return scripts[agent.model]
+
+    monkeypatch.setattr(agent_service.Runner, "run_streamed", run_streamed)
+    monkeypatch.setattr(agent_service, "model_router", router)
+    monkeypatch.setattr(agent_service.settings, "dynamic_tool_selection", False)
+    monkeypatch.setattr(agent_service.settings, "model_routing_enabled", True)
+    monkeypatch.setattr(router, "classify", lambda *args, **kwargs: lookup)
+
+    async def collect() -> list[dict]:
+        service = AgentService(_FakeMCPManager())
+        return [
+            event async for event in service.stream_chat(
+                "user", "token", "昨日のユーザー数は？", "123"
+            )
+        ]
+
+    return asyncio.run(collect()), models, router
+
+
+def test_classify_routes_by_message():
+    router = ModelRouter()
+
+    assert router.classify("昨日のユーザー数は？").name == "lookup"
+    assert router.classify("昨日のユーザー数は？", extra_toolsets=1).name == "standard"
+    assert router.classify("流入減少の原因を分析して", extra_toolsets=1).name == "deep"
+    assert router.escalate(router._routes["lookup"]).name == "standard"
+    assert router.escalate(router._routes["standard"]) is None
+
+
+def test_error_before_any_output_escalates(monkeypatch):
+    settings = agent_service.settings
+    events, models, router = _chat(monkeypatch, {
+        settings.chat_model_light: _ScriptedRun([], error=RuntimeError("model error")),
+        settings.chat_model: _ScriptedRun([_text_event("1,234人です")]),
+    })
+    types = [event["type"] for event in events]
+
+    assert models == [settings.chat_model_light, settings.chat_model]
+    assert "route_escalated" in types
+    assert "error" not in types  # Hidden: the escalated run answers instead
+    metrics = router.metrics()
+    assert metrics["lookup"]["failures"] == 1
+    assert metrics["standard"]["failures"] == 0
+
+
+def test_error_after_tool_calls_does_not_escalate(monkeypatch):
+    settings = agent_service.settings
+    events, models, _ = _chat(monkeypatch, {
+        settings.chat_model_light: _ScriptedRun(
+            [_tool_call_event()], error=RuntimeError("model error")
+        ),
+    })
+    types = [event["type"] for event in events]
+
+    assert models == [settings.chat_model_light]
+    assert "route_escalated" not in types
+    assert "error" in types
+
+
+def test_empty_answer_is_not_a_failure(monkeypatch):
+    settings = agent_service.settings
+    events, models, router = _chat(monkeypatch, {
+        settings.chat_model_light: _ScriptedRun([]),
+    })
+
+    assert models == [settings.chat_model_light]
+    assert "route_escalated" not in [event["type"] for event in events]
+    assert router.metrics()["lookup"]["failures"] == 0
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.database import Database
+from app.services.persistence_writer import PersistenceWriter
+
+
+class _FakeClient:
+    """Records inserts; rows flagged ``bad`` fail ``failures`` times."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls: list[list[dict]] = []
+        self.rows: list[dict] = []
+
+    def table(self, name: str):
+        return SimpleNamespace(insert=lambda payload: self._query(payload))
+
+    def _query(self, payload):
+        rows = payload if isinstance(payload, list) else [payload]
+
+        async def execute():
+            self.calls.append(rows)
+            if any(row.get("bad") for row in rows) and self.failures:
+                if len(rows) == 1:
+                    self.failures -= 1
+                raise RuntimeError("insert failed")
+            self.rows.extend(rows)
+
+        return SimpleNamespace(execute=execute)
+
+
+def _writer(client: _FakeClient, max_attempts: int = 3) -> PersistenceWriter:
+    db = Database()
+    db.use(client)
+    return PersistenceWriter(max_attempts=max_attempts, backoff_base_seconds=0, db=db)
+
+
+def _write_all(writer: PersistenceWriter, rows: list[dict]) -> None:
+    async def scenario():
+        for row in rows:
+            writer.insert("messages", row, key="conv")
+        await writer.drain("conv")
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_only_rows_with_the_same_columns_share_a_batch():
+    client = _FakeClient()
+    writer = _writer(client)
+
+    _write_all(writer, [
+        {"role": "user", "content": "a"},
+        {"role": "assistant", "content": "b"},
+        {"role": "assistant", "content": "c", "activity": []},
+    ])
+
+    assert [len(rows) for rows in client.calls] == [2, 1]
+    assert writer.stats.ops == 3
+
+
+def test_failed_batch_retries_each_row_with_full_attempts():
+    # The bad row fails twice on its own, then succeeds on the third attempt
+    client = _FakeClient(failures=2)
+    writer = _writer(client, max_attempts=3)
+
+    _write_all(writer, [
+        {"content": "a", "bad": False},
+        {"content": "b", "bad": True},
+        {"content": "c", "bad": False},
+    ])
+
+    assert len(client.calls[0]) == 3  # One batch first
+    assert [row["content"] for row in client.rows] == ["a", "b", "c"]
+    assert writer.stats.failures == 0
@@ -0,0 +1,49 @@
+from app.services.result_store import ResultStore, parse_table, render_page
+
+
+def _stored(store: ResultStore, scope: str = "conv"):
+    rows = [[f"/page-{i}", f"{i * 100:,}"] for i in range(30)]
+    return store.put(scope, "run_report", columns=["pagePath", "sessions"], rows=rows)
+
+
+def test_parse_table_reads_tsv_and_markdown():
+    assert parse_table("# legend\na\tb\n1\t2\n---\nrows: 1") == (["a", "b"], [["1", "2"]])
+    assert parse_table("| q | clicks |\n|---|---|\n| seo | 5 |\n\nnote") == (
+        ["q", "clicks"], [["seo", "5"]]
+    )
+    assert parse_table("plain text") is None
+
+
+def test_page_filters_and_sorts_numerically():
+    store = ResultStore()
+    stored = _stored(store)
+
+    page = render_page(stored, limit=2, sort_by="sessions", filter_column="pagePath",
+                       filter_value="page-1")
+
+    lines = page.splitlines()
+    # "1,900" sorts above "1,000" and "100" as numbers, not strings
+    assert lines[1:3] == ["/page-19\t1,900", "/page-18\t1,800"]
+    assert lines[-1] == "rows 1-2 of 11 (filtered from 30) (next: offset=2)"
+    assert "存在しません" in render_page(stored, sort_by="users")
+
+
+def test_handles_are_scoped_and_bounded():
+    store = ResultStore(max_per_scope=2)
+    first = _stored(store)
+    _stored(store)
+    _stored(store)
+
+    assert store.get("conv", first.handle) is None  # Evicted, oldest first
+    assert len(store.list_results("conv")) == 2
+    assert store.get("other", store.list_results("conv")[0].handle) is None
+
+
+def test_results_expire_after_ttl():
+    store = ResultStore(ttl_seconds=0)
+    stored = store.put_text("conv", "get_post", "line 1\nline 2")
+    stored.created_at -= 1
+
+    assert store.get("conv", stored.handle) is None
+    store.cleanup_expired()
+    assert store.list_results("conv") == []
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.services.run_budget import RunBudget, RunLimits
+
+
+def _run() -> SimpleNamespace:
+    run = SimpleNamespace(cancels=[])
+    run.cancel = lambda mode="immediate": run.cancels.append((mode, time.monotonic()))
+    return run
+
+
+def test_deadline_pauses_while_waiting_on_user():
+    async def scenario() -> tuple[SimpleNamespace, float]:
+        budget = RunBudget(RunLimits(
+            max_seconds=0.2, max_tokens=0, max_tool_calls_per_server=0, grace_seconds=0.1
+        ))
+        run = _run()
+        budget.attach_run(run)
+        watchdog = asyncio.create_task(budget.watch_deadline())
+        started = time.monotonic()
+        await asyncio.sleep(0.05)
+        with budget.paused():  # ask_user waiting for an answer
+            await asyncio.sleep(0.5)
+        await asyncio.wait_for(watchdog, timeout=2)
+        return run, started
+
+    run, started = asyncio.run(scenario())
+
+    assert [mode for mode, _ in run.cancels] == ["after_turn", "immediate"]
+    # 0.2s limit + 0.1s grace of agent time, plus the 0.5s pause
+    assert run.cancels[-1][1] - started >= 0.75
+
+
+def test_tokens_count_new_input_only():
+    budget = RunBudget(RunLimits(max_seconds=0, max_tokens=0, max_tool_calls_per_server=0))
+    budget.attach_run(_run())
+
+    # Each call re-sends the context so far plus what the last call added
+    budget.add_usage(input_tokens=10_000, output_tokens=500)
+    budget.add_usage(input_tokens=12_000, output_tokens=500)
+    budget.add_usage(input_tokens=15_000, output_tokens=1_000)
+
+    assert budget.tokens == 15_000 + 2_000
+
+
+def test_zero_limits_disable_the_budget():
+    budget = RunBudget(RunLimits(max_seconds=0, max_tokens=0, max_tool_calls_per_server=0))
+    budget.attach_run(_run())
+
+    assert all(budget.check_tool_call("ga4") is None for _ in range(100))
+    budget.add_usage(input_tokens=10**7, output_tokens=10**6)
+    assert not budget.exhausted
+
+
+def test_tool_call_limit_refuses_past_the_limit():
+    budget = RunBudget(RunLimits(max_seconds=0, max_tokens=0, max_tool_calls_per_server=2))
+
+    assert budget.check_tool_call("ga4") is None
+    assert budget.check_tool_call("ga4") is None
+    assert budget.check_tool_call("ga4") is not None
+    assert budget.check_tool_call("gsc") is None
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from app.services.run_executor import RunExecutor
+
+
+def test_cancel_releases_run_with_stuck_teardown():
+    async def scenario():
+        executor = RunExecutor(max_concurrent=1, cancel_timeout_seconds=0.1)
+
+        async def stuck(log):
+            try:
+                await asyncio.sleep(60)
+            finally:
+                await asyncio.shield(asyncio.sleep(0.5))  # Slow MCP teardown
+
+        async def quick(log):
+            log.append({"type": "text_delta", "content": "ok"})
+
+        run = executor.submit("owner", "conv", stuck, max_events=100)
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        executor.cancel(run)
+        await asyncio.wait_for(run.task, timeout=1)
+        released_after = time.monotonic() - started
+
+        # The slot is free for the next run while the old body still unwinds
+        second = executor.submit("owner", "conv", quick, max_events=100)
+        await asyncio.wait_for(second.task, timeout=1)
+        return executor, run, second, released_after
+
+    executor, run, second, released_after = asyncio.run(scenario())
+
+    assert run.status == "cancelled"
+    assert run.log.closed
+    assert released_after < 0.4
+    assert executor.metrics.slow_teardowns == 1
+    assert second.status == "completed"
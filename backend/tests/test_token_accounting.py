@@ -0,0 +1,19 @@
+from app.services import token_estimator
+from app.services.token_accounting import TokenAccountant
+
+
+def test_tool_accounting_does_not_tokenize(monkeypatch):
+    def tokenize(text):
+        raise AssertionError("tool accounting must not run the tokenizer")
+
+    monkeypatch.setattr(token_estimator, "_get_encoding", tokenize)
+    accountant = TokenAccountant()
+    accountant.bind_conversation("conv", "user")
+
+    usage = accountant.record_tool_call(
+        "conv", "run_report", '{"limit": 10}', "a" * 400_000 + "あ" * 1000, "a" * 4000
+    )
+
+    assert usage.raw_output_tokens == 100_000 + 1000
+    assert usage.output_tokens == 1000
+    assert accountant.conversation_usage("conv")["tools"]["run_report"]["calls"] == 1
@@ -0,0 +1,51 @@
+from app.services.tool_router import ActiveToolsets, ToolRouter
+
+_AVAILABLE = ["ga4", "gsc", "meta_ads", "wordpress:wordpress_achieve", "wordpress:wordpress_media"]
+
+
+def test_plain_question_gets_core_toolsets_only():
+    selection = ToolRouter().select("conv", "昨日のユーザー数は？", _AVAILABLE)
+
+    assert selection.active == ["ga4", "gsc"]
+
+
+def test_keywords_and_site_names_activate_toolsets():
+    router = ToolRouter()
+
+    assert "meta_ads" in router.select("conv", "先月のROASを教えて", _AVAILABLE).active
+    # A named site activates only that site; a generic keyword activates all
+    assert router.select("conv", "achieve の記事一覧", _AVAILABLE).active == [
+        "ga4", "gsc", "wordpress:wordpress_achieve"
+    ]
+    assert router.select("conv", "ブログの記事一覧", _AVAILABLE).active == [
+        "ga4", "gsc", "wordpress:wordpress_achieve", "wordpress:wordpress_media"
+    ]
+
+
+def test_earlier_use_keeps_toolsets_active():
+    router = ToolRouter()
+    context = [{"type": "function_call", "name": "achieve__wp-mcp-get-posts"}]
+
+    selection = router.select(
+        "conv", "続けて", _AVAILABLE, context_items=context,
+        wordpress_prefixes={"achieve": "wordpress:wordpress_achieve"},
+    )
+    assert selection.reasons["wordpress:wordpress_achieve"].startswith("used earlier")
+
+    router.remember("conv", ["ga4", "gsc", "meta_ads"])
+    assert router.select("conv", "続けて", _AVAILABLE).reasons["meta_ads"] == (
+        "active in earlier turn"
+    )
+    assert "meta_ads" not in router.select("other", "続けて", _AVAILABLE).active
+
+
+def test_load_appends_servers_on_demand():
+    servers = {name: object() for name in _AVAILABLE}
+    toolsets = ActiveToolsets(servers, ["ga4", "gsc"])
+
+    loaded, unknown = toolsets.load(["meta_ads", "ga4", "shopify"])
+
+    assert (loaded, unknown) == (["meta_ads"], ["shopify"])
+    assert toolsets.servers == [servers["ga4"], servers["gsc"], servers["meta_ads"]]
+    toolsets.load(["all"])
+    assert toolsets.inactive == []
@@ -0,0 +1,24 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.middleware.auth_middleware import get_current_user
+from app.routers import usage
+
+
+def _client(clerk_id: str) -> TestClient:
+    app = FastAPI()
+    app.include_router(usage.router)
+    app.dependency_overrides[get_current_user] = lambda: {"clerk_id": clerk_id, "email": None}
+    return TestClient(app)
+
+
+def test_worker_wide_metrics_are_admin_only(monkeypatch):
+    monkeypatch.setattr(get_settings(), "admin_clerk_ids", ["user_admin"])
+
+    user = _client("user_1")
+    assert user.get("/api/usage").status_code == 200
+    for path in ("tools", "model", "translations", "routes", "budgets", "runs", "db"):
+        assert user.get(f"/api/usage/{path}").status_code == 403
+
+    assert _client("user_admin").get("/api/usage/routes").status_code == 200
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from app.services.user_cache import UserCache
+
+
+def test_rows_expire_after_ttl():
+    cache = UserCache(ttl_seconds=0.05, negative_ttl_seconds=0.05)
+    loads: list[str] = []
+
+    async def loader():
+        loads.append("load")
+        return {"id": len(loads)}
+
+    async def scenario():
+        first = await cache.get("user_1", loader)
+        cached = await cache.get("user_1", loader)
+        time.sleep(0.06)
+        reloaded = await cache.get("user_1", loader)
+        return first, cached, reloaded
+
+    first, cached, reloaded = asyncio.run(scenario())
+
+    assert first == cached == {"id": 1}
+    assert reloaded == {"id": 2}
+    assert cache.stats()["hits"] == 1
+
+
+def test_lookup_racing_an_invalidation_is_not_cached():
+    cache = UserCache()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow_loader():
+            await release.wait()
+            return {"google_refresh_token": "old"}
+
+        lookup = asyncio.create_task(cache.get("user_1", slow_loader))
+        await asyncio.sleep(0)
+        cache.invalidate("user_1")  # e.g. Google disconnect during the read
+        release.set()
+        return await lookup
+
+    assert asyncio.run(scenario()) == {"google_refresh_token": "old"}
+    assert cache.lookup("user_1") == (False, None)
+    assert not cache._invalidated
+
+
+def test_invalidating_idle_users_keeps_no_state():
+    cache = UserCache()
+    cache.set("user_1", {"id": 1})
+
+    for n in range(1000):
+        cache.invalidate(f"user_{n}")
+
+    assert cache.lookup("user_1") == (False, None)
+    assert not cache._invalidated
@@ -585,6 +585,15 @@ function UserMessage({ message }: { message: Message }) {
 // AssistantMessage
 // ---------------------------------------------------------------------------
 
+function BudgetNotice({ notice }: { notice?: string }) {
+  if (!notice) return null;
+  return (
+    <p className="mt-3 text-[11px] sm:text-xs text-[#6b7280] bg-[#f9fafb] border border-[#e5e7eb] rounded-lg px-3 py-2">
+      {notice}
+    </p>
+  );
+}
+
 function AssistantMessage({
   message,
   pendingQuestionGroup,
@@ -610,6 +619,7 @@ function AssistantMessage({
           pendingQuestionGroup={pendingQuestionGroup}
           onRespondToQuestions={onRespondToQuestions}
         />
+        <BudgetNotice notice={message.notice} />
       </div>
     );
   }
@@ -641,6 +651,7 @@ function AssistantMessage({
               <span className="inline-block w-0.5 h-5 bg-[#e94560] animate-pulse ml-0.5 align-middle rounded-full" />
             )}
           </div>
+          <BudgetNotice notice={message.notice} />
         </>
       )}
     </div>
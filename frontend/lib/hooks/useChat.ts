@@ -10,10 +10,29 @@ import type {
   TextActivityItem,
   AskUserActivityItem,
   ChartActivityItem,
+  ReasoningActivityItem,
   PendingQuestionGroup,
 } from "@/lib/types";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+const MAX_RESUME_ATTEMPTS = 5;
+const RESUME_DELAY_MS = 1000;
+
+// Notice shown with the answer when the run budget wraps the run up early
+function budgetNotice(event: StreamEvent): string | null {
+  const exhausted = event.type === "budget_exhausted";
+  if (event.budget === "time" || event.budget === "tokens") {
+    const what = event.budget === "time" ? "処理時間" : "処理量";
+    return exhausted
+      ? `${what}の上限に達したため、ここまでに取得したデータで回答をまとめました。`
+      : `${what}の上限が近いため、回答をまとめています。`;
+  }
+  if (exhausted && event.budget?.startsWith("tool_calls:")) {
+    const server = event.budget.slice("tool_calls:".length);
+    return `${server} のツール呼び出し上限に達したため、取得済みのデータで回答しています。`;
+  }
+  return null;
+}
 
 export function useChat(propertyId: string) {
   const [messages, setMessages] = useState<Message[]>([]);
@@ -27,6 +46,8 @@ export function useChat(propertyId: string) {
   const abortRef = useRef<AbortController | null>(null);
   const seqRef = useRef(0);
   const assistantIdRef = useRef<string | null>(null);
+  // Server-side run of the current stream (for cancel)
+  const runIdRef = useRef<string | null>(null);
   const currentTextItemIdRef = useRef<string | null>(null);
 
   const loadMessages = useCallback((msgs: Message[]) => {
@@ -104,28 +125,313 @@ export function useChat(propertyId: string) {
         },
       ]);
 
-      const token = await getToken();
-      abortRef.current = new AbortController();
+      // Same reduction as the backend's ActivityBuilder
+      // (backend/app/services/activity_items.py), which saves activity_items
+      const handleEvent = (event: StreamEvent) => {
+        if (event.type === "text_delta" && event.content) {
+          // Create a new text segment if none exists
+          if (!currentTextItemIdRef.current) {
+            const textId = crypto.randomUUID();
+            const seq = ++seqRef.current;
+            currentTextItemIdRef.current = textId;
+            const newTextItem: TextActivityItem = {
+              id: textId,
+              kind: "text",
+              sequence: seq,
+              content: event.content,
+            };
+            setMessages((prev) =>
+              prev.map((m) =>
+                m.id === assistantId
+                  ? {
+                      ...m,
+                      content: m.content + event.content,
+                      activityItems: [
+                        ...(m.activityItems || []),
+                        newTextItem,
+                      ],
+                    }
+                  : m
+              )
+            );
+          } else {
+            // Append to existing text segment
+            const textId = currentTextItemIdRef.current;
+            setMessages((prev) =>
+              prev.map((m) => {
+                if (m.id !== assistantId) return m;
+                const items = (m.activityItems || []).map((it) =>
+                  it.id === textId
+                    ? { ...it, content: (it as TextActivityItem).content + event.content } as TextActivityItem
+                    : it
+                );
+                return {
+                  ...m,
+                  content: m.content + event.content,
+                  activityItems: items,
+                };
+              })
+            );
+          }
+        } else if (event.type === "response_created") {
+          // New model turn — reset text segment so next text_delta starts a new one
+          currentTextItemIdRef.current = null;
+        } else if (event.type === "tool_call") {
+          // Tool call breaks the text segment
+          currentTextItemIdRef.current = null;
+          const seq = ++seqRef.current;
+          const tc: ToolCall = {
+            type: "call",
+            call_id: event.call_id,
+            name: event.name || "unknown",
+            arguments: event.arguments,
+          };
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === assistantId
+                ? {
+                    ...m,
+                    activityItems: [
+                      ...(m.activityItems || []),
+                      {
+                        id: crypto.randomUUID(),
+                        kind: "tool" as const,
+                        sequence: seq,
+                        name: event.name || "unknown",
+                        call_id: event.call_id,
+                        arguments: event.arguments,
+                        output: undefined,
+                      },
+                    ],
+                    toolCalls: [...(m.toolCalls || []), tc],
+                  }
+                : m
+            )
+          );
+        } else if (event.type === "tool_result") {
+          setMessages((prev) =>
+            prev.map((m) => {
+              if (m.id !== assistantId) return m;
 
-      try {
-        const response = await fetch(`${API_URL}/api/chat/stream`, {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-            Authorization: `Bearer ${token}`,
-          },
-          body: JSON.stringify({
-            message: content,
-            conversation_id: currentConversationId,
-            property_id: propertyId,
-          }),
-          signal: abortRef.current.signal,
-        });
+              const items = [...(m.activityItems || [])];
+              const aidx = event.call_id
+                ? items.findIndex(
+                    (it) =>
+                      it.kind === "tool" &&
+                      (it as ToolActivityItem).call_id ===
+                        event.call_id &&
+                      !(it as ToolActivityItem).output
+                  )
+                : items.findIndex(
+                    (it) =>
+                      it.kind === "tool" &&
+                      !(it as ToolActivityItem).output
+                  );
+              if (aidx !== -1) {
+                items[aidx] = {
+                  ...items[aidx],
+                  output: event.output,
+                } as ToolActivityItem;
+              }
 
-        if (!response.ok) {
-          throw new Error(`HTTP ${response.status}`);
+              const calls = [...(m.toolCalls || [])];
+              const cidx = event.call_id
+                ? calls.findIndex(
+                    (c) => c.call_id === event.call_id && !c.output
+                  )
+                : calls.findIndex((c) => !c.output);
+              if (cidx !== -1) {
+                calls[cidx] = { ...calls[cidx], output: event.output };
+              }
+
+              return { ...m, activityItems: items, toolCalls: calls };
+            })
+          );
+        } else if (event.type === "reasoning" && event.content) {
+          currentTextItemIdRef.current = null;
+          const seq = ++seqRef.current;
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === assistantId
+                ? {
+                    ...m,
+                    activityItems: [
+                      ...(m.activityItems || []),
+                      {
+                        id: event.reasoning_id || crypto.randomUUID(),
+                        kind: "reasoning" as const,
+                        sequence: seq,
+                        content: event.content!,
+                      },
+                    ],
+                    reasoningMessages: [
+                      ...(m.reasoningMessages || []),
+                      event.content!,
+                    ],
+                  }
+                : m
+            )
+          );
+        } else if (
+          event.type === "reasoning_translated" &&
+          event.reasoning_id &&
+          event.content
+        ) {
+          // Replace the original (English) summary with its translation
+          setMessages((prev) =>
+            prev.map((m) => {
+              if (m.id !== assistantId) return m;
+              const items = [...(m.activityItems || [])];
+              const idx = items.findIndex(
+                (a) => a.kind === "reasoning" && a.id === event.reasoning_id
+              );
+              if (idx === -1) return m;
+              const original = (items[idx] as ReasoningActivityItem).content;
+              items[idx] = { ...items[idx], content: event.content! } as ReasoningActivityItem;
+              const reasoning = [...(m.reasoningMessages || [])];
+              const ridx = reasoning.indexOf(original);
+              if (ridx !== -1) reasoning[ridx] = event.content!;
+              return { ...m, activityItems: items, reasoningMessages: reasoning };
+            })
+          );
+        } else if (event.type === "ask_user" && event.group_id && event.questions) {
+          currentTextItemIdRef.current = null;
+          const seq = ++seqRef.current;
+          const askItem: AskUserActivityItem = {
+            id: crypto.randomUUID(),
+            kind: "ask_user",
+            sequence: seq,
+            groupId: event.group_id,
+            questions: event.questions,
+          };
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === assistantId
+                ? {
+                    ...m,
+                    activityItems: [
+                      ...(m.activityItems || []),
+                      askItem,
+                    ],
+                  }
+                : m
+            )
+          );
+          setPendingQuestionGroup({
+            groupId: event.group_id,
+            questions: event.questions,
+          });
+        } else if (event.type === "chart" && event.spec) {
+          currentTextItemIdRef.current = null;
+          const seq = ++seqRef.current;
+          const chartItem: ChartActivityItem = {
+            id: crypto.randomUUID(),
+            kind: "chart",
+            sequence: seq,
+            spec: event.spec,
+          };
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === assistantId
+                ? {
+                    ...m,
+                    activityItems: [
+                      ...(m.activityItems || []),
+                      chartItem,
+                    ],
+                  }
+                : m
+            )
+          );
+        } else if (event.type === "route_escalated") {
+          // The turn is re-run on a stronger route: drop what the abandoned
+          // run streamed (ActivityBuilder resets the same way)
+          currentTextItemIdRef.current = null;
+          seqRef.current = 0;
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === assistantId
+                ? {
+                    ...m,
+                    content: "",
+                    activityItems: [],
+                    toolCalls: [],
+                    reasoningMessages: [],
+                  }
+                : m
+            )
+          );
+          setPendingQuestionGroup(null);
+        } else if (
+          event.type === "budget_warning" ||
+          event.type === "budget_exhausted"
+        ) {
+          const notice = budgetNotice(event);
+          if (notice) {
+            // A warning never replaces an earlier notice
+            setMessages((prev) =>
+              prev.map((m) =>
+                m.id === assistantId &&
+                (event.type === "budget_exhausted" || !m.notice)
+                  ? { ...m, notice }
+                  : m
+              )
+            );
+          }
+        } else if (event.type === "done") {
+          currentTextItemIdRef.current = null;
+          if (event.conversation_id) {
+            setCurrentConversationId(event.conversation_id);
+            window.history.replaceState(
+              {},
+              "",
+              `/dashboard/c/${event.conversation_id}`
+            );
+          }
+          setMessages((prev) =>
+            prev.map((m) => {
+              if (m.id !== assistantId) return m;
+              const items = (m.activityItems || []).map((it) =>
+                it.kind === "tool" && !(it as ToolActivityItem).output
+                  ? ({ ...it, output: "(completed)" } as ToolActivityItem)
+                  : it
+              );
+              const calls = (m.toolCalls || []).map((tc) =>
+                tc.output ? tc : { ...tc, output: "(completed)" }
+              );
+              return {
+                ...m,
+                isStreaming: false,
+                activityItems: items,
+                toolCalls: calls,
+              };
+            })
+          );
+          setPendingQuestionGroup(null);
+        } else if (event.type === "error") {
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === assistantId
+                ? {
+                    ...m,
+                    content:
+                      m.content +
+                      `\n\nエラーが発生しました: ${event.message}`,
+                    isStreaming: false,
+                  }
+                : m
+            )
+          );
         }
+      };
 
+      // Resumable stream state: run id (from run_started) and the last
+      // SSE event id seen, for reconnecting with Last-Event-ID
+      let runId: string | null = null;
+      let lastEventId = 0;
+      let finished = false;
+
+      const readStream = async (response: Response) => {
         const reader = response.body!.getReader();
         const decoder = new TextDecoder();
         let buffer = "";
@@ -135,256 +441,85 @@ export function useChat(propertyId: string) {
           if (done) break;
 
           buffer += decoder.decode(value, { stream: true });
-          const lines = buffer.split("\n\n");
-          buffer = lines.pop() || "";
+          const frames = buffer.split("\n\n");
+          buffer = frames.pop() || "";
 
-          for (const line of lines) {
-            if (!line.startsWith("data: ")) continue;
+          for (const frame of frames) {
+            let data = "";
+            for (const line of frame.split("\n")) {
+              if (line.startsWith("id: ")) lastEventId = Number(line.slice(4));
+              else if (line.startsWith("data: ")) data = line.slice(6);
+            }
+            if (!data) continue;
             let event: StreamEvent;
             try {
-              event = JSON.parse(line.slice(6));
+              event = JSON.parse(data);
             } catch {
               continue;
             }
+            if (event.type === "run_started" && event.run_id) {
+              runId = event.run_id;
+              runIdRef.current = event.run_id;
+              continue;
+            }
+            if (
+              event.type === "done" ||
+              event.type === "error" ||
+              event.type === "cancelled"
+            ) {
+              finished = true;
+            }
+            handleEvent(event);
+          }
+        }
+      };
 
-            if (event.type === "text_delta" && event.content) {
-              // Create a new text segment if none exists
-              if (!currentTextItemIdRef.current) {
-                const textId = crypto.randomUUID();
-                const seq = ++seqRef.current;
-                currentTextItemIdRef.current = textId;
-                const newTextItem: TextActivityItem = {
-                  id: textId,
-                  kind: "text",
-                  sequence: seq,
-                  content: event.content,
-                };
-                setMessages((prev) =>
-                  prev.map((m) =>
-                    m.id === assistantId
-                      ? {
-                          ...m,
-                          content: m.content + event.content,
-                          activityItems: [
-                            ...(m.activityItems || []),
-                            newTextItem,
-                          ],
-                        }
-                      : m
-                  )
-                );
-              } else {
-                // Append to existing text segment
-                const textId = currentTextItemIdRef.current;
-                setMessages((prev) =>
-                  prev.map((m) => {
-                    if (m.id !== assistantId) return m;
-                    const items = (m.activityItems || []).map((it) =>
-                      it.id === textId
-                        ? { ...it, content: (it as TextActivityItem).content + event.content } as TextActivityItem
-                        : it
-                    );
-                    return {
-                      ...m,
-                      content: m.content + event.content,
-                      activityItems: items,
-                    };
-                  })
-                );
-              }
-            } else if (event.type === "response_created") {
-              // New model turn — reset text segment so next text_delta starts a new one
-              currentTextItemIdRef.current = null;
-            } else if (event.type === "tool_call") {
-              // Tool call breaks the text segment
-              currentTextItemIdRef.current = null;
-              const seq = ++seqRef.current;
-              const tc: ToolCall = {
-                type: "call",
-                call_id: event.call_id,
-                name: event.name || "unknown",
-                arguments: event.arguments,
-              };
-              setMessages((prev) =>
-                prev.map((m) =>
-                  m.id === assistantId
-                    ? {
-                        ...m,
-                        activityItems: [
-                          ...(m.activityItems || []),
-                          {
-                            id: crypto.randomUUID(),
-                            kind: "tool" as const,
-                            sequence: seq,
-                            name: event.name || "unknown",
-                            call_id: event.call_id,
-                            arguments: event.arguments,
-                            output: undefined,
-                          },
-                        ],
-                        toolCalls: [...(m.toolCalls || []), tc],
-                      }
-                    : m
-                )
-              );
-            } else if (event.type === "tool_result") {
-              setMessages((prev) =>
-                prev.map((m) => {
-                  if (m.id !== assistantId) return m;
+      const token = await getToken();
+      abortRef.current = new AbortController();
+      const signal = abortRef.current.signal;
 
-                  const items = [...(m.activityItems || [])];
-                  const aidx = event.call_id
-                    ? items.findIndex(
-                        (it) =>
-                          it.kind === "tool" &&
-                          (it as ToolActivityItem).call_id ===
-                            event.call_id &&
-                          !(it as ToolActivityItem).output
-                      )
-                    : items.findIndex(
-                        (it) =>
-                          it.kind === "tool" &&
-                          !(it as ToolActivityItem).output
-                      );
-                  if (aidx !== -1) {
-                    items[aidx] = {
-                      ...items[aidx],
-                      output: event.output,
-                    } as ToolActivityItem;
-                  }
+      try {
+        let response = await fetch(`${API_URL}/api/chat/stream`, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+          },
+          body: JSON.stringify({
+            message: content,
+            conversation_id: currentConversationId,
+            property_id: propertyId,
+          }),
+          signal,
+        });
 
-                  const calls = [...(m.toolCalls || [])];
-                  const cidx = event.call_id
-                    ? calls.findIndex(
-                        (c) => c.call_id === event.call_id && !c.output
-                      )
-                    : calls.findIndex((c) => !c.output);
-                  if (cidx !== -1) {
-                    calls[cidx] = { ...calls[cidx], output: event.output };
-                  }
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}`);
+        }
 
-                  return { ...m, activityItems: items, toolCalls: calls };
-                })
-              );
-            } else if (event.type === "reasoning" && event.content) {
-              currentTextItemIdRef.current = null;
-              const seq = ++seqRef.current;
-              setMessages((prev) =>
-                prev.map((m) =>
-                  m.id === assistantId
-                    ? {
-                        ...m,
-                        activityItems: [
-                          ...(m.activityItems || []),
-                          {
-                            id: crypto.randomUUID(),
-                            kind: "reasoning" as const,
-                            sequence: seq,
-                            content: event.content!,
-                          },
-                        ],
-                        reasoningMessages: [
-                          ...(m.reasoningMessages || []),
-                          event.content!,
-                        ],
-                      }
-                    : m
-                )
-              );
-            } else if (event.type === "ask_user" && event.group_id && event.questions) {
-              currentTextItemIdRef.current = null;
-              const seq = ++seqRef.current;
-              const askItem: AskUserActivityItem = {
-                id: crypto.randomUUID(),
-                kind: "ask_user",
-                sequence: seq,
-                groupId: event.group_id,
-                questions: event.questions,
-              };
-              setMessages((prev) =>
-                prev.map((m) =>
-                  m.id === assistantId
-                    ? {
-                        ...m,
-                        activityItems: [
-                          ...(m.activityItems || []),
-                          askItem,
-                        ],
-                      }
-                    : m
-                )
-              );
-              setPendingQuestionGroup({
-                groupId: event.group_id,
-                questions: event.questions,
-              });
-            } else if (event.type === "chart" && event.spec) {
-              currentTextItemIdRef.current = null;
-              const seq = ++seqRef.current;
-              const chartItem: ChartActivityItem = {
-                id: crypto.randomUUID(),
-                kind: "chart",
-                sequence: seq,
-                spec: event.spec,
-              };
-              setMessages((prev) =>
-                prev.map((m) =>
-                  m.id === assistantId
-                    ? {
-                        ...m,
-                        activityItems: [
-                          ...(m.activityItems || []),
-                          chartItem,
-                        ],
-                      }
-                    : m
-                )
-              );
-            } else if (event.type === "done") {
-              currentTextItemIdRef.current = null;
-              if (event.conversation_id) {
-                setCurrentConversationId(event.conversation_id);
-                window.history.replaceState(
-                  {},
-                  "",
-                  `/dashboard/c/${event.conversation_id}`
-                );
-              }
-              setMessages((prev) =>
-                prev.map((m) => {
-                  if (m.id !== assistantId) return m;
-                  const items = (m.activityItems || []).map((it) =>
-                    it.kind === "tool" && !(it as ToolActivityItem).output
-                      ? ({ ...it, output: "(completed)" } as ToolActivityItem)
-                      : it
-                  );
-                  const calls = (m.toolCalls || []).map((tc) =>
-                    tc.output ? tc : { ...tc, output: "(completed)" }
-                  );
-                  return {
-                    ...m,
-                    isStreaming: false,
-                    activityItems: items,
-                    toolCalls: calls,
-                  };
-                })
-              );
-              setPendingQuestionGroup(null);
-            } else if (event.type === "error") {
-              setMessages((prev) =>
-                prev.map((m) =>
-                  m.id === assistantId
-                    ? {
-                        ...m,
-                        content:
-                          m.content +
-                          `\n\nエラーが発生しました: ${event.message}`,
-                        isStreaming: false,
-                      }
-                    : m
-                )
-              );
-            }
+        // The run continues server-side when the connection drops:
+        // reconnect and continue after the last event received
+        let attempts = 0;
+        while (true) {
+          try {
+            await readStream(response);
+          } catch (err) {
+            if ((err as Error).name === "AbortError" || !runId) throw err;
+          }
+          if (finished || !runId) break;
+          if (++attempts > MAX_RESUME_ATTEMPTS) {
+            throw new Error("Stream interrupted");
+          }
+          await new Promise((r) => setTimeout(r, RESUME_DELAY_MS * attempts));
+          response = await fetch(`${API_URL}/api/chat/stream/${runId}`, {
+            headers: {
+              Authorization: `Bearer ${await getToken()}`,
+              "Last-Event-ID": String(lastEventId),
+            },
+            signal,
+          });
+          if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
           }
         }
       } catch (err) {
@@ -404,15 +539,30 @@ export function useChat(propertyId: string) {
       } finally {
         setIsStreaming(false);
         assistantIdRef.current = null;
+        runIdRef.current = null;
       }
     },
     [currentConversationId, propertyId, getToken]
   );
 
-  const stopStreaming = useCallback(() => {
+  const stopStreaming = useCallback(async () => {
     abortRef.current?.abort();
     setIsStreaming(false);
-  }, []);
+    // Runs continue server-side without a client: cancel explicitly
+    const runId = runIdRef.current;
+    if (runId) {
+      runIdRef.current = null;
+      try {
+        const token = await getToken();
+        await fetch(`${API_URL}/api/chat/runs/${runId}/cancel`, {
+          method: "POST",
+          headers: { Authorization: `Bearer ${token}` },
+        });
+      } catch (err) {
+        console.error("Failed to cancel run:", err);
+      }
+    }
+  }, [getToken]);
 
   const clearMessages = useCallback(() => {
     setMessages([]);
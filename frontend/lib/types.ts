@@ -108,6 +108,7 @@ export interface Message {
   toolCalls?: ToolCall[];
   reasoningMessages?: string[];
   isStreaming?: boolean;
+  notice?: string; // Run budget notice (not saved)
 }
 
 export interface ToolCall {
@@ -174,11 +175,17 @@ export interface StreamEvent {
     | "tool_call"
     | "tool_result"
     | "reasoning"
+    | "reasoning_translated"
     | "ask_user"
     | "chart"
     | "done"
     | "error"
-    | "response_created";
+    | "response_created"
+    | "run_started"
+    | "cancelled"
+    | "route_escalated"
+    | "budget_warning"
+    | "budget_exhausted";
   content?: string;
   call_id?: string;
   name?: string;
@@ -187,11 +194,20 @@ export interface StreamEvent {
   message?: string;
   conversation_id?: string;
   has_summary?: boolean;
+  reasoning_id?: string; // reasoning / reasoning_translated
+  run_id?: string; // run_started / cancelled
   // ask_user fields (structured multi-question)
   group_id?: string;
   questions?: AskUserQuestionItem[];
   // chart fields
   spec?: ChartSpec;
+  // route_escalated fields (route names)
+  from?: string;
+  to?: string;
+  // budget_warning / budget_exhausted fields
+  budget?: string; // "time" | "tokens" | "tool_calls:<server>"
+  used?: number;
+  limit?: number;
 }
 
 export interface PendingQuestionGroup {
@@ -0,0 +1,32 @@
+-- Append-only storage for conversation context items.
+-- Each turn inserts one segment with only its new Responses API input items
+-- ('append'). When earlier history is rewritten (rolling context compaction),
+-- the full list is written as a 'snapshot' and older segments are deleted.
+-- Readers concatenate segments from the latest snapshot onward, ordered by seq.
+--
+-- Run in Supabase SQL Editor:
+CREATE TABLE IF NOT EXISTS context_segments (
+  id BIGSERIAL PRIMARY KEY,
+  conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+  seq INTEGER NOT NULL,
+  kind TEXT NOT NULL CHECK (kind IN ('snapshot', 'append')),
+  items JSONB NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  UNIQUE(conversation_id, seq)
+);
+
+CREATE INDEX IF NOT EXISTS idx_context_segments_conversation_seq
+  ON context_segments(conversation_id, seq);
+
+ALTER TABLE context_segments ENABLE ROW LEVEL SECURITY;
+
+-- Migrate existing conversations.context_items into snapshot segments
+INSERT INTO context_segments (conversation_id, seq, kind, items)
+SELECT id, 0, 'snapshot', context_items
+FROM conversations
+WHERE context_items IS NOT NULL
+  AND jsonb_typeof(context_items) = 'array'
+ON CONFLICT (conversation_id, seq) DO NOTHING;
+
+-- conversations.context_items is no longer written; it is kept (read-only)
+-- so the backend can fall back to it until this migration has been applied.
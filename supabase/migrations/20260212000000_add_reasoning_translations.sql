@@ -0,0 +1,13 @@
+-- Persistent memo cache for reasoning summary translations
+-- (enabled with REASONING_TRANSLATE_CACHE_PERSIST=true)
+-- text_hash: sha256 of the normalized source text (whitespace collapsed, case-folded)
+--
+-- Run in Supabase SQL Editor:
+CREATE TABLE IF NOT EXISTS reasoning_translations (
+  text_hash TEXT PRIMARY KEY,
+  source TEXT NOT NULL,
+  translated TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now()
+);
+
+ALTER TABLE reasoning_translations ENABLE ROW LEVEL SECURITY;